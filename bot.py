@@ -1,7 +1,8 @@
 from langchain_openai import ChatOpenAI
 from langchain.chains import ConversationalRetrievalChain
-from langchain_community.vectorstores import FAISS
-from langchain_openai.embeddings import OpenAIEmbeddings
+from tools.utils.retrieval import MultiStoreRetriever
+from tools.utils.embedding_service import create_embeddings
+from tools.utils.sources import index_path, source_names
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from dotenv import load_dotenv
@@ -13,19 +14,16 @@ load_dotenv()
 # Set your OpenAI API key
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
-# Load both FAISS indexes
-faiss_index_path_1 = "tools/output/jira_tickets_stories_faiss_index"
-faiss_index_path_2 = "tools/output/codebase_faiss_index"
-faiss_index_path_3 = "tools/output/git_history_faiss_index"
-vectorstore1 = FAISS.load_local(faiss_index_path_1, OpenAIEmbeddings(), allow_dangerous_deserialization=True)
-vectorstore2 = FAISS.load_local(faiss_index_path_2, OpenAIEmbeddings(), allow_dangerous_deserialization=True)
-vectorstore3 = FAISS.load_local(faiss_index_path_3, OpenAIEmbeddings(), allow_dangerous_deserialization=True)
-
-# Merge the second index into the first
-    
-vectorstore1.merge_from(vectorstore2)
-vectorstore1.merge_from(vectorstore3)
-vectorstore = vectorstore1
+# FAISS indexes of every knowledge source (JIRA, codebase, git history and any configured ones)
+faiss_index_paths = [index_path(name) for name in source_names()]
+# Queries must be embedded by the same backend that built the indexes
+embeddings = create_embeddings()
+# The indexes are memory-mapped on the first query and searched together; document
+# text is only read for the hits returned
+retriever = MultiStoreRetriever(
+    store_paths=faiss_index_paths,
+    embeddings=embeddings
+)
 
 # Initialize conversation memory
 memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
@@ -92,7 +90,7 @@ llm = ChatOpenAI(temperature=0, model_name="gpt-4o")
 # Create ConversationalRetrievalChain
 qa_chain = ConversationalRetrievalChain.from_llm(
     llm=llm,
-    retriever=vectorstore.as_retriever(),
+    retriever=retriever,
     memory=memory,
 )
 
@@ -106,7 +104,7 @@ def chat_with_bot(user_input):
 
 if __name__ == "__main__":
     # print("Bot is ready. Type your message:")
-    # results = vectorstore.similarity_search("TK-7959", k=3)
+    # results = retriever.invoke("TK-7959")
     # for result in results:
     #     print(result.page_content)
     while True:
@@ -2,24 +2,107 @@
 Enhanced Context Manager for Development Assistant
 Handles large codebases, JIRA data, and git history efficiently
 """
+import ast
+import hashlib
 import json
+import os
+import re
 import sqlite3
-import hashlib
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Any
-import os
+from typing import Dict, List, Any, Iterable, Tuple
+
+from tools.utils.file_walker import walk_files, is_binary_data, SNIFF_BYTES
+from tools.utils.js_scanner import scan_js
+
+# Full-text indexed columns per source; title_column is highlighted in search results
+FTS_SOURCES = {
+    "code": {"table": "code_patterns", "fts": "code_patterns_fts", "key": "file_path",
+             "columns": ["file_path", "pattern_type", "code_snippet", "metadata"], "title_column": 2},
+    "jira": {"table": "jira_tickets", "fts": "jira_tickets_fts", "key": "ticket_id",
+             "columns": ["ticket_id", "title", "description"], "title_column": 1},
+    "git": {"table": "git_commits", "fts": "git_commits_fts", "key": "commit_hash",
+            "columns": ["commit_hash", "author", "message", "files_changed"], "title_column": 2},
+}
+
+# Bumped when stored data needs a one-time migration (see _migrate)
+SCHEMA_VERSION = 2
+
+
+def _pattern_hash(file_path: str, pattern_type: str, code_snippet: str) -> str:
+    """Dedup key of a code pattern: identical snippets in different files are different patterns"""
+    return hashlib.md5(f"{file_path}\0{pattern_type}\0{code_snippet}".encode()).hexdigest()
+
 
 class DevelopmentContextManager:
     def __init__(self, workspace_path: str):
         self.workspace_path = Path(workspace_path)
         self.db_path = self.workspace_path / "dev_context.db"
+        # One connection is shared by all threads; the lock serializes access to it
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # INSERT OR REPLACE must fire the delete triggers that keep FTS tables in sync
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        self.fts_enabled = False
         self.init_database()
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor on the shared connection inside one transaction (commit or rollback)."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                yield cursor
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
         
     def init_database(self):
         """Initialize SQLite database for structured storage"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.transaction() as cursor:
+            self._create_tables(cursor)
+            self._migrate(cursor)
+            self._create_indexes(cursor)
+            self.fts_enabled = self._create_fts_tables(cursor)
+
+    def _migrate(self, cursor):
+        """Bring data written by older versions up to SCHEMA_VERSION, once per database"""
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 1:
+            # Pattern hashes used to cover the snippet only, so a file could take over another
+            # file's rows; rehash by file and rescan every file to restore the patterns lost
+            cursor.execute("SELECT id, file_path, pattern_type, code_snippet FROM code_patterns")
+            cursor.executemany("UPDATE code_patterns SET hash = ? WHERE id = ?",
+                               [(_pattern_hash(r[1], r[2], r[3]), r[0]) for r in cursor.fetchall()])
+            cursor.execute("DELETE FROM scanned_files")
+        if version < 2:
+            cursor.execute("PRAGMA table_info(git_commits)")
+            if "repo" not in [r[1] for r in cursor.fetchall()]:
+                # Commits are now keyed by repository. Older rows cannot be attributed to one, so
+                # they are dropped; the next sync of each repository stores its history again
+                cursor.execute("DROP TABLE IF EXISTS git_commits_fts")
+                cursor.execute("DROP TABLE git_commits")
+                cursor.execute("DROP TABLE commit_files")
+                self._create_tables(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _create_tables(self, cursor):
         # Code patterns table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS code_patterns (
@@ -52,46 +135,357 @@ class DevelopmentContextManager:
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS git_commits (
                 id INTEGER PRIMARY KEY,
-                commit_hash TEXT UNIQUE,
+                repo TEXT NOT NULL DEFAULT '',  -- repository key (repo_cache_key of its URL)
+                commit_hash TEXT,
                 author TEXT,
                 date TEXT,
                 message TEXT,
                 files_changed TEXT,  -- JSON array
-                diff_summary TEXT
+                diff_summary TEXT,
+                UNIQUE (repo, commit_hash)
             )
         """)
-        
-        conn.commit()
-        conn.close()
+
+        # Normalized commit -> file changes
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS commit_files (
+                id INTEGER PRIMARY KEY,
+                repo TEXT NOT NULL DEFAULT '',
+                commit_hash TEXT,
+                file_path TEXT,
+                file_name TEXT,  -- basename, for lookups like 'utils.py'
+                change_type TEXT,
+                insertions INTEGER,
+                deletions INTEGER,
+                UNIQUE (repo, commit_hash, file_path)
+            )
+        """)
+
+        # Files already scanned for patterns, used for incremental scans
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scanned_files (
+                file_path TEXT PRIMARY KEY,
+                language TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                content_hash TEXT,
+                patterns INTEGER,
+                scanned_at TEXT
+            )
+        """)
+
+        # Resumable scan checkpoints
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scan_state (
+                key TEXT PRIMARY KEY,
+                value TEXT  -- JSON object
+            )
+        """)
+
+    def _create_indexes(self, cursor):
+        """Secondary indexes on the columns used as filters"""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_code_patterns_type_lang ON code_patterns(pattern_type, language)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_code_patterns_lang_path ON code_patterns(language, file_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jira_tickets_status ON jira_tickets(status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jira_tickets_assignee ON jira_tickets(assignee)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_git_commits_author ON git_commits(author)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_git_commits_date ON git_commits(date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_commit_files_path ON commit_files(repo, file_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_commit_files_name ON commit_files(repo, file_name)")
+
+    def _create_fts_tables(self, cursor) -> bool:
+        """Create FTS5 tables over the three sources, kept in sync by triggers. Returns False without FTS5."""
+        for spec in FTS_SOURCES.values():
+            table, fts, columns = spec["table"], spec["fts"], spec["columns"]
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,))
+            exists = cursor.fetchone() is not None
+            cols = ", ".join(columns)
+            new_cols = ", ".join(f"new.{c}" for c in columns)
+            old_cols = ", ".join(f"old.{c}" for c in columns)
+            try:
+                cursor.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {fts}
+                    USING fts5({cols}, content='{table}', content_rowid='id')
+                """)
+            except sqlite3.OperationalError as e:
+                print(f"FTS5 unavailable, keyword search falls back to LIKE: {e}")
+                return False
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                    INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+                END
+            """)
+            if not exists:
+                # Index rows written before the FTS table existed
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+        return True
     
     def store_code_pattern(self, file_path: str, language: str, 
                           pattern_type: str, code_snippet: str, 
                           metadata: Dict[str, Any]):
         """Store code patterns with deduplication"""
-        code_hash = hashlib.md5(code_snippet.encode()).hexdigest()
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        self.store_code_patterns([(file_path, language, pattern_type, code_snippet, metadata)])
+
+    def store_code_patterns(self, patterns: Iterable[Tuple[str, str, str, str, Dict[str, Any]]]) -> int:
+        """Store many (file_path, language, pattern_type, code_snippet, metadata) patterns in one transaction"""
+        rows = [
+            (file_path, language, pattern_type, code_snippet, json.dumps(metadata),
+             _pattern_hash(file_path, pattern_type, code_snippet))
+            for file_path, language, pattern_type, code_snippet, metadata in patterns
+        ]
+        if not rows:
+            return 0
         try:
-            cursor.execute("""
-                INSERT OR REPLACE INTO code_patterns 
-                (file_path, language, pattern_type, code_snippet, metadata, hash)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (file_path, language, pattern_type, code_snippet, 
-                  json.dumps(metadata), code_hash))
-            conn.commit()
+            with self.transaction() as cursor:
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO code_patterns 
+                    (file_path, language, pattern_type, code_snippet, metadata, hash)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
         except sqlite3.Error as e:
-            print(f"Error storing code pattern: {e}")
-        finally:
-            conn.close()
+            print(f"Error storing code patterns: {e}")
+            return 0
+        return len(rows)
     
+    def get_file_fingerprints(self) -> Dict[str, Tuple[int, int, str]]:
+        """Map scanned file path -> (size, mtime_ns, content_hash)"""
+        with self.transaction() as cursor:
+            cursor.execute("SELECT file_path, size, mtime_ns, content_hash FROM scanned_files")
+            return {r[0]: (r[1], r[2], r[3]) for r in cursor.fetchall()}
+
+    def replace_file_patterns(self, scanned: List[Dict[str, Any]]):
+        """
+        Replace the stored patterns of each scanned file and record its fingerprint, in one transaction.
+        Each item has file_path, language, size, mtime_ns, content_hash and patterns
+        (a list of (pattern_type, code_snippet, metadata) tuples, or None to keep the stored ones).
+        """
+        if not scanned:
+            return
+        with self.transaction() as cursor:
+            for item in scanned:
+                if item["patterns"] is None:
+                    # Touched but unchanged content: only refresh the fingerprint
+                    cursor.execute("""
+                        UPDATE scanned_files SET size = ?, mtime_ns = ?, scanned_at = datetime('now')
+                        WHERE file_path = ?
+                    """, (item["size"], item["mtime_ns"], item["file_path"]))
+                    continue
+                cursor.execute("DELETE FROM code_patterns WHERE file_path = ?", (item["file_path"],))
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO code_patterns 
+                    (file_path, language, pattern_type, code_snippet, metadata, hash)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(item["file_path"], item["language"], pattern_type, snippet, json.dumps(metadata),
+                       _pattern_hash(item["file_path"], pattern_type, snippet))
+                      for pattern_type, snippet, metadata in item["patterns"]])
+                cursor.execute("""
+                    INSERT OR REPLACE INTO scanned_files
+                    (file_path, language, size, mtime_ns, content_hash, patterns, scanned_at)
+                    VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+                """, (item["file_path"], item["language"], item["size"], item["mtime_ns"],
+                      item["content_hash"], len(item["patterns"])))
+
+    def forget_files(self, file_paths: Iterable[str]):
+        """Drop patterns and fingerprints of files that no longer exist"""
+        rows = [(p,) for p in file_paths]
+        with self.transaction() as cursor:
+            cursor.executemany("DELETE FROM code_patterns WHERE file_path = ?", rows)
+            cursor.executemany("DELETE FROM scanned_files WHERE file_path = ?", rows)
+
+    def upsert_jira_tickets(self, issues: Iterable[Dict[str, Any]]) -> int:
+        """Insert or update raw JIRA issues (as returned by the search API) in one transaction"""
+        rows = []
+        for issue in issues:
+            fields = issue.get("fields") or {}
+            description = fields.get("description")
+            if description is not None and not isinstance(description, str):
+                description = json.dumps(description)
+            rows.append((
+                issue["key"],
+                fields.get("summary"),
+                description,
+                (fields.get("status") or {}).get("name"),
+                (fields.get("assignee") or {}).get("displayName"),
+                fields.get("created"),
+                fields.get("resolutiondate"),
+                json.dumps({k: fields.get(k) for k in ("issuetype", "priority", "labels", "updated")
+                            if k in fields}, default=str)
+            ))
+        if not rows:
+            return 0
+        with self.transaction() as cursor:
+            cursor.executemany("""
+                INSERT INTO jira_tickets
+                (ticket_id, title, description, status, assignee, created_date, resolved_date, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ticket_id) DO UPDATE SET
+                    title = excluded.title, description = excluded.description,
+                    status = excluded.status, assignee = excluded.assignee,
+                    created_date = excluded.created_date, resolved_date = excluded.resolved_date,
+                    metadata = excluded.metadata
+            """, rows)
+        return len(rows)
+
+    def jira_ticket_versions(self, ticket_ids: Iterable[str]) -> Dict[str, Any]:
+        """ticket_id -> JIRA 'updated' timestamp of the stored version, for tickets that are stored"""
+        ticket_ids = list(ticket_ids)
+        versions = {}
+        with self.transaction() as cursor:
+            for i in range(0, len(ticket_ids), 500):
+                chunk = ticket_ids[i:i + 500]
+                cursor.execute(f"""
+                    SELECT ticket_id, json_extract(metadata, '$.updated') FROM jira_tickets
+                    WHERE ticket_id IN ({','.join('?' * len(chunk))})
+                """, chunk)
+                versions.update(cursor.fetchall())
+        return versions
+
+    def get_jira_tickets(self, ticket_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """Stored tickets as {id, summary, description, status, assignee}, in the given order"""
+        ticket_ids = list(ticket_ids)
+        rows = {}
+        with self.transaction() as cursor:
+            for i in range(0, len(ticket_ids), 500):
+                chunk = ticket_ids[i:i + 500]
+                cursor.execute(f"""
+                    SELECT ticket_id, title, description, status, assignee FROM jira_tickets
+                    WHERE ticket_id IN ({','.join('?' * len(chunk))})
+                """, chunk)
+                for row in cursor.fetchall():
+                    rows[row[0]] = {"id": row[0], "summary": row[1], "description": row[2],
+                                    "status": row[3], "assignee": row[4]}
+        return [rows[t] for t in ticket_ids if t in rows]
+
+    def delete_jira_tickets(self, ticket_ids: Iterable[str]) -> int:
+        rows = [(t,) for t in ticket_ids]
+        if not rows:
+            return 0
+        with self.transaction() as cursor:
+            cursor.executemany("DELETE FROM jira_tickets WHERE ticket_id = ?", rows)
+        return len(rows)
+
+    def upsert_git_commits(self, commits: Iterable[Dict[str, Any]], repo: str = "") -> int:
+        """
+        Insert or update commits (fetch_remote_git_history format) of one repository and their
+        changed files in one transaction. repo is the repository key (repo_cache_key of its URL).
+        """
+        commit_rows = []
+        file_rows = []
+        for commit in commits:
+            files = commit.get("files") or [{"path": p} for p in commit.get("changed_files", [])]
+            commit_rows.append((
+                repo,
+                commit["sha"],
+                commit["author"]["name"],
+                commit.get("committed_date") or commit.get("authored_date"),
+                commit.get("message", ""),
+                json.dumps([f["path"] for f in files]),
+                json.dumps({"author_email": commit["author"].get("email"),
+                            "authored_date": commit.get("authored_date")})
+            ))
+            for f in files:
+                file_rows.append((
+                    repo, commit["sha"], f["path"], f["path"].replace("\\", "/").rsplit("/", 1)[-1],
+                    f.get("change_type"), f.get("insertions"), f.get("deletions")
+                ))
+        if not commit_rows:
+            return 0
+        with self.transaction() as cursor:
+            cursor.executemany("""
+                INSERT INTO git_commits (repo, commit_hash, author, date, message, files_changed, diff_summary)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(repo, commit_hash) DO UPDATE SET
+                    author = excluded.author, date = excluded.date, message = excluded.message,
+                    files_changed = excluded.files_changed, diff_summary = excluded.diff_summary
+            """, commit_rows)
+            cursor.executemany("""
+                INSERT INTO commit_files (repo, commit_hash, file_path, file_name, change_type, insertions, deletions)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(repo, commit_hash, file_path) DO UPDATE SET
+                    change_type = excluded.change_type, insertions = excluded.insertions,
+                    deletions = excluded.deletions
+            """, file_rows)
+        return len(commit_rows)
+
+    def prune_git_commits(self, repo: str, keep: Iterable[str]) -> int:
+        """Delete the commits of repo that are not in keep (rewritten by a force-push). Returns the number deleted."""
+        keep = json.dumps(sorted(set(keep)))
+        with self.transaction() as cursor:
+            cursor.execute("""
+                DELETE FROM commit_files WHERE repo = ?
+                AND commit_hash NOT IN (SELECT value FROM json_each(?))
+            """, (repo, keep))
+            cursor.execute("""
+                DELETE FROM git_commits WHERE repo = ?
+                AND commit_hash NOT IN (SELECT value FROM json_each(?))
+            """, (repo, keep))
+            return cursor.rowcount
+
+    def has_git_commits(self, repo: str) -> bool:
+        with self.transaction() as cursor:
+            cursor.execute("SELECT 1 FROM git_commits WHERE repo = ? LIMIT 1", (repo,))
+            return cursor.fetchone() is not None
+
+    def file_change_stats(self, file_path: str, repo: str, since: str = None) -> Dict[str, Any]:
+        """
+        How often a file changed in one repository and who changed it, from commit_files.
+        A bare file name (e.g. 'utils.py') matches that name in any directory; since (an ISO
+        date) restricts the count to commits made on or after it.
+        """
+        column = "file_path" if "/" in file_path or "\\" in file_path else "file_name"
+        where = f"f.repo = ? AND f.{column} = ?"
+        params = [repo, file_path.replace("\\", "/")]
+        if since:
+            where += " AND c.date >= ?"
+            params.append(since)
+        with self.transaction() as cursor:
+            cursor.execute(f"""
+                SELECT c.author, COUNT(DISTINCT c.commit_hash), MAX(c.date)
+                FROM commit_files f JOIN git_commits c ON c.repo = f.repo AND c.commit_hash = f.commit_hash
+                WHERE {where}
+                GROUP BY c.author
+                ORDER BY COUNT(DISTINCT c.commit_hash) DESC
+            """, params)
+            authors = [{"author": r[0], "commits": r[1], "last_change": r[2]} for r in cursor.fetchall()]
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT f.commit_hash), COUNT(DISTINCT f.file_path)
+                FROM commit_files f JOIN git_commits c ON c.repo = f.repo AND c.commit_hash = f.commit_hash
+                WHERE {where}
+            """, params)
+            total, paths = cursor.fetchone()
+        return {"file": file_path, "since": since, "commits": total, "matching_paths": paths, "authors": authors}
+
+    def load_scan_state(self, key: str) -> Dict[str, Any]:
+        with self.transaction() as cursor:
+            cursor.execute("SELECT value FROM scan_state WHERE key = ?", (key,))
+            row = cursor.fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def scan_states(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        """All saved states whose key starts with prefix, by key"""
+        with self.transaction() as cursor:
+            cursor.execute("SELECT key, value FROM scan_state WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            return {key: json.loads(value) for key, value in cursor.fetchall()}
+
+    def save_scan_state(self, key: str, state: Dict[str, Any]):
+        with self.transaction() as cursor:
+            cursor.execute("INSERT OR REPLACE INTO scan_state (key, value) VALUES (?, ?)",
+                           (key, json.dumps(state)))
+
     def query_similar_patterns(self, query_type: str, language: str = None, 
                               limit: int = 10) -> List[Dict]:
         """Query similar code patterns"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         sql = """
             SELECT file_path, code_snippet, metadata 
             FROM code_patterns 
@@ -103,27 +497,76 @@ class DevelopmentContextManager:
             sql += " AND language = ?"
             params.append(language)
             
-        sql += f" LIMIT {limit}"
+        sql += " LIMIT ?"
+        params.append(int(limit))
         
-        cursor.execute(sql, params)
-        results = cursor.fetchall()
-        conn.close()
+        with self.transaction() as cursor:
+            cursor.execute(sql, params)
+            results = cursor.fetchall()
         
         return [{"file_path": r[0], "code": r[1], "metadata": json.loads(r[2])} 
                 for r in results]
     
+    def search_context(self, query: str, sources: Iterable[str] = None, limit: int = 10,
+                       match_any: bool = False) -> List[Dict[str, Any]]:
+        """
+        Ranked keyword search over code patterns, JIRA tickets and git commits.
+
+        Args:
+            query: Free-text keywords
+            sources: Subset of 'code', 'jira', 'git' (default: all)
+            limit: Maximum number of hits returned
+            match_any: Match any keyword instead of all of them
+
+        Returns:
+            Hits ordered by BM25 rank with source, key, snippet and highlight ([...] marks matches)
+        """
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        sources = list(sources or FTS_SOURCES.keys())
+        hits = []
+        with self.transaction() as cursor:
+            for source in sources:
+                spec = FTS_SOURCES[source]
+                if self.fts_enabled:
+                    # Quoted prefix terms: keywords never leak FTS5 query syntax
+                    match = (" OR " if match_any else " ").join(f'"{t}"*' for t in terms)
+                    cursor.execute(f"""
+                        SELECT t.{spec['key']}, bm25({spec['fts']}) AS rank,
+                               snippet({spec['fts']}, -1, '[', ']', '...', 16),
+                               highlight({spec['fts']}, {spec['title_column']}, '[', ']')
+                        FROM {spec['fts']} JOIN {spec['table']} t ON t.id = {spec['fts']}.rowid
+                        WHERE {spec['fts']} MATCH ?
+                        ORDER BY rank
+                        LIMIT ?
+                    """, (match, int(limit)))
+                else:
+                    columns = spec["columns"]
+                    joiner = " OR " if match_any else " AND "
+                    where = joiner.join(
+                        "(" + " OR ".join(f"{c} LIKE ?" for c in columns) + ")" for _ in terms
+                    )
+                    params = [f"%{t}%" for t in terms for _ in columns]
+                    title = columns[spec["title_column"]]
+                    cursor.execute(f"""
+                        SELECT {spec['key']}, 0.0, substr({columns[-1]}, 1, 200), {title}
+                        FROM {spec['table']} WHERE {where} LIMIT ?
+                    """, params + [int(limit)])
+                for key, rank, snippet, highlight in cursor.fetchall():
+                    hits.append({"source": source, "key": key, "rank": rank,
+                                 "snippet": snippet, "highlight": highlight})
+        hits.sort(key=lambda h: h["rank"])
+        return hits[:limit]
+
     def get_folder_structure_examples(self, language: str) -> Dict[str, List[str]]:
         """Get common folder structures for a language"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT DISTINCT file_path FROM code_patterns 
-            WHERE language = ?
-        """, (language,))
-        
-        file_paths = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        with self.transaction() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT file_path FROM code_patterns 
+                WHERE language = ?
+            """, (language,))
+            file_paths = [row[0] for row in cursor.fetchall()]
         
         # Analyze folder patterns
         folders = {}
@@ -150,10 +593,6 @@ class DevelopmentContextManager:
         return names
 
 # Enhanced tools for the multi-agent
-import os
-import ast
-import re
-from pathlib import Path
 
 # Global context manager instance
 context_manager = None
@@ -166,9 +605,41 @@ def get_context_manager():
         context_manager = DevelopmentContextManager(workspace_path)
     return context_manager
 
-def scan_codebase(query):
-    """Tool to scan and analyze codebase patterns"""
+# Code file extensions scanned for patterns
+SCAN_EXTENSIONS = {'.py': 'python', '.js': 'javascript', '.java': 'java',
+                   '.ts': 'typescript', '.cpp': 'cpp', '.c': 'c'}
+# Default per-call budget; the next call resumes from the checkpoint
+SCAN_TIME_BUDGET = float(os.getenv('SCAN_TIME_BUDGET', '20'))
+
+def extract_code_patterns(file_path: str, content: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """Extract (pattern_type, code_snippet, metadata) patterns from one file"""
+    patterns = []
+    if file_path.endswith('.py'):
+        tree = ast.parse(content)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ClassDef):
+                patterns.append(('class', f"class {node.name}:", {"name": node.name, "file": file_path}))
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                patterns.append(('function', f"def {node.name}():", {"name": node.name, "file": file_path}))
+    elif file_path.endswith(('.js', '.ts')):
+        symbols = scan_js(content)
+        for cls in symbols['classes']:
+            patterns.append(('class', f"{cls.get('kind', 'class')} {cls['name']}",
+                             {"name": cls['name'], "file": file_path, "line": cls['line']}))
+        for function in symbols['functions']:
+            patterns.append(('function', f"function {function['name']}()",
+                             {"name": function['name'], "file": file_path, "line": function['line']}))
+    return patterns
+
+def scan_codebase(query, root='.', time_budget=None, max_files=None):
+    """
+    Tool to scan and analyze codebase patterns.
+    Walks the tree once, re-scans only files whose size/mtime/content changed since the last
+    scan, and stops at the time or file budget; the next call resumes from the checkpoint.
+    """
     cm = get_context_manager()
+    started = time.monotonic()
+    time_budget = SCAN_TIME_BUDGET if time_budget is None else float(time_budget)
     
     # Extract language or pattern type from query
     query_lower = query.lower()
@@ -182,45 +653,78 @@ def scan_codebase(query):
     else:
         language = None
     
-    # Scan current directory for code files
-    code_files = []
-    extensions = {'.py': 'python', '.js': 'javascript', '.java': 'java', 
-                  '.ts': 'typescript', '.cpp': 'cpp', '.c': 'c'}
-    
-    for ext, lang in extensions.items():
-        if language is None or lang == language:
-            code_files.extend(Path('.').rglob(f'*{ext}'))
-    
-    patterns_found = 0
-    for file_path in code_files[:10]:  # Limit for MVP
+    # Single walk over the tree, in a stable order so the checkpoint is meaningful. Only source
+    # files are listed, and none is opened here: binary content is detected when a file is read
+    extensions = [ext for ext, lang in SCAN_EXTENSIONS.items() if language is None or lang == language]
+    candidates = []
+    for path, rel_path, size in walk_files(root, skip_binary=False, extensions=extensions):
+        candidates.append((rel_path, path, size, SCAN_EXTENSIONS[os.path.splitext(rel_path)[1]]))
+        if time.monotonic() - started >= time_budget:
+            return (f"Codebase scan stopped at the time budget ({time_budget:.0f}s) while listing files "
+                    f"({len(candidates)} found so far); run again with a larger time_budget.")
+    candidates.sort()
+
+    state_key = f"scan:{os.path.abspath(root)}:{language or 'all'}"
+    state = cm.load_scan_state(state_key)
+    cursor = state.get("cursor", "")
+    pending = [c for c in candidates if c[0] > cursor] if cursor else candidates
+    fingerprints = cm.get_file_fingerprints()
+
+    scanned, failed = [], []
+    unchanged = patterns_found = processed = 0
+    last_path = cursor
+    for rel_path, path, size, lang in pending:
+        if time.monotonic() - started >= time_budget or (max_files and processed >= max_files):
+            break
+        processed += 1
+        last_path = rel_path
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-            # Simple pattern extraction
-            if file_path.suffix == '.py':
-                # Extract class and function names
-                try:
-                    tree = ast.parse(content)
-                    for node in ast.walk(tree):
-                        if isinstance(node, ast.ClassDef):
-                            cm.store_code_pattern(
-                                str(file_path), 'python', 'class',
-                                f"class {node.name}:", 
-                                {"name": node.name, "file": str(file_path)}
-                            )
-                            patterns_found += 1
-                        elif isinstance(node, ast.FunctionDef):
-                            cm.store_code_pattern(
-                                str(file_path), 'python', 'function',
-                                f"def {node.name}():", 
-                                {"name": node.name, "file": str(file_path)}
-                            )
-                            patterns_found += 1
-                except:
-                    pass
-        except:
-            continue
+            mtime_ns = os.stat(path).st_mtime_ns
+            previous = fingerprints.get(rel_path)
+            if previous and previous[0] == size and previous[1] == mtime_ns:
+                unchanged += 1
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            content_hash = hashlib.md5(data).hexdigest()
+            patterns = None
+            if previous and previous[2] == content_hash:
+                unchanged += 1
+            elif is_binary_data(data[:SNIFF_BYTES]):
+                patterns = []
+            else:
+                patterns = extract_code_patterns(rel_path, data.decode('utf-8'))
+                patterns_found += len(patterns)
+            scanned.append({"file_path": rel_path, "language": lang, "size": size, "mtime_ns": mtime_ns,
+                            "content_hash": content_hash, "patterns": patterns})
+        except (OSError, UnicodeDecodeError, SyntaxError, ValueError) as e:
+            failed.append(f"{rel_path} ({type(e).__name__})")
+        # Checkpoint in batches so an interrupted scan loses little work
+        if len(scanned) >= 200:
+            cm.replace_file_patterns(scanned)
+            cm.save_scan_state(state_key, {"cursor": last_path})
+            scanned = []
+    cm.replace_file_patterns(scanned)
+
+    complete = processed == len(pending)
+    if complete:
+        # Full pass done: forget deleted files and start over on the next call
+        if language is None:
+            seen = {c[0] for c in candidates}
+            cm.forget_files([p for p in fingerprints if p not in seen])
+        cm.save_scan_state(state_key, {"cursor": "", "last_full_scan": time.time()})
+    else:
+        cm.save_scan_state(state_key, {"cursor": last_path})
+    covered = len(candidates) - len(pending) + processed
+
+    if complete:
+        coverage = f"Covered all {len(candidates)} files"
+    else:
+        coverage = (f"Covered {covered}/{len(candidates)} files (stopped at budget"
+                    f"{' after ' + last_path if last_path else ''}; run again to resume)")
+    coverage += f" in {time.monotonic() - started:.1f}s: {processed - unchanged - len(failed)} rescanned, {unchanged} unchanged"
+    if failed:
+        coverage += f", {len(failed)} failed: {', '.join(failed[:5])}"
     
     # Get folder structure analysis
     if language:
@@ -229,7 +733,16 @@ def scan_codebase(query):
     else:
         folder_info = "Multiple languages detected"
     
-    return f"Codebase scan completed. Found {patterns_found} patterns. {folder_info}. Use specific queries like 'python naming conventions' for detailed analysis."
+    return f"Codebase scan completed. Found {patterns_found} patterns. {coverage}. {folder_info}. Use specific queries like 'python naming conventions' for detailed analysis."
+
+def search_dev_context(query):
+    """Tool for fast keyword search across code patterns, JIRA tickets and git commits"""
+    cm = get_context_manager()
+    hits = cm.search_context(query, limit=10)
+    if not hits:
+        return f"No code patterns, JIRA tickets or commits match '{query}'."
+    lines = [f"[{h['source']}] {h['key']}: {h['highlight']} | {h['snippet']}" for h in hits]
+    return "\n".join(lines)
 
 def analyze_jira_history(query):
     """Tool to analyze JIRA ticket patterns"""
@@ -249,7 +762,6 @@ def check_git_conventions(query):
     
     # Simple git log analysis
     try:
-        import subprocess
         result = subprocess.run(['git', 'log', '--oneline', '-10'], 
                               capture_output=True, text=True, cwd='.')
         
@@ -271,3 +783,42 @@ def check_git_conventions(query):
             
     except Exception as e:
         return f"Git analysis failed: {str(e)}. Ensure git is installed and this is a git repository."
+
+
+def benchmark_pattern_writes(rows: int = 2000, workspace_path: str = None) -> Dict[str, float]:
+    """Compare rows/second for per-row connect+commit writes against the bulk store_code_patterns path"""
+    workspace = Path(workspace_path or tempfile.mkdtemp(prefix='dev_context_bench_'))
+    cm = DevelopmentContextManager(str(workspace))
+    patterns = [(f"src/module_{i % 50}.py", 'python', 'function', f"def bench_{i}():",
+                 {"name": f"bench_{i}"}) for i in range(rows)]
+
+    # Previous behaviour: a new connection, one INSERT and one commit per pattern
+    start = time.perf_counter()
+    for file_path, language, pattern_type, snippet, metadata in patterns:
+        conn = sqlite3.connect(cm.db_path)
+        conn.execute("""
+            INSERT OR REPLACE INTO code_patterns
+            (file_path, language, pattern_type, code_snippet, metadata, hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (file_path, language, pattern_type, snippet + " ",
+              json.dumps(metadata), hashlib.md5((snippet + " ").encode()).hexdigest()))
+        conn.commit()
+        conn.close()
+    per_row_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cm.store_code_patterns(patterns)
+    bulk_seconds = time.perf_counter() - start
+    cm.close()
+    return {
+        "rows": rows,
+        "per_row_rows_per_sec": rows / per_row_seconds,
+        "bulk_rows_per_sec": rows / bulk_seconds,
+        "speedup": per_row_seconds / bulk_seconds
+    }
+
+
+if __name__ == "__main__":
+    results = benchmark_pattern_writes()
+    print(f"{results['rows']} rows: per-row {results['per_row_rows_per_sec']:.0f} rows/s, "
+          f"bulk {results['bulk_rows_per_sec']:.0f} rows/s ({results['speedup']:.1f}x)")
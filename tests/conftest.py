@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def git(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+class SourceRepo:
+    """A bare repository plus a working clone that commits and pushes to it."""
+
+    def __init__(self, root):
+        self.url = str(root / "origin.git")
+        self.work = str(root / "work")
+        git("init", "--quiet", "--bare", "--initial-branch=main", self.url)
+        git("init", "--quiet", "--initial-branch=main", self.work)
+        git("remote", "add", "origin", self.url, cwd=self.work)
+
+    def commit(self, files, message="change", author="Alice"):
+        """Write files ({path: text or None to delete}), commit and push. Returns the commit sha."""
+        for path, text in files.items():
+            full_path = os.path.join(self.work, path)
+            if text is None:
+                os.remove(full_path)
+                continue
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w", encoding="utf-8") as f:
+                f.write(text)
+        git("add", "--all", cwd=self.work)
+        git("-c", f"user.name={author}", "-c", f"user.email={author.lower()}@example.com",
+            "commit", "--quiet", "-m", message, cwd=self.work)
+        git("push", "--quiet", "origin", "main", cwd=self.work)
+        self.head = git("rev-parse", "HEAD", cwd=self.work)
+        return self.head
+
+
+@pytest.fixture
+def source_repo(tmp_path):
+    repo = SourceRepo(tmp_path / "source")
+    repo.commit({"README.md": "hello\n"}, "initial")
+    return repo
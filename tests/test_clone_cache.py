@@ -0,0 +1,104 @@
+import glob
+import os
+import shutil
+
+import pytest
+
+from tools.utils.clone_cache import FileLock, MirrorStore, _is_intact, repo_cache_key
+
+
+@pytest.fixture
+def mirrors(tmp_path):
+    return MirrorStore(str(tmp_path / "cache"))
+
+
+def test_lease_clones_bare_mirror(mirrors, source_repo):
+    with mirrors.lease(source_repo.url) as path:
+        assert os.path.isfile(os.path.join(path, "HEAD"))
+        branch, sha = mirrors.resolve_branch(path)
+    assert (branch, sha) == ("main", source_repo.head)
+
+
+def test_lease_fetches_new_commits(mirrors, source_repo):
+    with mirrors.lease(source_repo.url) as path:
+        first = mirrors.resolve_branch(path)[1]
+    newer = source_repo.commit({"a.txt": "a\n"})
+    with mirrors.lease(source_repo.url) as path:
+        assert mirrors.resolve_branch(path)[1] == newer != first
+
+
+def test_lease_within_max_age_does_not_fetch(mirrors, source_repo):
+    with mirrors.lease(source_repo.url) as path:
+        first = mirrors.resolve_branch(path)[1]
+    source_repo.commit({"a.txt": "a\n"})
+    with mirrors.lease(source_repo.url, max_age=3600) as path:
+        assert mirrors.resolve_branch(path)[1] == first
+
+
+def test_resolve_missing_branch_raises(mirrors, source_repo):
+    with mirrors.lease(source_repo.url) as path:
+        with pytest.raises(ValueError):
+            mirrors.resolve_branch(path, "nope")
+
+
+def test_fetch_failure_keeps_mirror(mirrors, source_repo):
+    with mirrors.lease(source_repo.url) as path:
+        sha = mirrors.resolve_branch(path)[1]
+    shutil.move(source_repo.url, source_repo.url + ".offline")
+    with mirrors.lease(source_repo.url) as path:
+        assert mirrors.resolve_branch(path)[1] == sha
+
+
+def test_corrupt_mirror_is_recloned(mirrors, source_repo):
+    with mirrors.lease(source_repo.url) as path:
+        sha = mirrors.resolve_branch(path)[1]
+    for name in glob.glob(os.path.join(path, "objects", "??", "*")) + glob.glob(os.path.join(path, "objects", "pack", "*")):
+        os.chmod(name, 0o644)
+        os.remove(name)
+    assert not _is_intact(path)
+    with mirrors.lease(source_repo.url) as path:
+        assert _is_intact(path)
+        assert mirrors.resolve_branch(path)[1] == sha
+
+
+def test_evict_removes_least_recently_used(tmp_path, source_repo):
+    mirrors = MirrorStore(str(tmp_path / "cache"), max_bytes=0)
+    other = tmp_path / "other.git"
+    shutil.copytree(source_repo.url, other)
+    with mirrors.lease(source_repo.url):
+        pass
+    # Leasing the other repo evicts the first one, which no longer fits the quota
+    with mirrors.lease(str(other)) as path:
+        assert os.path.isdir(path)
+    keys = [entry["key"] for entry in mirrors.entries()]
+    assert keys == [repo_cache_key(str(other))]
+
+
+def test_evict_skips_locked_mirror(tmp_path, source_repo):
+    mirrors = MirrorStore(str(tmp_path / "cache"), max_bytes=0)
+    with mirrors.lease(source_repo.url):
+        pass
+    key = repo_cache_key(source_repo.url)
+    with FileLock(os.path.join(mirrors.cache_dir, f".{key}.lock")):
+        assert mirrors.evict() == []
+    assert mirrors.evict() == [key]
+
+
+def test_evict_runs_when_block_raises(mirrors, source_repo, monkeypatch):
+    calls = []
+    monkeypatch.setattr(mirrors, "evict", lambda keep=None: calls.append(keep))
+    with pytest.raises(RuntimeError):
+        with mirrors.lease(source_repo.url):
+            raise RuntimeError("boom")
+    assert calls == [repo_cache_key(source_repo.url)]
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "x.lock")
+    with FileLock(path):
+        assert not FileLock(path).acquire(blocking=False)
+        with pytest.raises(TimeoutError):
+            FileLock(path, timeout=0.2, poll_interval=0.05).acquire()
+    other = FileLock(path)
+    assert other.acquire(blocking=False)
+    other.release()
@@ -0,0 +1,44 @@
+import os
+
+from tools.utils.clone_cache import MirrorStore
+from tools.utils.git_object_reader import GitObjectReader
+
+
+def _mirror(tmp_path, source_repo):
+    mirrors = MirrorStore(str(tmp_path / "cache"))
+    with mirrors.lease(source_repo.url) as path:
+        return path
+
+
+def test_list_tree_and_read_blob(tmp_path, source_repo):
+    sha = source_repo.commit({"src/app.py": "print('hi')\n"})
+    os.symlink("README.md", os.path.join(source_repo.work, "link"))
+    sha = source_repo.commit({})
+    path = _mirror(tmp_path, source_repo)
+    with GitObjectReader(path) as reader:
+        assert reader.resolve("main") == sha
+        entries = {p: (blob, size) for p, blob, size in reader.list_tree(sha)}
+        assert set(entries) == {"README.md", "src/app.py"}
+        assert entries["src/app.py"][1] == len("print('hi')\n")
+        assert reader.read_blob(entries["src/app.py"][0]) == b"print('hi')\n"
+        assert reader.read_blob(entries["README.md"][0]) == b"hello\n"
+
+
+def test_iter_blobs_reuses_known_shas(tmp_path, source_repo):
+    first = source_repo.commit({"a.py": "a = 1\n", "b.py": "b = 1\n"})
+    second = source_repo.commit({"b.py": "b = 2\n", "c.py": "c = 1\n"})
+    path = _mirror(tmp_path, source_repo)
+    with GitObjectReader(path) as reader:
+        known = {p: blob for p, blob, _ in reader.iter_blobs(first)}
+        read = {p: data for p, _, data in reader.iter_blobs(second, known_shas=known)}
+    assert read["a.py"] is None and read["README.md"] is None
+    assert read["b.py"] == b"b = 2\n"
+    assert read["c.py"] == b"c = 1\n"
+
+
+def test_iter_blobs_include_filter(tmp_path, source_repo):
+    sha = source_repo.commit({"a.py": "a\n", "big.txt": "x" * 100})
+    path = _mirror(tmp_path, source_repo)
+    with GitObjectReader(path) as reader:
+        paths = [p for p, _, _ in reader.iter_blobs(sha, include=lambda p, size: size < 50)]
+    assert sorted(paths) == ["README.md", "a.py"]
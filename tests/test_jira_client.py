@@ -0,0 +1,111 @@
+import io
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from urllib3 import HTTPResponse
+
+from tools.utils import jira_client
+from tools.utils.jira_client import iter_issues
+
+URL = "http://jira.test/rest/api/latest/search"
+
+
+class StubJira(BaseAdapter):
+    """Transport adapter answering JIRA searches over `total` issues, at most `cap` per page."""
+
+    def __init__(self, total, cap=100, delays=None):
+        super().__init__()
+        self.total = total
+        self.cap = cap
+        self.delays = delays or {}     # startAt -> seconds before answering
+        self.queued = {}               # startAt -> [(status, headers)] answered before the page
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        params = {key: values[0] for key, values in parse_qs(urlparse(request.url).query).items()}
+        start_at, max_results = int(params["startAt"]), int(params["maxResults"])
+        with self.lock:
+            self.requests.append((start_at, max_results))
+            queued = self.queued.get(start_at)
+            status, headers = queued.pop(0) if queued else (200, {})
+        if start_at in self.delays:
+            time.sleep(self.delays[start_at])
+        step = min(max_results, self.cap)
+        body = {"startAt": start_at, "maxResults": step, "total": self.total,
+                "issues": [{"key": f"P-{i}", "fields": {"summary": f"issue {i}"}}
+                           for i in range(start_at, min(start_at + step, self.total))]}
+        if status != 200:
+            body = {"errorMessages": [f"HTTP {status}"]}
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response.raw = HTTPResponse(body=io.BytesIO(json.dumps(body).encode()), preload_content=False)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def _session(adapter):
+    session = requests.Session()
+    session.mount("http://", adapter)
+    return session
+
+
+@pytest.fixture(params=[True, False], ids=["ijson", "json"])
+def parser(request, monkeypatch):
+    if request.param:
+        pytest.importorskip("ijson")
+    monkeypatch.setattr(jira_client, "IJSON_AVAILABLE", request.param)
+    return request.param
+
+
+def test_issue_order_across_pages(parser):
+    # Earlier pages answer last, so pages complete out of order
+    stub = StubJira(total=25, cap=5, delays={5: 0.2, 10: 0.1})
+    keys = [issue["key"] for issue in iter_issues(URL, None, "project = P", page_size=5, session=_session(stub))]
+    assert keys == [f"P-{i}" for i in range(25)]
+
+
+def test_server_capped_max_results(parser):
+    stub = StubJira(total=10, cap=3)
+    issues = list(iter_issues(URL, None, "project = P", page_size=100, session=_session(stub)))
+    assert [issue["key"] for issue in issues] == [f"P-{i}" for i in range(10)]
+    assert sorted(stub.requests) == [(0, 100), (3, 3), (6, 3), (9, 3)]
+
+
+def test_retries_throttled_page_honoring_retry_after(parser, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(jira_client.time, "sleep", sleeps.append)
+    stub = StubJira(total=4, cap=2)
+    stub.queued[2] = [(429, {"Retry-After": "3"})]
+    keys = [issue["key"] for issue in iter_issues(URL, None, "project = P", session=_session(stub))]
+    assert keys == ["P-0", "P-1", "P-2", "P-3"]
+    assert sleeps == [3.0]
+    assert [request for request in stub.requests if request[0] == 2] == [(2, 2), (2, 2)]
+
+
+def test_gives_up_on_client_error():
+    stub = StubJira(total=4)
+    stub.queued[0] = [(400, {})]
+    with pytest.raises(Exception, match="400"):
+        list(iter_issues(URL, None, "bad jql", session=_session(stub)))
+
+
+def test_requests_later_pages_before_page_one_is_consumed(parser):
+    stub = StubJira(total=9, cap=3)
+    issues = iter_issues(URL, None, "project = P", max_workers=2, session=_session(stub))
+    assert next(issues)["key"] == "P-0"
+    deadline = time.time() + 5
+    while len(stub.requests) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(start_at for start_at, _ in stub.requests) == [0, 3, 6]
+    assert [issue["key"] for issue in issues] == [f"P-{i}" for i in range(1, 9)]
@@ -5,132 +5,246 @@ import openai
 import os
 import json
 import ast
-def train_agent_on_github_repo(repo_url, output_path=None):
+from tools.utils.code_chunker import chunk_file, DEFAULT_MAX_TOKENS
+from tools.utils.sources import codebase_entry_ids
+from tools.utils.clone_cache import get_mirror_store
+from tools.utils.git_object_reader import GitObjectReader
+from tools.utils.js_scanner import scan_js, is_minified_or_vendored
+from tools.utils.file_walker import (walk_files, read_text_file, should_index_path, is_binary_data,
+                                     SNIFF_BYTES, DEFAULT_MAX_FILE_SIZE)
+
+JS_EXTENSIONS = ('.js', '.ts', '.jsx', '.tsx', '.mjs', '.cjs')
+
+def train_agent_on_github_repo(repo_url, output_path=None, branch=None):
     """
-    Clones a GitHub repo, indexes its codebase, and updates the agent's knowledge base.
+    Indexes a GitHub repo's codebase and updates the agent's knowledge base.
+    The repo is read straight from its bare mirror in the shared mirror store, which
+    is only fetched into on later calls.
     """
-    target_dir = os.getcwd() + '/target'  # Use current working directory
-    repo_name = repo_url.rstrip('/').split('/')[-1].replace('.git', '')
-    clone_path = os.path.join(target_dir, repo_name)
-    # Ensure target_dir is empty before cloning
-    if os.path.exists(target_dir):
-        # Remove target_dir even if it contains read-only files
-        def onerror(func, path, exc_info):
-            import stat
-            os.chmod(path, stat.S_IWRITE)
-            func(path)
-        shutil.rmtree(target_dir, onerror=onerror)
     try:
-        print(f"Cloning repo {repo_url} to {target_dir}...")
-        subprocess.run(["git", "clone", repo_url, target_dir], check=True)
-        print("Generating codebase index...")
-        result = generate_codebase_index(codebase_path=target_dir, output_path=output_path)
+        store = get_mirror_store()
+        with store.lease(repo_url) as mirror_path:
+            branch, commit = store.resolve_branch(mirror_path, branch)
+            print(f"Generating codebase index for {branch} ({commit[:7]})...")
+            result = index_git_ref(mirror_path, commit, output_path=output_path)
         print(result)
         return result
     except Exception as e:
         return f"[ERROR] Failed to train agent on repo: {e}"
    
-def convert_codebase_index_to_faiss():
+def convert_codebase_index_to_faiss(json_file_path=None, faiss_index_path=None):
     """
     Convert codebase_index.json to FAISS index for semantic search.
     """
     from tools.utils.faiss_converter import codebase_json_to_faiss
-    json_file_path = os.path.join(os.path.dirname(__file__), '..', 'output', 'codebase_index.json')
-    faiss_index_path = os.path.join(os.path.dirname(__file__), '..', 'output', 'codebase_faiss_index')
+    if json_file_path is None:
+        json_file_path = os.path.join(os.path.dirname(__file__), '..', 'output', 'codebase_index.json')
+    if faiss_index_path is None:
+        faiss_index_path = os.path.join(os.path.dirname(__file__), '..', 'output', 'codebase_faiss_index')
     
     faiss_index = codebase_json_to_faiss(json_file_path, faiss_index_path)
     print(f"FAISS index created at {faiss_index_path}")
 
-def generate_codebase_index(codebase_path=None, output_path=None):
+def generate_codebase_index(codebase_path=None, output_path=None, max_chunk_tokens=DEFAULT_MAX_TOKENS,
+                            ignore_patterns=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
     """
     Scans the codebase directory for Python and TypeScript/JavaScript files, extracts function/class names and docstrings/comments, and saves the index as JSON.
+    File contents are stored as chunks of at most max_chunk_tokens tokens, split on top-level definitions.
+    .gitignore'd, vendored, binary and oversized files are skipped (see tools.utils.file_walker).
     """
     if codebase_path is None:
         codebase_path = os.path.join(os.path.dirname(__file__), '..', '..', 'codebase')
     if output_path is None:
         output_path = os.path.join(os.path.dirname(__file__), '..', 'output', 'codebase_index.json')
     index = []
-    import re
-    function_regex = re.compile(r'(?:function\s+|const\s+|let\s+|var\s+)?([a-zA-Z0-9_]+)\s*\([^)]*\)\s*{')
-    class_regex = re.compile(r'class\s+([a-zA-Z0-9_]+)')
-    for root, dirs, files in os.walk(codebase_path):
-        # Skip any directory containing '.git' in its path
-        if '.git' in root:
-            continue
-        dirs[:] = [d for d in dirs if '.git' not in d and d not in ['__pycache__', '.svn', '.hg']]
-        for file in files:
-            file_path = os.path.join(root, file)
-            # Skip any file containing '.git' in its path
-            if '.git' in file_path:
+    stats = {}
+    for file_path, rel_path, size in walk_files(codebase_path, ignore_patterns=ignore_patterns,
+                                                max_file_size=max_file_size, stats=stats):
+        file_content = read_text_file(file_path, size)
+        index.extend(index_file_content(file_path, file_content, max_chunk_tokens))
+    print(f"Indexed {stats['files']} files; skipped {stats['ignored']} ignored, "
+          f"{stats['binary']} binary and {stats['too_large']} oversized.")
+    return _save_codebase_index(index, output_path)
+
+
+def index_git_ref(repo_path, ref='HEAD', output_path=None, max_chunk_tokens=DEFAULT_MAX_TOKENS,
+                  faiss_index_path=None, build_faiss=True, ignore_patterns=None,
+                  max_file_size=DEFAULT_MAX_FILE_SIZE):
+    """
+    Index the tree at ref straight from git objects, without checking it out.
+    Blob shas are remembered next to the index, so files whose blob is unchanged
+    since the previous run reuse their old entries instead of being re-read. Entries are
+    only reused when they were built with the same chunking and file selection settings.
+    """
+    if output_path is None:
+        output_path = os.path.join(os.path.dirname(__file__), '..', 'output', 'codebase_index.json')
+    state_path = output_path + '.blobs.json'
+    settings = {
+        'max_chunk_tokens': max_chunk_tokens,
+        'ignore_patterns': list(ignore_patterns) if ignore_patterns is not None else None,
+        'max_file_size': max_file_size
+    }
+    known_shas = {}
+    known_commit = None
+    previous_entries = {}
+    if os.path.exists(state_path) and os.path.exists(output_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('settings') == settings:
+            known_shas = state.get('blobs', {})
+        else:
+            print("Indexing settings changed since the previous run; re-reading every file")
+        known_commit = state.get('commit')
+        with open(output_path, 'r', encoding='utf-8') as f:
+            for entry in json.load(f):
+                previous_entries.setdefault(entry.get('file'), []).append(entry)
+
+    index = []
+    blobs = {}
+    changed = {}
+    reused = 0
+    with GitObjectReader(repo_path) as reader:
+        commit = reader.resolve(ref)
+        include = lambda path, size: should_index_path(path, size, ignore_patterns=ignore_patterns,
+                                                       max_file_size=max_file_size)
+        for path, sha, data in reader.iter_blobs(commit, known_shas, include=include):
+            blobs[path] = sha
+            if data is None and path in previous_entries:
+                index.extend(previous_entries[path])
+                reused += 1
+                continue
+            changed[path] = []
+            if data is None:
+                data = reader.read_blob(sha)
+            if is_binary_data(data[:SNIFF_BYTES]):
                 continue
-            # Read file content (truncate to first 1000 chars for large files)
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    file_content = f.read()
-            except Exception:
+                file_content = data.decode('utf-8')
+            except UnicodeDecodeError:
                 file_content = ''
-            half_length = len(file_content) // 2
-            half_content = file_content[:half_length] + ('...' if len(file_content) > half_length else '')
-            # Add file-level entry with half content
-            index.append({
-                'type': 'file',
-                'name': file,
-                'file': file_path,
-                'content': half_content
-            })
-            if file.endswith('.py'):
-                try:
-                    tree = ast.parse(file_content, filename=file_path)
-                    for node in ast.walk(tree):
-                        if isinstance(node, ast.FunctionDef):
-                            index.append({
-                                'type': 'function',
-                                'name': node.name,
-                                'doc': ast.get_docstring(node),
-                                'file': file_path
-                            })
-                        elif isinstance(node, ast.ClassDef):
-                            index.append({
-                                'type': 'class',
-                                'name': node.name,
-                                'doc': ast.get_docstring(node),
-                                'file': file_path
-                            })
-                except Exception:
-                    pass
-            elif file.endswith('.ts') or file.endswith('.js'):
-                # Extract comments
-                lines = file_content.splitlines()
-                comments = [line.strip() for line in lines if line.strip().startswith('//') or line.strip().startswith('/*')]
-                # Extract functions
-                for match in function_regex.finditer(file_content):
+            changed[path] = index_file_content(path, file_content, max_chunk_tokens)
+            index.extend(changed[path])
+
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump({'ref': ref, 'commit': commit, 'settings': settings, 'blobs': blobs}, f)
+    print(f"Indexed {ref} ({commit[:7]}) from git objects; {reused} unchanged files reused.")
+    # Entries of re-read and deleted files are replaced in the FAISS index by their file + symbol ids
+    stale_files = set(changed) | (set(previous_entries) - set(blobs))
+    delta = {
+        'base_commit': known_commit,
+        'commit': commit,
+        'entries': [entry for entries in changed.values() for entry in entries],
+        'removed_ids': [doc_id for path in stale_files for doc_id in codebase_entry_ids(previous_entries.get(path, []))]
+    }
+    return _save_codebase_index(index, output_path, faiss_index_path, build_faiss, delta)
+
+
+def index_file_content(file_path, file_content, max_chunk_tokens=DEFAULT_MAX_TOKENS):
+    """Build the index entries (file, chunks, symbols, comments) for one file's content."""
+    file = os.path.basename(file_path)
+    is_js = file.endswith(JS_EXTENSIONS)
+    if is_js and is_minified_or_vendored(file_path, file_content):
+        # Bundles and vendored code only add noise to the index
+        return [{
+            'type': 'file',
+            'name': file,
+            'file': file_path,
+            'chunks': 0,
+            'skipped': 'minified or vendored'
+        }]
+    index = []
+    # Add file-level entry followed by its symbol-aligned content chunks
+    chunks = chunk_file(file_path, file_content, max_tokens=max_chunk_tokens)
+    index.append({
+        'type': 'file',
+        'name': file,
+        'file': file_path,
+        'chunks': len(chunks)
+    })
+    index.extend(chunks)
+    if file.endswith('.py'):
+        try:
+            tree = ast.parse(file_content, filename=file_path)
+            for node in ast.walk(tree):
+                if isinstance(node, ast.FunctionDef):
                     index.append({
                         'type': 'function',
-                        'name': match.group(1),
-                        'doc': '',
+                        'name': node.name,
+                        'doc': ast.get_docstring(node),
                         'file': file_path
                     })
-                # Extract classes
-                for match in class_regex.finditer(file_content):
+                elif isinstance(node, ast.ClassDef):
                     index.append({
                         'type': 'class',
-                        'name': match.group(1),
-                        'doc': '',
-                        'file': file_path
-                    })
-                # Add file-level comments
-                if comments:
-                    index.append({
-                        'type': 'comments',
-                        'name': file,
-                        'comments': comments,
+                        'name': node.name,
+                        'doc': ast.get_docstring(node),
                         'file': file_path
                     })
+        except Exception:
+            pass
+    elif is_js:
+        symbols = scan_js(file_content)
+        for function in symbols['functions']:
+            index.append({
+                'type': 'function',
+                'name': function['name'],
+                'doc': function['doc'],
+                'file': file_path,
+                'line': function['line']
+            })
+        for cls in symbols['classes']:
+            index.append({
+                'type': 'class',
+                'name': cls['name'],
+                'doc': cls['doc'],
+                'file': file_path,
+                'line': cls['line']
+            })
+        # Add file-level exports and comments
+        if symbols['exports']:
+            index.append({
+                'type': 'exports',
+                'name': file,
+                'exports': symbols['exports'],
+                'file': file_path
+            })
+        if symbols['comments']:
+            index.append({
+                'type': 'comments',
+                'name': file,
+                'comments': symbols['comments'],
+                'file': file_path
+            })
+    return index
+
+
+def _save_codebase_index(index, output_path, faiss_index_path=None, build_faiss=True, delta=None):
+    """
+    Write the index JSON and bring its FAISS index up to date. With a delta from index_git_ref,
+    only changed entries are re-embedded when the FAISS index was built from the delta's base commit.
+    """
     with open(output_path, 'w', encoding='utf-8') as out:
         json.dump(index, out, indent=2)
     print(f"Codebase index generated at {output_path} with {len(index)} entries.")
-    convert_codebase_index_to_faiss()
-    return f"Codebase index generated at {output_path} with {len(index)} entries. FAISS index created."
+    if not build_faiss:
+        return f"Codebase index generated at {output_path} with {len(index)} entries."
+    from tools.utils.faiss_converter import codebase_entries_to_faiss
+    if faiss_index_path is None:
+        faiss_index_path = os.path.join(os.path.dirname(__file__), '..', 'output', 'codebase_faiss_index')
+    source_path = os.path.join(faiss_index_path, 'source.json')
+    source = {}
+    if os.path.exists(source_path):
+        with open(source_path, 'r', encoding='utf-8') as f:
+            source = json.load(f)
+    if (delta and delta['base_commit'] and source.get('commit') == delta['base_commit']
+            and source.get('index_file') == os.path.abspath(output_path)):
+        codebase_entries_to_faiss(delta['entries'], faiss_index_path, removed_ids=delta['removed_ids'])
+    else:
+        convert_codebase_index_to_faiss(output_path, faiss_index_path)
+    if os.path.isdir(faiss_index_path):
+        with open(source_path, 'w', encoding='utf-8') as f:
+            json.dump({'index_file': os.path.abspath(output_path), 'commit': delta and delta['commit']}, f)
+    return f"Codebase index generated at {output_path} with {len(index)} entries. FAISS index updated."
     
 def search_codebase_index(query, index_path=None, max_results=5):
     if index_path is None:
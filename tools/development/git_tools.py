@@ -1,145 +1,245 @@
 import json
 import os
 from datetime import datetime
-import git
-import shutil
-import tempfile
+import subprocess
 from langchain.tools import tool
 
+from tools.utils.clone_cache import get_mirror_store, repo_cache_key
+from tools.utils.git_analytics import GitAnalytics, analytics_dir_for, latest_analytics_dir
+from tools.utils.git_history_store import GitHistoryStore
+from tools.utils.git_log_parser import iter_git_log
+
+COMMIT_BATCH_SIZE = 1000
+
 
 @tool
-def fetch_remote_git_history(repo_url, branch='main', max_commits=50, output_file='tools/output/git_history_index.json', auth_token=None):
-    """Fetch git history from a remote repository URL and write to file
-    
+def fetch_remote_git_history(repo_url, branch='main', max_commits=50, output_file='tools/output/git_history_index.json', auth_token=None, full_refresh=False):
+    """Fetch git history from a remote repository URL and write to file.
+    Runs incrementally: only commits made since the last sync of the branch are
+    extracted and embedded; a force-push that rewrote the synced history triggers a rebuild.
+
     Args:
         repo_url (str): Repository URL to clone
-        branch (str): Branch to fetch from (default: 'main')
-        max_commits (int): Maximum number of commits to fetch (default: 50)
-        output_file (str): Output file path (default: 'tools/output/git_history_index.json.json')
+        branch (str): Branch to fetch from (default: 'main', falling back to the remote's default branch)
+        max_commits (int): Maximum number of commits to fetch on the first sync (default: 50); a rebuild
+                           fetches at least as many commits as the branch already had
+        output_file (str): Output file path (default: 'tools/output/git_history_index.json')
         auth_token (str): Optional GitHub token for private repos
-        
+        full_refresh (bool): Discard the stored history and rebuild it (default: False)
+
     Returns:
         dict: Result dictionary with status, message, and metadata
     """
     try:
         if not repo_url:
             return {'error': 'repo_url is required', 'status': 'error'}
-        
-        # Create temporary directory for cloning
-        temp_dir = tempfile.mkdtemp(prefix='git_clone_')
-        
+
+        # Prepare authenticated URL if token provided
+        if auth_token and 'github.com' in repo_url and repo_url.startswith('https://'):
+            authenticated_url = repo_url.replace('https://github.com/', f'https://{auth_token}@github.com/')
+        else:
+            authenticated_url = repo_url
+
+        store = GitHistoryStore(repo_url)
         try:
-            # Prepare authenticated URL if token provided
-            if auth_token and 'github.com' in repo_url:
-                if repo_url.startswith('https://'):
-                    authenticated_url = repo_url.replace('https://github.com/', f'https://{auth_token}@github.com/')
-                else:
-                    authenticated_url = repo_url
-            else:
-                authenticated_url = repo_url
-            
-            # Clone the repository
-            print(f"Cloning repository: {repo_url}")
-            repo = git.Repo.clone_from(authenticated_url, temp_dir, depth=max_commits + 10)
-            
-            # Get the current branch name safely
-            try:
-                current_branch = repo.active_branch.name
-            except:
-                current_branch = "HEAD"
-            
-            # Switch to specified branch if not default
-            try:
-                if branch != 'main' and branch != current_branch:
-                    repo.git.checkout(branch)
-                    current_branch = branch
-            except:
-                # If branch switch fails, continue with current branch
-                pass
-            
-            # Get commits from the repository
-            try:
-                commits = list(repo.iter_commits(max_count=max_commits))
-            except Exception as e:
-                return {'error': f'Failed to get commits: {str(e)}', 'status': 'error'}
-            
-            # Extract commit information
-            git_history = []
-            for commit in commits:
-                # Get changed files
-                changed_files = []
-                if commit.parents:  # Not the initial commit
-                    try:
-                        diff = commit.parents[0].diff(commit)
-                        changed_files = [item.a_path or item.b_path for item in diff]
-                    except:
-                        changed_files = []
-                commit_info = {
-                    "sha": commit.hexsha,
-                    "short_sha": commit.hexsha[:7],
-                    "message": commit.message.strip(),
-                    "author": {
-                        "name": commit.author.name,
-                        "email": commit.author.email
-                    },
-                    "authored_date": commit.authored_datetime.isoformat(),
-                    "committed_date": commit.committed_datetime.isoformat(),
-                    "changed_files": changed_files
-                }
-                git_history.append(commit_info)
-
-            # Create output directory if it doesn't exist
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            
-            # Prepare output data
-            output_data = {
-                "repository": {
-                    "url": repo_url,
-                    "cloned_branch": current_branch,
-                    "requested_branch": branch,
-                    "remote_url": repo_url
-                },
-                "metadata": {
-                    "total_commits_fetched": len(git_history),
-                    "max_commits_requested": max_commits,
-                    "fetch_timestamp": datetime.now().isoformat(),
-                    "clone_method": "temporary"
-                },
-                "commits": git_history
-            }
-            
-            # Write to file
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
-
-            convert_remote_git_history_index_to_faiss()    
-            
-            # Cleanup temporary directory
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            
-            return {
-                'status': 'success',
-                'message': 'Remote git history fetched and written to file',
-                'repository_url': repo_url,
-                'branch': current_branch,
-                'commits_fetched': len(git_history),
-                'output_file': output_file,
-                'file_size_bytes': os.path.getsize(output_file)
-            }
-        
-        except git.exc.GitCommandError as e:
-            # Cleanup on error
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            return {'error': f'Git error: {str(e)}', 'status': 'error'}
-        
-        except Exception as e:
-            # Cleanup on error
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            return {'error': f'Clone error: {str(e)}', 'status': 'error'}
-    
+            sync = _sync_history(store, repo_url, authenticated_url, branch, max_commits, full_refresh)
+        except subprocess.CalledProcessError as e:
+            return {'error': f'Git error: {(e.stderr or str(e)).strip()}', 'status': 'error'}
+
+        current_branch = sync['branch']
+        total_commits = store.branch_state(current_branch).get('commits', 0)
+        _write_history_file(store, current_branch, output_file, {
+            "url": repo_url,
+            "cloned_branch": current_branch,
+            "requested_branch": branch,
+            "remote_url": repo_url
+        }, {
+            "total_commits_fetched": total_commits,
+            "new_commits": sync['new_commits'],
+            "sync_mode": sync['mode'],
+            "head_sha": sync['head'],
+            "max_commits_requested": max_commits,
+            "fetch_timestamp": datetime.now().isoformat(),
+            "clone_method": "mirror"
+        })
+
+        embedded = _update_history_faiss(store, current_branch, sync)
+
+        return {
+            'status': 'success',
+            'message': f"Remote git history synced ({sync['mode']}) and written to file",
+            'repository_url': repo_url,
+            'branch': current_branch,
+            'sync_mode': sync['mode'],
+            'new_commits': sync['new_commits'],
+            'commits_fetched': total_commits,
+            'commits_embedded': embedded,
+            'output_file': output_file,
+            'file_size_bytes': os.path.getsize(output_file)
+        }
+
     except Exception as e:
         return {'error': str(e), 'status': 'error'}
 
+def _sync_history(store, repo_url, fetch_url, branch, max_commits, full_refresh):
+    """
+    Refresh the repo's mirror and append commits that are new since the last sync to the store.
+
+    Returns:
+        dict: branch, head, previous sha, mode ('initial', 'incremental', 'unchanged' or 'rebuild')
+              and the new commits (kept only for incremental syncs, which are small)
+    """
+    from enhanced_context_manager import get_context_manager
+    mirrors = get_mirror_store()
+    with mirrors.lease(repo_url, fetch_url=fetch_url) as repo_path:
+        try:
+            current_branch, head = mirrors.resolve_branch(repo_path, branch)
+        except ValueError:
+            # Requested branch does not exist; use the remote's default branch
+            current_branch, head = mirrors.resolve_branch(repo_path)
+        state = store.branch_state(current_branch)
+        last_sha = state.get('last_sha')
+
+        exclude, limit = None, max_commits
+        if full_refresh or not last_sha:
+            mode = 'rebuild' if last_sha else 'initial'
+        elif last_sha == head:
+            mode = 'unchanged'
+        elif _is_ancestor(repo_path, last_sha, head):
+            mode = 'incremental'
+            exclude, limit = last_sha, None
+        else:
+            print(f"History of {current_branch} was rewritten since {last_sha[:7]}; rebuilding")
+            mode = 'rebuild'
+        if mode == 'rebuild':
+            # Keep the depth an incrementally grown history reached
+            limit = max(max_commits, state.get('commits', 0))
+        if mode in ('initial', 'rebuild'):
+            store.reset(current_branch)
+
+        context_manager = get_context_manager()
+        repo_key = repo_cache_key(repo_url)
+        if mode in ('incremental', 'unchanged') and not context_manager.has_git_commits(repo_key):
+            # The context database of this workspace has not seen the stored history yet
+            _upsert_batches(context_manager, repo_key, store.iter_commits(current_branch))
+
+        new_commits = []
+        count = 0
+        if mode != 'unchanged':
+            analytics_dir = analytics_dir_for(repo_url)
+            analytics = GitAnalytics() if mode == 'rebuild' else GitAnalytics.load(analytics_dir)
+            batch = []
+
+            def flush():
+                store.append(current_branch, batch)
+                context_manager.upsert_git_commits(batch, repo=repo_key)
+                if mode != 'rebuild':
+                    analytics.update(batch)
+                batch.clear()
+
+            for commit_info in iter_git_log(repo_path, head, max_commits=limit, exclude=exclude):
+                batch.append(commit_info)
+                count += 1
+                if mode == 'incremental':
+                    new_commits.append(commit_info)
+                if len(batch) >= COMMIT_BATCH_SIZE:
+                    flush()
+            flush()
+            if mode == 'rebuild':
+                # Rewritten commits must drop out of the tallies and the commit tables, so refold
+                # every stored branch and prune commits none of them still holds
+                for stored_branch in set(store.branches()) | {current_branch}:
+                    analytics.update(store.iter_commits(stored_branch))
+                pruned = context_manager.prune_git_commits(repo_key, analytics.seen_commits)
+                if pruned:
+                    print(f"Removed {pruned} rewritten commits of {repo_url} from the context database")
+            analytics.save(analytics_dir)
+            store.set_branch_state(current_branch, head, state.get('commits', 0) + count if mode == 'incremental' else count)
+        print(f"Git history sync of {repo_url} ({current_branch}): {mode}, {count} new commits")
+    return {'branch': current_branch, 'head': head, 'previous': last_sha, 'mode': mode,
+            'new_commits': count, 'commits': new_commits}
+
+def _upsert_batches(context_manager, repo_key, commits):
+    batch = []
+    for commit_info in commits:
+        batch.append(commit_info)
+        if len(batch) >= COMMIT_BATCH_SIZE:
+            context_manager.upsert_git_commits(batch, repo=repo_key)
+            batch = []
+    context_manager.upsert_git_commits(batch, repo=repo_key)
+
+def _is_ancestor(repo_path, ancestor, head):
+    """True if ancestor is still in the history of head (false after a force-push rewrote it)."""
+    result = subprocess.run(["git", "merge-base", "--is-ancestor", ancestor, head],
+                            cwd=repo_path, capture_output=True)
+    return result.returncode == 0
+
+def _write_history_file(store, branch, output_file, repository, metadata):
+    """Stream the stored branch history into the JSON file read by the FAISS converter."""
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    tmp_path = output_file + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('{\n  "repository": ' + json.dumps(repository, ensure_ascii=False) + ',\n  "commits": [')
+        for i, commit_info in enumerate(store.iter_commits(branch)):
+            f.write((',\n    ' if i else '\n    ') + json.dumps(commit_info, ensure_ascii=False))
+        f.write('\n  ],\n  "metadata": ' + json.dumps(metadata) + '\n}\n')
+    os.replace(tmp_path, output_file)
+
+def _update_history_faiss(store, branch, sync):
+    """
+    Embed only the new commits when the FAISS index already holds this branch up to the
+    previous sync; otherwise rebuild it from the stored history.
+    """
+    from tools.utils.faiss_converter import git_commits_to_faiss
+    faiss_index_path = os.path.join(os.path.dirname(__file__), '..', 'output', 'git_history_faiss_index')
+    source_path = os.path.join(faiss_index_path, 'source.json')
+    source = {}
+    if os.path.exists(source_path):
+        with open(source_path, 'r', encoding='utf-8') as f:
+            source = json.load(f)
+    same_branch = source.get('repository') == store.repo_url and source.get('branch') == branch
+    if same_branch and source.get('last_sha') == sync['head']:
+        return 0
+    if same_branch and sync['mode'] == 'incremental' and source.get('last_sha') == sync['previous']:
+        embedded = git_commits_to_faiss(sync['commits'], faiss_index_path, append=True)
+    else:
+        embedded = git_commits_to_faiss(store.iter_commits(branch), faiss_index_path)
+    with open(source_path, 'w', encoding='utf-8') as f:
+        json.dump({'repository': store.repo_url, 'branch': branch, 'last_sha': sync['head']}, f)
+    return embedded
+
+def git_file_analytics(file_path=None, repo_url=None, top=10, since=None):
+    """Answer churn and ownership questions from precomputed git analytics
+
+    Args:
+        file_path (str): File to report on; a bare name like 'utils.py' matches it in any directory.
+                         Without it, the most changed files and most active authors are returned.
+        repo_url (str): Repository whose history was fetched (default: the most recently fetched one)
+        top (int): Number of authors / files to list (default: 10)
+        since (str): Only count changes of file_path made on or after this ISO date, answered from
+                     the commit tables of the context database
+
+    Returns:
+        dict: Result dictionary with status and the requested statistics
+    """
+    directory = analytics_dir_for(repo_url) if repo_url else latest_analytics_dir()
+    if not directory or not os.path.exists(os.path.join(directory, 'meta.json')):
+        return {'error': 'No git analytics found; run fetch_remote_git_history first', 'status': 'error'}
+    if since:
+        if not file_path:
+            return {'error': 'since requires file_path', 'status': 'error'}
+        from enhanced_context_manager import get_context_manager
+        stats = get_context_manager().file_change_stats(file_path, os.path.basename(directory), since=since)
+        stats['authors'] = stats['authors'][:int(top)]
+        return {'status': 'success', **stats}
+    analytics = GitAnalytics.load(directory)
+    if not file_path:
+        return {'status': 'success', **analytics.summary(int(top))}
+    stats = analytics.file_stats(file_path, top=int(top))
+    if stats is None:
+        return {'error': f"'{file_path}' does not appear in the fetched history", 'status': 'error'}
+    return {'status': 'success', **stats}
+
 def convert_remote_git_history_index_to_faiss():
     """
     Convert remote_git_history_index.json to FAISS index for semantic search.
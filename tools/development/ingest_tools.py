@@ -0,0 +1,185 @@
+"""
+Bulk ingestion of many repositories from a manifest.
+Fetches (through the shared mirror store) and indexes every repo/branch with bounded
+parallelism, writing one namespaced codebase index per repo and branch.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from tools.development.codebase_tools import index_git_ref
+from tools.utils.clone_cache import get_mirror_store, repo_cache_key, BATCH_REFRESH_INTERVAL
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output', 'repos')
+
+
+def load_manifest(manifest_path):
+    """
+    Load a manifest of repositories.
+
+    The manifest is a JSON file holding either a list or {"repositories": [...]}.
+    Each item is a URL string or {"url": ..., "branches": [...], "name": ...}.
+
+    Returns:
+        list: (name, url, branch) jobs; branch None means the remote default branch
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    repositories = manifest.get('repositories', []) if isinstance(manifest, dict) else manifest
+    jobs = []
+    for repo in repositories:
+        if isinstance(repo, str):
+            repo = {'url': repo}
+        name = repo.get('name') or repo_cache_key(repo['url'])
+        branches = repo.get('branches') or [repo.get('branch')]
+        for branch in branches:
+            jobs.append((name, repo['url'], branch))
+    return jobs
+
+
+def namespace_for(name, branch):
+    """Directory (relative to the output dir) holding one repo/branch index."""
+    return os.path.join(name, (branch or 'default').replace('/', '__'))
+
+
+class IngestProgress:
+    """Thread-safe progress file so an interrupted ingestion can resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.jobs = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.jobs = json.load(f).get('jobs', {})
+
+    def is_done(self, job_id):
+        return self.jobs.get(job_id, {}).get('status') == 'success'
+
+    def update(self, job_id, record):
+        with self._lock:
+            self.jobs[job_id] = record
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'updated': datetime.now().isoformat(), 'jobs': self.jobs}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def _ingest_one(name, url, branch, output_dir, embed):
+    namespace = namespace_for(name, branch)
+    repo_output_dir = os.path.join(output_dir, namespace)
+    os.makedirs(repo_output_dir, exist_ok=True)
+    record = {'name': name, 'url': url, 'branch': branch, 'namespace': namespace}
+    start = time.perf_counter()
+    try:
+        store = get_mirror_store()
+        # Branches of the same repo in a manifest share one fetch
+        with store.lease(url, max_age=BATCH_REFRESH_INTERVAL) as mirror_path:
+            record['fetch_seconds'] = round(time.perf_counter() - start, 3)
+            record['branch'], record['commit'] = store.resolve_branch(mirror_path, branch)
+            index_start = time.perf_counter()
+            output_path = os.path.join(repo_output_dir, 'codebase_index.json')
+            index_git_ref(
+                mirror_path, record['commit'], output_path=output_path,
+                faiss_index_path=os.path.join(repo_output_dir, 'codebase_faiss_index'),
+                build_faiss=embed
+            )
+        record['index_seconds'] = round(time.perf_counter() - index_start, 3)
+        record['output_file'] = output_path
+        with open(output_path, 'r', encoding='utf-8') as f:
+            record['entries'] = len(json.load(f))
+        record['status'] = 'success'
+    except subprocess.CalledProcessError as e:
+        record['status'] = 'error'
+        record['error'] = f"Git error: {(e.stderr or str(e)).strip()}"
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = str(e)
+    record['total_seconds'] = round(time.perf_counter() - start, 3)
+    record['finished'] = datetime.now().isoformat()
+    return record
+
+
+def ingest_repositories(manifest_path, max_workers=4, output_dir=None, resume=True, embed=True):
+    """
+    Fetch and index every repository/branch in a manifest.
+
+    Args:
+        manifest_path (str): Path to the JSON manifest (see load_manifest)
+        max_workers (int): Maximum number of repos processed concurrently (default: 4)
+        output_dir (str): Root of the namespaced per-repo indexes (default: tools/output/repos)
+        resume (bool): Skip jobs that already succeeded in a previous run (default: True)
+        embed (bool): Also build a FAISS index per repo (default: True)
+
+    Returns:
+        dict: Summary with status counts and per-repo timings
+    """
+    try:
+        jobs = load_manifest(manifest_path)
+    except Exception as e:
+        return {'error': f'Failed to load manifest: {e}', 'status': 'error'}
+    output_dir = os.path.abspath(output_dir or DEFAULT_OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    progress = IngestProgress(os.path.join(output_dir, 'ingest_progress.json'))
+
+    pending = []
+    skipped = []
+    for name, url, branch in jobs:
+        job_id = f"{url}@{branch or 'default'}"
+        if resume and progress.is_done(job_id):
+            skipped.append(job_id)
+        else:
+            pending.append((job_id, name, url, branch))
+
+    print(f"Ingesting {len(pending)} repo/branch jobs with {max_workers} workers ({len(skipped)} already done)...")
+    started = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+        futures = {
+            executor.submit(_ingest_one, name, url, branch, output_dir, embed): job_id
+            for job_id, name, url, branch in pending
+        }
+        for future in as_completed(futures):
+            job_id = futures[future]
+            record = future.result()
+            progress.update(job_id, record)
+            results.append(record)
+            print(f"[{record['status']}] {job_id} in {record['total_seconds']}s")
+
+    failed = [r for r in results if r['status'] != 'success']
+    return {
+        'status': 'success' if not failed else 'partial' if len(failed) < len(results) else 'error',
+        'jobs_total': len(jobs),
+        'jobs_run': len(results),
+        'jobs_skipped': len(skipped),
+        'jobs_failed': len(failed),
+        'wall_seconds': round(time.perf_counter() - started, 3),
+        'output_dir': output_dir,
+        'repositories': sorted(results, key=lambda r: r['total_seconds'], reverse=True)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch and index repositories listed in a manifest.")
+    parser.add_argument("manifest", help="JSON manifest of repositories and branches")
+    parser.add_argument("--workers", type=int, default=4, help="maximum concurrent repositories")
+    parser.add_argument("--output-dir", default=None, help="root directory for per-repo indexes")
+    parser.add_argument("--no-resume", action="store_true", help="re-run jobs that already succeeded")
+    parser.add_argument("--no-embed", action="store_true", help="skip building FAISS indexes")
+    args = parser.parse_args(argv)
+    summary = ingest_repositories(
+        args.manifest, max_workers=args.workers, output_dir=args.output_dir,
+        resume=not args.no_resume, embed=not args.no_embed
+    )
+    print(json.dumps(summary, indent=2))
+    return 0 if summary.get('status') == 'success' else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
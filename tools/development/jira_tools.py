@@ -2,15 +2,26 @@
 JIRA integration tools
 """
 import json
-import requests
+import math
+import os
+import re
+import time
 from enhanced_context_manager import get_context_manager
 from langchain.tools import tool
-from tools.utils.faiss_converter import json_to_faiss
+from tools.utils.faiss_converter import json_to_faiss, jira_tickets_to_faiss
+from tools.utils.jira_client import iter_issues, DEFAULT_FIELDS as JIRA_FIELDS
+
+# Minutes re-requested before the previous sync, to cover clock skew and in-flight updates
+WATERMARK_OVERLAP_MINUTES = 5
+# How often a sync also fetches the full key list to drop deleted or moved tickets
+JIRA_RECONCILE_SECONDS = int(os.getenv("JIRA_RECONCILE_SECONDS", str(6 * 3600)))
+SYNC_BATCH_SIZE = 500
 
 @tool
 def jira_ticket_summarizer(domain: str, user: str, token: str, query: str) -> str:
     """
     Fetch JIRA tickets, summarize them into a PRD, and save the context in JSON format.
+    Runs incrementally: only tickets updated since the last sync of the query are fetched and re-embedded.
     """
     # Validate input parameters
     if not all([domain, user, token, query]):
@@ -20,64 +31,140 @@ def jira_ticket_summarizer(domain: str, user: str, token: str, query: str) -> st
     jira_api_url = f"{domain}/rest/api/latest/search"
     auth = (user, token)
 
-    # Step 1: Fetch JIRA tickets
-    tickets = fetch_jira_tickets(jira_api_url, auth, query)
+    # Step 1: Fetch changed JIRA tickets and upsert them into the local ticket store
+    sync = sync_jira_tickets(jira_api_url, auth, query)
+
+    print(f"Fetched {sync['fetched']} JIRA tickets ({sync['mode']} sync); "
+          f"{len(sync['changed'])} changed, {len(sync['removed'])} removed.")
 
-    print(f"Fetched {len(tickets)} JIRA tickets.")
-    
-    # Step 2: Summarize tickets into a PRD
+    # Step 2: Summarize the stored tickets into a PRD
+    cm = get_context_manager()
+    tickets = cm.get_jira_tickets(sync['keys'])
     prd = summarize_tickets(tickets)
-    
+
     # Step 3: Save the PRD to a JSON file
     save_prd_to_json(prd)
 
-    convert_to_faiss()
-    
-    return "JIRA tickets summarized and saved to jira_tickets_stories_context.json."
+    # Step 4: Re-embed only the tickets that changed
+    update_faiss(sync, tickets)
 
-def fetch_jira_tickets(jira_api_url: str, auth: tuple, query: str):
-    """Fetch JIRA tickets using the JIRA API."""
-    headers = {
-        "Content-Type": "application/json"
-    }
-    params = {
-        "jql": query,
-        "fields": "*all"
+    return (f"JIRA tickets summarized and saved to jira_tickets_stories_context.json "
+            f"({len(tickets)} tickets, {len(sync['changed'])} updated, {len(sync['removed'])} removed).")
+
+def sync_jira_tickets(jira_api_url: str, auth: tuple, query: str, full: bool = False):
+    """
+    Sync the tickets matching a JQL query into the local ticket store.
+
+    The first sync (or one with full=True) fetches everything. Later syncs only ask for tickets updated since
+    the previous one (a relative 'updated >= -Nm' clause plus a few minutes of overlap,
+    so no timezone conversion is involved). Every JIRA_RECONCILE_SECONDS the full key
+    list is fetched to drop deleted or moved tickets and pick up any that were missed.
+
+    Tickets that leave the query's scope are only deleted from the ticket store when no
+    other synced query still has them in scope.
+
+    Returns:
+        dict: mode, fetched count, changed ticket ids (updated or new to the scope), ticket ids
+              removed from the scope and all ticket ids in scope
+    """
+    cm = get_context_manager()
+    state_key = f"jira:{jira_api_url}:{query}"
+    state = cm.load_scan_state(state_key)
+    now = time.time()
+    base_query = _strip_order_by(query)
+
+    changed, fetched_keys = [], []
+
+    def store(issues):
+        # Only tickets whose 'updated' timestamp moved are written and re-embedded
+        batch = []
+        for issue in issues:
+            fetched_keys.append(issue['key'])
+            batch.append(issue)
+            if len(batch) >= SYNC_BATCH_SIZE:
+                _store_changed(cm, batch, changed)
+        _store_changed(cm, batch, changed)
+
+    if state.get('last_sync') and not full:
+        minutes = math.ceil((now - state['last_sync']) / 60) + WATERMARK_OVERLAP_MINUTES
+        store(fetch_jira_tickets(jira_api_url, auth, f"({base_query}) AND updated >= -{minutes}m ORDER BY updated ASC"))
+        mode = 'incremental'
+    else:
+        store(fetch_jira_tickets(jira_api_url, auth, query))
+        mode = 'full'
+
+    previous_keys = set(state.get('keys', []))
+    keys = previous_keys | set(fetched_keys)
+    removed = set()
+    last_reconcile = state.get('last_reconcile', 0)
+    if mode == 'full':
+        removed = keys - set(fetched_keys)
+        keys = set(fetched_keys)
+        last_reconcile = now
+    elif now - last_reconcile >= JIRA_RECONCILE_SECONDS:
+        current = {issue['key'] for issue in iter_issues(jira_api_url, auth, base_query, fields="key")}
+        removed = keys - current
+        missing = sorted(current - keys)
+        for i in range(0, len(missing), 100):
+            store(fetch_jira_tickets(jira_api_url, auth, f"key in ({','.join(missing[i:i + 100])})"))
+        keys = current
+        last_reconcile = now
+        mode = 'reconcile'
+
+    cm.delete_jira_tickets(removed - _keys_in_other_scopes(cm, state_key))
+    if previous_keys:
+        # Tickets another query stored unchanged are still new to this scope's index
+        changed.extend(sorted(keys - previous_keys - set(changed)))
+    cm.save_scan_state(state_key, {'last_sync': now, 'last_reconcile': last_reconcile, 'keys': sorted(keys)})
+    return {
+        'mode': mode,
+        'scope': state_key,
+        'fetched': len(fetched_keys),
+        'changed': changed,
+        'removed': sorted(removed),
+        'keys': sorted(keys)
     }
-    response = requests.get(jira_api_url, headers=headers, auth=auth, params=params)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch JIRA tickets: {response.status_code} - {response.text}")
-
-    data = response.json()
-    issues = data.get("issues", [])
-    total = data.get("total", 0)
-    start_at = data.get("startAt", 0)
-    max_results = data.get("maxResults", 50)
-
-    # Fetch additional pages if needed
-    while start_at + max_results < total:
-        start_at += max_results
-        params["startAt"] = start_at
-        response = requests.get(jira_api_url, headers=headers, auth=auth, params=params)
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch JIRA tickets: {response.status_code} - {response.text}")
-        data = response.json()
-        issues.extend(data.get("issues", []))
-        max_results = data.get("maxResults", 50)
-
-    return issues
+
+def _keys_in_other_scopes(cm, state_key):
+    """Ticket ids in scope of the other synced JIRA queries."""
+    keys = set()
+    for key, state in cm.scan_states("jira:").items():
+        if key != state_key:
+            keys.update(state.get('keys', []))
+    return keys
+
+def _store_changed(cm, batch, changed):
+    """Upsert the tickets of a batch whose stored version is missing or older, then clear it."""
+    versions = cm.jira_ticket_versions(issue['key'] for issue in batch)
+    updated = [issue for issue in batch
+               if issue['key'] not in versions or versions[issue['key']] != issue['fields'].get('updated')]
+    cm.upsert_jira_tickets(updated)
+    changed.extend(issue['key'] for issue in updated)
+    batch.clear()
+
+def _strip_order_by(query: str) -> str:
+    """Drop a trailing ORDER BY so the JQL can be wrapped in another clause."""
+    return re.split(r'\s+order\s+by\s+', query, flags=re.IGNORECASE)[0].strip()
+
+def fetch_jira_tickets(jira_api_url: str, auth: tuple, query: str):
+    """
+    Yield JIRA tickets using the JIRA API. Pages are requested concurrently over a pooled
+    session, only the fields the ticket store uses are requested (env JIRA_FIELDS), and
+    each response is parsed incrementally.
+    """
+    return iter_issues(jira_api_url, auth, query, fields=JIRA_FIELDS)
 
 def summarize_tickets(tickets):
-    """Summarize JIRA tickets into a PRD format."""
+    """Summarize stored JIRA tickets ({id, summary, description}) into a PRD format."""
     prd = {
         "title": "Product Requirements Document",
         "tickets": []
     }
     for ticket in tickets:
         prd["tickets"].append({
-            "id": ticket["key"],
-            "summary": ticket["fields"]["summary"],
-            "description": ticket["fields"]["description"]
+            "id": ticket["id"],
+            "summary": ticket["summary"],
+            "description": ticket["description"]
         })
     return prd
 
@@ -90,5 +177,26 @@ def convert_to_faiss():
     # Convert JSON to FAISS chunks
     json_file_path = "tools/output/jira_tickets_stories_context.json"
     faiss_index_path = "tools/output/jira_tickets_stories_faiss_index"
-    faiss_index = json_to_faiss(json_file_path, faiss_index_path)
-    print(f"FAISS index created {faiss_index}")
+    embedded = json_to_faiss(json_file_path, faiss_index_path)
+    print(f"FAISS index created with {embedded} tickets")
+
+def update_faiss(sync, tickets):
+    """
+    Re-embed the changed tickets of a sync. The index is rebuilt from all stored tickets
+    when it was built for another query or by the old full converter.
+    """
+    faiss_index_path = "tools/output/jira_tickets_stories_faiss_index"
+    source_path = os.path.join(faiss_index_path, "source.json")
+    source = {}
+    if os.path.exists(source_path):
+        with open(source_path, "r", encoding="utf-8") as f:
+            source = json.load(f)
+    if source.get("scope") != sync["scope"] or sync["mode"] == "full":
+        jira_tickets_to_faiss(tickets, faiss_index_path, rebuild=True)
+    elif sync["changed"] or sync["removed"]:
+        changed = set(sync["changed"])
+        jira_tickets_to_faiss([t for t in tickets if t["id"] in changed], faiss_index_path,
+                              removed_ids=sync["removed"])
+    if os.path.isdir(faiss_index_path):
+        with open(source_path, "w", encoding="utf-8") as f:
+            json.dump({"scope": sync["scope"]}, f)
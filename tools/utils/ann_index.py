@@ -0,0 +1,254 @@
+"""
+FAISS index strategies for the vector stores.
+Small stores stay on an exact flat index; larger ones move to graph (HNSW) or
+inverted-file (IVF) indexes, with float16 scalar or product quantization to cut
+memory. Quantizers are trained on a random sample of the corpus. The strategy
+is chosen by corpus size unless configured per store:
+
+    FAISS_INDEX_STRATEGY     default strategy for every store (default: auto)
+    FAISS_INDEX_<STORE>      per store, e.g. FAISS_INDEX_CODEBASE=ivfpq
+    FAISS_TRAIN_SAMPLE       maximum vectors used for training (default: 100000)
+
+Usage: python -m tools.utils.ann_index [--n N] [--dim D] [--strategies flat,hnsw,...]
+"""
+import argparse
+import gc
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+STRATEGIES = ('flat', 'sq16', 'hnsw', 'ivf', 'ivf_sq16', 'ivfpq')
+# (corpus size below which, strategy) for FAISS_INDEX_STRATEGY=auto
+AUTO_THRESHOLDS = ((20_000, 'flat'), (200_000, 'hnsw'), (1_000_000, 'ivf_sq16'))
+AUTO_LARGEST = 'ivfpq'
+TRAIN_SAMPLE = int(os.getenv('FAISS_TRAIN_SAMPLE', '100000'))
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+# Training points per IVF list (and per PQ centroid) below which faiss clustering is unreliable
+MIN_POINTS_PER_CENTROID = 39
+
+
+def configured_strategy(store=None):
+    """Strategy configured for a store ('jira', 'codebase', 'git_history'), or 'auto'."""
+    if store:
+        value = os.getenv(f'FAISS_INDEX_{store.upper()}')
+        if value:
+            return value
+    return os.getenv('FAISS_INDEX_STRATEGY', 'auto')
+
+
+def choose_strategy(n, strategy='auto'):
+    """
+    The strategy used for a corpus of n vectors: 'auto' is resolved by size, and strategies whose
+    quantizers need more training data than n provides fall back to the next simpler one.
+    """
+    if strategy == 'auto':
+        strategy = next((name for limit, name in AUTO_THRESHOLDS if n < limit), AUTO_LARGEST)
+    elif strategy not in STRATEGIES:
+        raise ValueError(f"Unknown index strategy '{strategy}' (available: auto, {', '.join(STRATEGIES)})")
+    if strategy == 'ivfpq' and n < 256 * MIN_POINTS_PER_CENTROID:
+        strategy = 'ivf_sq16'
+    if strategy.startswith('ivf') and _nlist(n) < 2:
+        strategy = 'flat'
+    return strategy
+
+
+def _nlist(n):
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dim):
+    """Largest divisor of dim giving sub-vectors of at least 4 dimensions (one byte each)."""
+    for m in range(max(1, dim // 4), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def index_spec(strategy, n, dim):
+    """faiss.index_factory description for a strategy and corpus size."""
+    nlist = _nlist(n)
+    return {
+        'flat': 'Flat',
+        'sq16': 'SQfp16',
+        'hnsw': f'HNSW{HNSW_M}',
+        'ivf': f'IVF{nlist},Flat',
+        'ivf_sq16': f'IVF{nlist},SQfp16',
+        'ivfpq': f'IVF{nlist},PQ{_pq_subquantizers(dim)}x8',
+    }[strategy]
+
+
+def strategy_of(index):
+    """The strategy an index (optionally wrapped in an IndexIDMap) was built with."""
+    if isinstance(index, faiss.IndexIDMap2) or isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivfpq'
+    if isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return 'ivf_sq16'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf'
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return 'sq16'
+    return 'flat'
+
+
+def _sample(vectors, size, seed=0):
+    if len(vectors) <= size:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def build_index(vectors, strategy='auto', metric=faiss.METRIC_L2):
+    """
+    An empty IndexIDMap2 for the strategy (see choose_strategy), trained on a sample of vectors (float32, n x d).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    chosen = choose_strategy(n, strategy)
+    if strategy not in ('auto', chosen):
+        print(f"Too few vectors ({n}) to train {strategy}; using {chosen}")
+    strategy = chosen
+    inner = faiss.index_factory(dim, index_spec(strategy, n, dim), metric)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+    if not inner.is_trained:
+        inner.train(_sample(vectors, TRAIN_SAMPLE))
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = min(inner.nlist, max(8, inner.nlist // 16))
+        # Reconstruction by id is needed for compaction, merges and MMR
+        inner.make_direct_map()
+    return faiss.IndexIDMap2(inner)
+
+
+def removes_in_place(index):
+    """True if remove_ids on this IndexIDMap2 keeps its id map consistent (flat code storage only)."""
+    return isinstance(faiss.downcast_index(index.index), faiss.IndexFlatCodes)
+
+
+def search_parameters(index, selector):
+    """SearchParameters applying selector, of the type the wrapped index expects."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=inner.nprobe)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+# Benchmark
+
+def _rss_bytes():
+    """Resident set size of this process (Linux), or 0 where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def synthetic_corpus(n, dim, queries, clusters=100, seed=0):
+    """Clustered Gaussian vectors (closer to real embeddings than uniform noise) and held-out queries."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    def draw(count):
+        return (centers[rng.integers(clusters, size=count)]
+                + 0.5 * rng.normal(size=(count, dim)).astype(np.float32))
+    return draw(n), draw(queries)
+
+
+_bench_data = None
+
+
+def _measure(strategy):
+    base, query, truth, k = _bench_data
+    gc.collect()
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    index = build_index(base, strategy)
+    index.add_with_ids(base, np.arange(len(base), dtype=np.int64))
+    build_seconds = time.perf_counter() - start
+    rss_after = _rss_bytes()
+    start = time.perf_counter()
+    _, found = index.search(query, k)
+    search_seconds = time.perf_counter() - start
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return {
+        'strategy': strategy_of(index),
+        'requested': strategy,
+        'build_seconds': build_seconds,
+        'recall_at_k': float(recall),
+        'qps': len(query) / search_seconds if search_seconds else float('inf'),
+        'index_bytes': int(faiss.serialize_index(index).nbytes),
+        'rss_delta_bytes': rss_after - rss_before
+    }
+
+
+def _measure_in_child(strategy, conn):
+    conn.send(_measure(strategy))
+    conn.close()
+
+
+def benchmark(n=50_000, dim=128, queries=1000, k=10, strategies=STRATEGIES):
+    """
+    Build each strategy on the same synthetic corpus and measure recall@k against exact search,
+    single-batch QPS, serialized index size and the RSS growth of building it. Where fork is
+    available each strategy runs in a forked child, so memory freed by one build does not hide
+    the next one's growth.
+    """
+    global _bench_data
+    base, query = synthetic_corpus(n, dim, queries)
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(base)
+    _, truth = exact.search(query, k)
+    del exact
+    _bench_data = (base, query, truth, k)
+    try:
+        context = multiprocessing.get_context('fork')
+    except ValueError:
+        context = None
+    results = []
+    try:
+        for strategy in strategies:
+            if context is None:
+                results.append(_measure(strategy))
+                continue
+            receiver, sender = context.Pipe(duplex=False)
+            child = context.Process(target=_measure_in_child, args=(strategy, sender))
+            child.start()
+            sender.close()
+            results.append(receiver.recv())
+            child.join()
+    finally:
+        _bench_data = None
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index strategies on synthetic data.")
+    parser.add_argument("--n", type=int, default=50_000, help="corpus size")
+    parser.add_argument("--dim", type=int, default=128, help="vector dimension")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--strategies", default=','.join(STRATEGIES))
+    args = parser.parse_args(argv)
+    results = benchmark(args.n, args.dim, args.queries, args.k, args.strategies.split(','))
+    print(f"{'strategy':10s} {'recall@' + str(args.k):>9s} {'qps':>9s} {'build s':>8s} {'index MB':>9s} {'rss MB':>8s}")
+    for r in results:
+        print(f"{r['strategy']:10s} {r['recall_at_k']:9.3f} {r['qps']:9.0f} {r['build_seconds']:8.2f} "
+              f"{r['index_bytes'] / 2**20:9.1f} {r['rss_delta_bytes'] / 2**20:8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
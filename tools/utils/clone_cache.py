@@ -0,0 +1,283 @@
+"""
+Shared store of bare mirror repositories keyed by repository URL.
+Every git tool reads history and file contents straight from these mirrors, so a
+repo is transferred once and afterwards only refreshed with `git fetch --prune`.
+Each mirror is guarded by a file lock, and old mirrors are evicted LRU by disk quota.
+"""
+import contextlib
+import hashlib
+import os
+import shutil
+import stat
+import subprocess
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.getcwd(), 'target')
+DEFAULT_MAX_BYTES = int(os.getenv('REPO_CACHE_MAX_BYTES', str(5 * 1024 ** 3)))
+# Batch callers use a mirror fetched less than this many seconds ago as is
+BATCH_REFRESH_INTERVAL = float(os.getenv('REPO_CACHE_REFRESH_SECONDS', '60'))
+_BRANCH_REFSPEC = '+refs/heads/*:refs/heads/*'
+
+
+class FileLock:
+    """Exclusive inter-process lock on a lock file (fcntl on POSIX, msvcrt on Windows)."""
+
+    def __init__(self, path, timeout=600, poll_interval=0.1):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    def acquire(self, blocking=True):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                _lock_fd(fd)
+                self._fd = fd
+                return True
+            except OSError:
+                if not blocking or time.monotonic() >= deadline:
+                    os.close(fd)
+                    if not blocking:
+                        return False
+                    raise TimeoutError(f"Timed out waiting for lock {self.path}")
+                time.sleep(self.poll_interval)
+
+    def release(self):
+        if self._fd is not None:
+            _unlock_fd(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock_fd(fd):
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+    def _unlock_fd(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def repo_cache_key(repo_url):
+    """Stable directory name for a repo URL: '<name>-<url hash>'."""
+    normalized = repo_url.strip().rstrip('/')
+    if normalized.endswith('.git'):
+        normalized = normalized[:-4]
+    name = normalized.split('/')[-1].split(':')[-1] or 'repo'
+    digest = hashlib.sha1(normalized.lower().encode('utf-8')).hexdigest()[:12]
+    return f"{name}-{digest}"
+
+
+def _git(args, cwd=None):
+    return subprocess.run(["git"] + args, cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _remove_tree(path):
+    """Remove a directory even if it contains read-only files (git objects on Windows)."""
+    def onerror(func, failed_path, exc_info):
+        os.chmod(failed_path, stat.S_IWRITE)
+        func(failed_path)
+    shutil.rmtree(path, onerror=onerror)
+
+
+def _dir_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _is_bare_repo(path):
+    return os.path.isfile(os.path.join(path, 'HEAD')) and os.path.isdir(os.path.join(path, 'objects'))
+
+
+def _is_intact(path):
+    """True if git can read the mirror's refs and the commit and tree of every branch tip."""
+    try:
+        tips = _git(["for-each-ref", "--format=%(objectname)", "refs/heads"], cwd=path).split()
+        if not tips:
+            return True
+        result = subprocess.run(["git", "cat-file", "--batch-check"], cwd=path, capture_output=True, text=True,
+                                input=''.join(f"{sha}^{{tree}}\n" for sha in tips), check=True)
+    except (subprocess.CalledProcessError, OSError):
+        return False
+    return 'missing' not in result.stdout
+
+
+class MirrorStore:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir or DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, repo_url):
+        return os.path.join(self.cache_dir, repo_cache_key(repo_url))
+
+    def _lock_for(self, key):
+        return FileLock(os.path.join(self.cache_dir, f".{key}.lock"))
+
+    @contextlib.contextmanager
+    def lease(self, repo_url, fetch_url=None, refresh=True, max_age=0):
+        """
+        Context manager yielding the path of an up-to-date bare mirror of repo_url.
+        The per-repo lock is held until the block exits, so the mirror cannot be
+        fetched into or evicted by another caller while it is being read.
+
+        Args:
+            repo_url (str): Repository URL; also the cache key
+            fetch_url (str): URL used for network access if it differs from repo_url (e.g. with a token);
+                             it is never written to the mirror's config
+            refresh (bool): Fetch into an existing mirror before yielding it
+            max_age (float): Skip the fetch if the mirror was fetched less than this many seconds ago;
+                             batch callers pass BATCH_REFRESH_INTERVAL, explicit tool calls always fetch
+        """
+        key = repo_cache_key(repo_url)
+        path = os.path.join(self.cache_dir, key)
+        url = fetch_url or repo_url
+        try:
+            with self._lock_for(key):
+                if _is_bare_repo(path):
+                    if refresh and time.time() - self._last_marked(key, 'fetched') >= max_age:
+                        self._refresh(path, url, repo_url, key)
+                else:
+                    if os.path.exists(path):
+                        _remove_tree(path)
+                    self._clone(path, url, repo_url)
+                    self._mark(key, 'fetched')
+                self._mark(key, 'used')
+                yield path
+        finally:
+            self.evict(keep=key)
+
+    def _refresh(self, path, url, repo_url, key):
+        """
+        Fetch into an existing mirror. A failed fetch (network or auth error) keeps the mirror and
+        serves its last fetched refs; only a mirror git can no longer read is removed and re-cloned.
+        """
+        try:
+            self._fetch(path, url)
+        except subprocess.CalledProcessError as e:
+            if _is_intact(path):
+                print(f"Warning: mirror of {repo_url} could not be fetched ({e.stderr.strip()}); "
+                      f"using refs fetched {time.ctime(self._last_marked(key, 'fetched'))}")
+                return
+            print(f"Mirror of {repo_url} is corrupt and could not be fetched ({e.stderr.strip()}); re-cloning")
+            _remove_tree(path)
+            self._clone(path, url, repo_url)
+        self._mark(key, 'fetched')
+
+    def resolve_branch(self, path, branch=None):
+        """
+        Resolve a branch of a mirror to its tip.
+
+        Returns:
+            tuple: (branch name, commit sha); branch None means the remote's default branch
+        Raises:
+            ValueError: If the branch does not exist on the remote
+        """
+        if branch is None:
+            branch = _git(["symbolic-ref", "--short", "HEAD"], cwd=path)
+        try:
+            sha = _git(["rev-parse", "--verify", f"refs/heads/{branch}^{{commit}}"], cwd=path)
+        except subprocess.CalledProcessError:
+            raise ValueError(f"Branch '{branch}' does not exist in {path}")
+        return branch, sha
+
+    def _clone(self, path, url, repo_url):
+        print(f"Mirroring repo {repo_url} to {path}...")
+        _git(["clone", "--bare", "--quiet", url, path])
+        _git(["remote", "set-url", "origin", repo_url], cwd=path)
+        _git(["config", "remote.origin.fetch", _BRANCH_REFSPEC], cwd=path)
+
+    def _fetch(self, path, url):
+        print(f"Fetching into mirror {path}...")
+        _git(["fetch", "--quiet", "--prune", url, _BRANCH_REFSPEC], cwd=path)
+
+    def _mark(self, key, name):
+        marker = os.path.join(self.cache_dir, f".{key}.{name}")
+        with open(marker, 'a'):
+            pass
+        os.utime(marker, None)
+
+    def _last_marked(self, key, name):
+        try:
+            return os.path.getmtime(os.path.join(self.cache_dir, f".{key}.{name}"))
+        except OSError:
+            return 0.0
+
+    def entries(self):
+        """List mirrors as dicts with key, path, size_bytes and last_used."""
+        result = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            result.append({
+                'key': name,
+                'path': path,
+                'size_bytes': _dir_size(path),
+                'last_used': self._last_marked(name, 'used')
+            })
+        return result
+
+    def evict(self, keep=None):
+        """Remove least recently used mirrors until the store fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda e: e['last_used'])
+        total = sum(e['size_bytes'] for e in entries)
+        removed = []
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry['key'] == keep:
+                continue
+            lock = self._lock_for(entry['key'])
+            # Skip mirrors that are in use by another caller
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                _remove_tree(entry['path'])
+                for name in ('used', 'fetched'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, f".{entry['key']}.{name}"))
+                    except OSError:
+                        pass
+            finally:
+                lock.release()
+            total -= entry['size_bytes']
+            removed.append(entry['key'])
+        return removed
+
+
+_mirror_store = None
+
+
+def get_mirror_store():
+    """Get or create the global mirror store instance"""
+    global _mirror_store
+    if _mirror_store is None:
+        _mirror_store = MirrorStore()
+    return _mirror_store
@@ -0,0 +1,209 @@
+"""
+Code chunking for the codebase index.
+Splits Python files by top-level def/class, brace languages by balanced blocks
+and everything else by line windows, keeping every chunk under a token budget.
+"""
+import ast
+import os
+import re
+
+# Maximum number of tokens stored in a single chunk
+DEFAULT_MAX_TOKENS = 400
+
+BRACE_EXTENSIONS = {'.js', '.jsx', '.ts', '.tsx', '.java', '.c', '.h', '.cpp', '.hpp',
+                    '.cc', '.cs', '.go', '.rs', '.kt', '.swift', '.php', '.scala'}
+
+_brace_symbol_regex = re.compile(
+    r'(?:class|interface|enum|struct|function|def|fn|func)\s+([A-Za-z_$][\w$]*)'
+    r'|([A-Za-z_$][\w$]*)\s*(?:=\s*(?:async\s*)?(?:function\b|\([^()]*\)\s*=>)|\([^()]*\)\s*\{)'
+)
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Load the tiktoken encoding on first use; None when tiktoken is unavailable."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken, falling back to a 4-chars-per-token estimate."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def chunk_file(file_path, content, max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    Split a file into chunks of at most max_tokens tokens.
+
+    Returns:
+        list: Chunk dicts with file, symbol, start_line, end_line and content.
+    """
+    if not content.strip():
+        return []
+    ext = os.path.splitext(file_path)[1].lower()
+    lines = content.splitlines(keepends=True)
+    if ext == '.py':
+        spans = _python_spans(content)
+        if spans is None:
+            spans = [(None, 1, len(lines))]
+    elif ext in BRACE_EXTENSIONS:
+        spans = _brace_spans(content)
+    else:
+        spans = [(None, 1, len(lines))]
+
+    chunks = []
+    for symbol, start, end in _merge_small_spans(spans, lines, max_tokens):
+        for part_start, part_end in _split_span(lines, start, end, max_tokens):
+            text = ''.join(lines[part_start - 1:part_end])
+            if not text.strip():
+                continue
+            if part_start == part_end:
+                text = truncate_to_tokens(text, max_tokens)
+            chunks.append({
+                'type': 'chunk',
+                'name': symbol or os.path.basename(file_path),
+                'file': file_path,
+                'symbol': symbol,
+                'start_line': part_start,
+                'end_line': part_end,
+                'content': text
+            })
+    return chunks
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text (e.g. a minified line) down to at most max_tokens tokens."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def _python_spans(content):
+    """Return (symbol, start, end) spans for top-level Python statements, or None on syntax errors."""
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+    spans = []
+    for node in tree.body:
+        start = node.lineno
+        if getattr(node, 'decorator_list', None):
+            start = min(d.lineno for d in node.decorator_list)
+        end = getattr(node, 'end_lineno', None) or start
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            spans.append((node.name, start, end))
+        elif spans and spans[-1][0] is None:
+            # Group consecutive module-level statements into one span
+            spans[-1] = (None, spans[-1][1], end)
+        else:
+            spans.append((None, start, end))
+    # Attach leading comments and blank lines to the following span
+    previous_end = 0
+    for i, (symbol, start, end) in enumerate(spans):
+        spans[i] = (symbol, previous_end + 1, end)
+        previous_end = end
+    return spans
+
+
+def _brace_spans(content):
+    """Return (symbol, start, end) spans for top-level brace-balanced blocks."""
+    lines = content.splitlines()
+    spans = []
+    depth = 0
+    line = 1
+    block_start = 1
+    i = 0
+    n = len(content)
+    while i < n:
+        ch = content[i]
+        if ch == '\n':
+            line += 1
+        elif ch == '/' and i + 1 < n and content[i + 1] == '/':
+            end = content.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        elif ch == '/' and i + 1 < n and content[i + 1] == '*':
+            end = content.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            line += content.count('\n', i, end)
+            i = end
+            continue
+        elif ch in ('"', "'", '`'):
+            j = i + 1
+            while j < n and content[j] != ch:
+                if content[j] == '\\':
+                    j += 1
+                elif content[j] == '\n' and ch != '`':
+                    break
+                j += 1
+            line += content.count('\n', i + 1, min(j, n))
+            i = j + 1
+            continue
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth = max(depth - 1, 0)
+            if depth == 0 and line >= block_start:
+                # A top-level block closed on this line
+                spans.append((_block_header(lines, block_start), block_start, line))
+                block_start = line + 1
+        i += 1
+    if block_start <= len(lines):
+        spans.append((None, block_start, len(lines)))
+    return spans
+
+
+def _block_header(lines, start_line):
+    """Find the symbol name declared at the start of a block."""
+    for text in lines[start_line - 1:start_line + 20]:
+        if '{' in text or '=>' in text:
+            match = _brace_symbol_regex.search(text)
+            return (match.group(1) or match.group(2)) if match else None
+    return None
+
+
+def _merge_small_spans(spans, lines, max_tokens):
+    """Merge adjacent anonymous spans while they fit in the token budget."""
+    merged = []
+    merged_tokens = 0
+    for symbol, start, end in spans:
+        tokens = count_tokens(''.join(lines[start - 1:end]))
+        if (merged and symbol is None and merged[-1][0] is None
+                and merged_tokens + tokens <= max_tokens):
+            merged[-1] = (None, merged[-1][1], end)
+            merged_tokens += tokens
+        else:
+            merged.append((symbol, start, end))
+            merged_tokens = tokens
+    return merged
+
+
+def _split_span(lines, start, end, max_tokens):
+    """Split a line span into consecutive windows of at most max_tokens tokens."""
+    parts = []
+    part_start = start
+    part_tokens = 0
+    for lineno in range(start, end + 1):
+        tokens = count_tokens(lines[lineno - 1]) if lineno <= len(lines) else 0
+        if part_tokens and part_tokens + tokens > max_tokens:
+            parts.append((part_start, lineno - 1))
+            part_start = lineno
+            part_tokens = 0
+        part_tokens += tokens
+    if part_start <= end:
+        parts.append((part_start, min(end, len(lines))))
+    return parts
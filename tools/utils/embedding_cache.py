@@ -0,0 +1,261 @@
+"""
+Content-addressed persistent embedding cache.
+Vectors are keyed by (model, sha256 of the text) in a SQLite index and stored as
+rows of an append-only float32 file per dimension that is read through a memory
+map, so rebuilding an index only embeds text that was never embedded before.
+
+Usage: python -m tools.utils.embedding_cache stats|compact [--max-age-days N]
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from tools.utils.clone_cache import FileLock
+
+DEFAULT_CACHE_DIR = os.getenv(
+    'EMBEDDING_CACHE_DIR', os.path.join(os.path.dirname(__file__), '..', 'output', 'embedding_cache')
+)
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir=None):
+        self.cache_dir = os.path.abspath(cache_dir or DEFAULT_CACHE_DIR)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        # Serializes appends to the vector files across processes
+        self._file_lock = FileLock(os.path.join(self.cache_dir, '.write.lock'))
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'index.db'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                dim INTEGER NOT NULL,
+                row INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            );
+            CREATE TABLE IF NOT EXISTS stats (
+                model TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _vector_path(self, dim):
+        return os.path.join(self.cache_dir, f'vectors_{dim}.f32')
+
+    def _read_rows(self, dim, rows):
+        path = self._vector_path(dim)
+        mapped = np.memmap(path, dtype=np.float32, mode='r')
+        matrix = mapped.reshape(-1, dim)
+        return np.array(matrix[np.asarray(rows, dtype=np.int64)])
+
+    def get_many(self, model, hashes):
+        """Look up cached vectors; returns {hash: list of floats} for the hashes that are cached."""
+        found = {}
+        by_dim = {}
+        with self._lock:
+            cursor = self._conn.cursor()
+            unique = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                cursor.execute(
+                    f"SELECT text_hash, dim, row FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model] + chunk
+                )
+                for h, dim, row in cursor.fetchall():
+                    by_dim.setdefault(dim, []).append((h, row))
+            if by_dim:
+                now = time.time()
+                cursor.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                                   [(now, model, h) for entries in by_dim.values() for h, _ in entries])
+                self._conn.commit()
+            # Read under the lock so a concurrent compaction cannot move rows underneath
+            for dim, entries in by_dim.items():
+                vectors = self._read_rows(dim, [row for _, row in entries])
+                for (h, _), vector in zip(entries, vectors):
+                    found[h] = vector.tolist()
+        return found
+
+    def put_many(self, model, hashes, vectors):
+        """Append new vectors to the cache (hashes already cached are ignored)."""
+        if not hashes:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        dim = matrix.shape[1]
+        with self._lock, self._file_lock:
+            cursor = self._conn.cursor()
+            known = set(self._cached_hashes(cursor, model, hashes))
+            new = {}
+            for i, h in enumerate(hashes):
+                if h not in known and h not in new:
+                    new[h] = i
+            if not new:
+                return
+            path = self._vector_path(dim)
+            row_bytes = 4 * dim
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size % row_bytes:
+                # Drop a partial row left by an interrupted write
+                os.truncate(path, size - size % row_bytes)
+            with open(path, 'ab') as f:
+                start_row = size // row_bytes
+                matrix[list(new.values())].tofile(f)
+            now = time.time()
+            cursor.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, dim, row, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(model, h, dim, start_row + n, now) for n, h in enumerate(new)]
+            )
+            self._conn.commit()
+
+    def _cached_hashes(self, cursor, model, hashes):
+        hashes = list(hashes)
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            cursor.execute(
+                f"SELECT text_hash FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                [model] + chunk
+            )
+            for (h,) in cursor.fetchall():
+                yield h
+
+    def record(self, model, hits, misses):
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO stats (model, hits, misses) VALUES (?, ?, ?)
+                ON CONFLICT(model) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses
+            """, (model, hits, misses))
+            self._conn.commit()
+
+    def stats(self):
+        """Per-model entry counts and lifetime hit rates, plus the size of the vector files."""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT model, COUNT(*) FROM embeddings GROUP BY model").fetchall())
+            rows = self._conn.execute("SELECT model, hits, misses FROM stats").fetchall()
+        models = {}
+        for model in set(counts) | {r[0] for r in rows}:
+            models[model] = {'entries': counts.get(model, 0), 'hits': 0, 'misses': 0, 'hit_rate': None}
+        for model, hits, misses in rows:
+            models[model].update(hits=hits, misses=misses,
+                                 hit_rate=round(hits / (hits + misses), 4) if hits + misses else None)
+        files = [name for name in os.listdir(self.cache_dir) if name.endswith('.f32')]
+        return {
+            'models': models,
+            'vector_bytes': sum(os.path.getsize(os.path.join(self.cache_dir, name)) for name in files)
+        }
+
+    def compact(self, max_age_days=None):
+        """
+        Drop entries unused for max_age_days (if given) and rewrite the vector files
+        so they only hold live rows. Returns the number of bytes reclaimed.
+        Rows are renumbered, so run it while no other process is reading the cache.
+        """
+        with self._lock, self._file_lock:
+            cursor = self._conn.cursor()
+            if max_age_days is not None:
+                cursor.execute("DELETE FROM embeddings WHERE last_used < ?", (time.time() - max_age_days * 86400,))
+            before = after = 0
+            dims = [d for (d,) in cursor.execute("SELECT DISTINCT dim FROM embeddings").fetchall()]
+            for name in os.listdir(self.cache_dir):
+                if name.startswith('vectors_') and name.endswith('.f32'):
+                    dim = int(name[len('vectors_'):-len('.f32')])
+                    before += os.path.getsize(self._vector_path(dim))
+                    if dim not in dims:
+                        os.remove(self._vector_path(dim))
+            for dim in dims:
+                entries = cursor.execute(
+                    "SELECT model, text_hash, row FROM embeddings WHERE dim = ? ORDER BY row", (dim,)
+                ).fetchall()
+                vectors = self._read_rows(dim, [row for _, _, row in entries])
+                tmp_path = self._vector_path(dim) + '.tmp'
+                vectors.tofile(tmp_path)
+                cursor.executemany("UPDATE embeddings SET row = ? WHERE model = ? AND text_hash = ?",
+                                   [(n, model, h) for n, (model, h, _) in enumerate(entries)])
+                os.replace(tmp_path, self._vector_path(dim))
+                after += os.path.getsize(self._vector_path(dim))
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+        return before - after
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings wrapper that only sends texts missing from the cache to the wrapped model."""
+
+    def __init__(self, embeddings, model=None, cache=None):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, 'model', None) or type(embeddings).__name__
+        self.cache = cache or get_embedding_cache()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(self.model, hashes)
+        missing = list(dict.fromkeys(h for h in hashes if h not in found))
+        if missing:
+            text_for = dict(zip(hashes, texts))
+            vectors = self.embeddings.embed_documents([text_for[h] for h in missing])
+            self.cache.put_many(self.model, missing, vectors)
+            found.update(zip(missing, (list(map(float, v)) for v in vectors)))
+        hits = len(texts) - len(missing)
+        self.hits += hits
+        self.misses += len(missing)
+        self.cache.record(self.model, hits, len(missing))
+        if texts:
+            print(f"Embedding cache: {hits}/{len(texts)} hits, {len(missing)} texts embedded")
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache():
+    """Get or create the global embedding cache instance"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or compact the embedding cache.")
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument("--cache-dir", default=None, help="cache directory (default: EMBEDDING_CACHE_DIR)")
+    parser.add_argument("--max-age-days", type=float, default=None,
+                        help="with compact: drop entries not used for this many days")
+    args = parser.parse_args(argv)
+    cache = EmbeddingCache(args.cache_dir)
+    if args.command == "compact":
+        reclaimed = cache.compact(args.max_age_days)
+        print(f"Reclaimed {reclaimed} bytes")
+    stats = cache.stats()
+    for model, s in sorted(stats['models'].items()):
+        rate = f"{s['hit_rate']:.1%}" if s['hit_rate'] is not None else "n/a"
+        print(f"{model}: {s['entries']} entries, {s['hits']} hits, {s['misses']} misses, hit rate {rate}")
+    print(f"Vector files: {stats['vector_bytes']} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+Embedding service used by every FAISS converter.
+Texts are grouped into batches bounded by count and by tokens, the batches are sent
+to a pluggable backend with bounded concurrency, and throttled or failed requests are
+retried with jittered backoff. The 'hashing' backend embeds deterministically and
+offline, so the whole pipeline can be run and benchmarked without network access.
+
+Configuration (environment):
+    EMBEDDING_BACKEND      openai (default), hashing, or "module:factory" for another backend
+    EMBEDDING_MODEL        OpenAI model (default: text-embedding-ada-002)
+    EMBEDDING_DIM          Dimension of the hashing backend (default: 384)
+    EMBEDDING_BATCH_SIZE   Texts per request (default: 256)
+    EMBEDDING_BATCH_TOKENS Tokens per request (default: 100000)
+    EMBEDDING_MAX_WORKERS  Concurrent requests (default: 4)
+
+A backend is any object with model, max_input_tokens, cacheable, embed(texts) and
+retryable(error). Other backends are selected by import path, e.g.
+EMBEDDING_BACKEND=mycompany.embeddings:LocalBackend, or registered with register_backend.
+
+Usage: python -m tools.utils.embedding_service [--backend hashing] [--texts N]
+"""
+import argparse
+import hashlib
+import importlib
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from tools.utils.code_chunker import count_tokens, truncate_to_tokens
+
+# Load environment variables from .env file
+load_dotenv()
+
+DEFAULT_BACKEND = os.getenv('EMBEDDING_BACKEND', 'openai')
+DEFAULT_OPENAI_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002')
+DEFAULT_HASHING_DIM = int(os.getenv('EMBEDDING_DIM', '384'))
+DEFAULT_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '256'))
+DEFAULT_BATCH_TOKENS = int(os.getenv('EMBEDDING_BATCH_TOKENS', '100000'))
+DEFAULT_MAX_WORKERS = int(os.getenv('EMBEDDING_MAX_WORKERS', '4'))
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+class OpenAIBackend:
+    """OpenAI embeddings API; the client's own retries are off so the service controls them."""
+    max_input_tokens = 8191
+    cacheable = True
+
+    def __init__(self, model=None, api_key=None):
+        from openai import OpenAI
+        self.model = model or DEFAULT_OPENAI_MODEL
+        self.client = OpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'), max_retries=0)
+
+    def embed(self, texts):
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def retryable(self, error):
+        import openai
+        return isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_slot(feature, dim):
+    """(column, sign) of a hashed feature."""
+    value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+class HashingBackend:
+    """
+    Deterministic local embedder: signed feature hashing of lower-cased word unigrams
+    and bigrams with sublinear term frequency, L2-normalized. Needs no model or network.
+    """
+    max_input_tokens = None
+    cacheable = False
+
+    def __init__(self, dim=None):
+        self.dim = dim or DEFAULT_HASHING_DIM
+        self.model = f'hashing-{self.dim}'
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _TOKEN_RE.findall(text.lower())
+            for feature in words + [f'{a} {b}' for a, b in zip(words, words[1:])]:
+                column, sign = _feature_slot(feature, self.dim)
+                matrix[row, column] += sign
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).tolist()
+
+    def retryable(self, error):
+        return False
+
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'hashing': HashingBackend,
+}
+
+
+def register_backend(name, factory):
+    """Make a backend factory selectable by name (EMBEDDING_BACKEND or create_embeddings(backend=...))."""
+    BACKENDS[name] = factory
+
+
+def create_backend(name=None, **kwargs):
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS and ':' in name:
+        # "module:factory" names a backend outside this module
+        module_name, _, attribute = name.partition(':')
+        register_backend(name, getattr(importlib.import_module(module_name), attribute))
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}' (available: {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[name](**kwargs)
+
+
+class EmbeddingService(Embeddings):
+    """LangChain Embeddings that batch, parallelize and retry requests to a backend."""
+
+    def __init__(self, backend, batch_size=None, max_batch_tokens=None, max_workers=None,
+                 max_retries=5, backoff=0.5, max_backoff=30.0):
+        self.backend = backend
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.max_batch_tokens = max_batch_tokens or DEFAULT_BATCH_TOKENS
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @property
+    def model(self):
+        return self.backend.model
+
+    def _prepare(self, texts):
+        """Texts as sent to the backend (truncated to its input limit) and their token counts."""
+        limit = self.backend.max_input_tokens
+        if limit is None:
+            return texts, [0] * len(texts)
+        prepared, counts = [], []
+        for text in texts:
+            # Empty input is rejected by the API
+            text = text or ' '
+            tokens = count_tokens(text)
+            if tokens > limit:
+                text = truncate_to_tokens(text, limit)
+                tokens = limit
+            prepared.append(text)
+            counts.append(tokens)
+        return prepared, counts
+
+    def _batches(self, counts):
+        """Lists of text positions, each within batch_size texts and max_batch_tokens tokens."""
+        batch, batch_tokens = [], 0
+        for i, tokens in enumerate(counts):
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _embed_with_retry(self, texts):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.backend.embed(texts)
+            except Exception as e:
+                if attempt == self.max_retries or not self.backend.retryable(e):
+                    raise
+                headers = getattr(getattr(e, 'response', None), 'headers', None) or {}
+                try:
+                    delay = float(headers.get('retry-after'))
+                except (TypeError, ValueError):
+                    delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                print(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(min(delay, self.max_backoff))
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        prepared, counts = self._prepare(texts)
+        batches = list(self._batches(counts))
+        if len(batches) <= 1:
+            return self._embed_with_retry(prepared) if prepared else []
+        vectors = [None] * len(texts)
+        done = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            futures = {executor.submit(self._embed_with_retry, [prepared[i] for i in batch]): batch
+                       for batch in batches}
+            for n, future in enumerate(as_completed(futures), 1):
+                batch = futures[future]
+                for i, vector in zip(batch, future.result()):
+                    vectors[i] = vector
+                done += len(batch)
+                if n % 10 == 0 or n == len(batches):
+                    print(f"Embedded {done}/{len(texts)} texts ({n}/{len(batches)} batches)")
+        return vectors
+
+    def embed_query(self, text):
+        prepared, _ = self._prepare([text])
+        return self._embed_with_retry(prepared)[0]
+
+
+def create_embeddings(backend=None, api_key=None, **kwargs):
+    """
+    The embeddings used for indexing and querying: an EmbeddingService over the configured
+    backend, behind the persistent embedding cache when the backend is worth caching.
+    """
+    from tools.utils.embedding_cache import CachedEmbeddings
+    backend_kwargs = {'api_key': api_key} if (backend or DEFAULT_BACKEND) == 'openai' else {}
+    service = EmbeddingService(create_backend(backend, **backend_kwargs), **kwargs)
+    return CachedEmbeddings(service) if service.backend.cacheable else service
+
+
+def benchmark(backend=None, texts=2000, **kwargs):
+    """Embed synthetic code-like texts and report throughput."""
+    service = EmbeddingService(create_backend(backend), **kwargs)
+    rng = random.Random(0)
+    words = ['def', 'class', 'return', 'index', 'commit', 'ticket', 'file', 'user', 'cache', 'query',
+             'update', 'fetch', 'error', 'status', 'branch', 'embed', 'vector', 'search', 'token', 'batch']
+    corpus = [' '.join(rng.choice(words) for _ in range(rng.randint(20, 200))) for _ in range(texts)]
+    start = time.perf_counter()
+    vectors = service.embed_documents(corpus)
+    seconds = time.perf_counter() - start
+    return {'backend': service.model, 'texts': len(vectors), 'dim': len(vectors[0]), 'seconds': seconds,
+            'texts_per_s': len(vectors) / seconds if seconds else float('inf')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the embedding service.")
+    parser.add_argument("--backend", default=None, help=f"backend name (default: {DEFAULT_BACKEND})")
+    parser.add_argument("--texts", type=int, default=2000, help="number of synthetic texts")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    result = benchmark(args.backend, args.texts, batch_size=args.batch_size, max_workers=args.workers)
+    print(f"{result['backend']}: {result['texts']} texts (dim {result['dim']}) in {result['seconds']:.3f}s, "
+          f"{result['texts_per_s']:.0f} texts/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,23 @@
+import argparse
 import json
+import sys
 import faiss
-from langchain_openai.embeddings import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv
 import os
 import pathlib
 import importlib
+import shutil
+from tools.utils.embedding_service import DEFAULT_BACKEND, create_embeddings
+from tools.utils.ann_index import choose_strategy, configured_strategy
+from tools.utils.faiss_store import IdMappedFAISS, load_store
+from tools.utils.sources import get_source, index_path, iter_documents, iter_records, source_names
 
 # Load environment variables from .env file
 load_dotenv()
 
 openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
+if not openai_api_key and DEFAULT_BACKEND == "openai":
     # Try to read from settings.json
     settings_path = pathlib.Path(__file__).parent / "settings.json"
     if settings_path.exists():
@@ -24,83 +30,146 @@ if not openai_api_key:
     if not openai_api_key:
         openai_api_key = input("Enter your OpenAI API key: ").strip()
 
+# Documents embedded and inserted per step of the indexing pipeline
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "1000"))
+
+def get_embeddings():
+    """Embeddings of the configured backend (EMBEDDING_BACKEND), batched and cached by the embedding service."""
+    return create_embeddings(api_key=openai_api_key)
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def index_documents(documents, faiss_index_path: str, removed_ids=(), rebuild: bool = False,
+                    store_name: str = None, batch_size: int = None):
+    """
+    Stream (id, Document) pairs into a FAISS index by stable id, embedding and inserting one
+    batch at a time so memory stays bounded by the batch, not the corpus.
+    Args:
+        documents (iterable): (id, Document) pairs; when an id repeats, the last document wins.
+        faiss_index_path (str): Path of the FAISS index.
+        removed_ids (iterable): Document ids to drop from the index.
+        rebuild (bool): Build a new index from documents instead of updating the existing one;
+            without documents the existing index is removed.
+        store_name (str): Source name ('jira', 'codebase', 'git_history', ...), for the index
+            strategy and the metadata columns.
+        batch_size (int): Documents per batch (default: INDEX_BATCH_SIZE).
+    Returns:
+        int: Number of documents embedded.
+    """
+    strategy = configured_strategy(store_name)
+    columns = get_source(store_name).get("columns", ()) if store_name else ()
+    embeddings = get_embeddings()
+    store = None if rebuild else load_store(faiss_index_path, embeddings, columns)
+    if store is not None:
+        store.delete([str(i) for i in removed_ids])
+        # Delete-only updates never reach the batch loop; compact here as well
+        store.maybe_compact(background=True)
+    embedded = 0
+    for batch in _batches(documents, batch_size or INDEX_BATCH_SIZE):
+        latest = dict(batch)
+        ids, docs = list(latest), list(latest.values())
+        if store is None:
+            # Starts exact; moved to the configured strategy once the corpus size is known
+            store = IdMappedFAISS.from_documents(docs, embeddings, ids=ids, metadata_columns=columns)
+        else:
+            # Old versions are tombstoned first, so compaction can run while the new ones are embedded
+            store.delete(ids)
+            store.maybe_compact(background=True)
+            store.add_documents(docs, ids=ids)
+        embedded += len(ids)
+        print(f"Indexed {embedded} documents into {faiss_index_path}")
+    if store is None:
+        if rebuild and os.path.isdir(faiss_index_path):
+            # Nothing left to index: drop the old index instead of serving stale documents
+            shutil.rmtree(faiss_index_path)
+            print(f"No documents to index; removed {faiss_index_path}")
+        return 0
+    # Move to the index type suited to the corpus size
+    wanted = choose_strategy(len(store.index_to_docstore_id), strategy)
+    if wanted != store.strategy:
+        store.rebuild_index(wanted)
+    store.save_local(faiss_index_path)
+    return embedded
+
+def index_records(source: str, records, faiss_index_path: str = None, removed_ids=(), rebuild: bool = False,
+                  batch_size: int = None):
+    """
+    Index records of a knowledge source (see tools.utils.sources) as they are produced.
+    Args:
+        source (str): Source name.
+        records (iterable): Records in the source's export format.
+        faiss_index_path (str): Path of the FAISS index (default: the source's index directory).
+        removed_ids (iterable): Document ids to drop from the index.
+        rebuild (bool): Build a new index from records instead of updating the existing one.
+        batch_size (int): Documents per batch (default: INDEX_BATCH_SIZE).
+    Returns:
+        int: Number of documents embedded.
+    """
+    return index_documents(iter_documents(source, records), faiss_index_path or index_path(source), removed_ids,
+                           rebuild, store_name=source, batch_size=batch_size)
+
+def index_json_file(source: str, json_file_path: str, faiss_index_path: str = None, rebuild: bool = True):
+    """Index a source's export file, streaming its records. Returns the number of documents embedded."""
+    faiss_index_path = faiss_index_path or index_path(source)
+    embedded = index_records(source, iter_records(source, json_file_path), faiss_index_path, rebuild=rebuild)
+    print(f"Embedded {embedded} {source} documents from {json_file_path} in FAISS index {faiss_index_path}")
+    return embedded
+
+def jira_tickets_to_faiss(tickets, faiss_index_path: str, removed_ids=(), rebuild: bool = False):
+    """
+    Re-embed only the given tickets in the JIRA FAISS index, keyed by ticket id.
+    Args:
+        tickets (iterable): Changed tickets ({id, summary, description}); their old versions are replaced.
+        faiss_index_path (str): Path of the FAISS index.
+        removed_ids (iterable): Ticket ids to drop from the index.
+        rebuild (bool): Build a new index from tickets instead of updating the existing one.
+    Returns:
+        int: Number of tickets embedded.
+    """
+    embedded = index_records("jira", tickets, faiss_index_path, removed_ids, rebuild)
+    print(f"Embedded {embedded} JIRA tickets in FAISS index {faiss_index_path}")
+    return embedded
+
 def json_to_faiss(json_file_path: str, faiss_index_path: str):
     """
-    Convert JSON data into FAISS chunks for querying with LLM.
-    
+    Convert the JIRA tickets JSON ({"tickets": [...]}) into a FAISS index for querying with LLM.
+
     Args:
         json_file_path (str): Path to the JSON file.
         faiss_index_path (str): Path to save the FAISS index.
-    
+
+    Returns:
+        int: Number of tickets embedded.
+    """
+    return index_json_file("jira", json_file_path, faiss_index_path)
+
+def codebase_entries_to_faiss(entries, faiss_index_path: str, removed_ids=(), rebuild: bool = False):
+    """
+    Embed codebase entries into the codebase FAISS index under their file + symbol ids.
+    Args:
+        entries (iterable): Entries of the changed files, all entries of each file (ids are numbered per file).
+        faiss_index_path (str): Path of the FAISS index.
+        removed_ids (iterable): Ids of entries of changed or deleted files to drop.
+        rebuild (bool): Build a new index from entries instead of updating the existing one.
     Returns:
-        FAISS: The FAISS index object.
+        int: Number of documents embedded.
     """
- 
-    #print(f"Using OpenAI API key: {api_key}")
-    # Step 1: Load JSON data
-    with open(json_file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    
-    # Step 2: Extract text chunks from JSON and add metadata
-    from langchain_core.documents import Document
-    documents = []
-    for ticket in data.get("tickets", []):
-        chunk = f"ID: {ticket['id']}\nSummary: {ticket['summary']}\nDescription: {ticket['description']}"
-        metadata = {"id": str(ticket["id"])}
-        documents.append(Document(page_content=chunk, metadata=metadata))
-    
-    # Step 3: Generate embeddings using OpenAI embeddings
-    embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)  # Ensure your OpenAI API key is set in the environment
-    
-    # Step 4: Create FAISS index with documents and metadata
-    faiss_index = FAISS.from_documents(documents, embeddings)
-    
-    # Step 5: Save the FAISS index
-    faiss_index.save_local(faiss_index_path)
-    print(f"FAISS index saved to {faiss_index_path}")
-    
-    return faiss_index
+    embedded = index_records("codebase", entries, faiss_index_path, removed_ids, rebuild)
+    print(f"Embedded {embedded} codebase entries in FAISS index {faiss_index_path}")
+    return embedded
 
 def codebase_json_to_faiss(json_file_path: str, faiss_index_path: str):
-    import json
-    from langchain_core.documents import Document
-    from langchain_openai.embeddings import OpenAIEmbeddings
-    from langchain_community.vectorstores import FAISS
-
-    # Load JSON data (list of dicts)
-    with open(json_file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # Build documents from codebase_index.json
-    documents = []
-    for entry in data:
-        # Compose a chunk from available fields
-        chunk = ""
-        if "file" in entry:
-            chunk += f"File: {entry['file']}\n"
-        if "name" in entry:
-            chunk += f"Name: {entry['name']}\n"
-        if "type" in entry:
-            chunk += f"Type: {entry['type']}\n"
-        if "doc" in entry and entry["doc"]:
-            chunk += f"Doc: {entry['doc']}\n"
-        if "comments" in entry and entry["comments"]:
-            chunk += "Comments: " + "\n".join(entry["comments"]) + "\n"
-        if "content" in entry and entry["content"]:
-            chunk += f"Content: {entry['content']}\n"
-        if not chunk:
-            continue
-        metadata = {k: v for k, v in entry.items() if k != "content"}
-        documents.append(Document(page_content=chunk, metadata=metadata))
-
-    # Generate embeddings and create FAISS index
-    embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-    faiss_index = FAISS.from_documents(documents, embeddings)
-    faiss_index.save_local(faiss_index_path)
-    print(f"FAISS index saved to {faiss_index_path}")
-    return faiss_index
-
-# Function to convert remote_git_history.json to FAISS index
+    """Convert codebase_index.json (a list of entries) into a FAISS index. Returns the number embedded."""
+    return index_json_file("codebase", json_file_path, faiss_index_path)
+
 def remote_git_history_to_faiss(json_file_path: str, faiss_index_path: str):
     """
     Convert remote_git_history.json git commit data into FAISS chunks for semantic search.
@@ -108,30 +177,33 @@ def remote_git_history_to_faiss(json_file_path: str, faiss_index_path: str):
         json_file_path (str): Path to the remote_git_history.json file.
         faiss_index_path (str): Path to save the FAISS index.
     Returns:
-        FAISS: The FAISS index object.
+        int: Number of commits embedded.
+    """
+    return index_json_file("git_history", json_file_path, faiss_index_path)
+
+def git_commits_to_faiss(commits, faiss_index_path: str, append: bool = False):
+    """
+    Embed commits into the git history FAISS index, keyed by sha.
+    Args:
+        commits (iterable): Commits in fetch_remote_git_history format.
+        faiss_index_path (str): Path of the FAISS index.
+        append (bool): Upsert the commits into the existing index instead of replacing it.
+    Returns:
+        int: Number of documents embedded.
     """
-    from langchain_core.documents import Document
-    # Load JSON data
-    with open(json_file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # Extract commit data
-    commits = data.get("commits", [])
-    documents = []
-    for commit in commits:
-        chunk = f"SHA: {commit['sha']}\nMessage: {commit['message']}\nAuthor: {commit['author']['name']} <{commit['author']['email']}>\nAuthored: {commit['authored_date']}\nCommitted: {commit['committed_date']}\nChanged Files: {', '.join(commit.get('changed_files', []))}"
-        metadata = {
-            "sha": commit["sha"],
-            "short_sha": commit.get("short_sha"),
-            "author": commit["author"]["name"],
-            "authored_date": commit["authored_date"],
-            "committed_date": commit["committed_date"]
-        }
-        documents.append(Document(page_content=chunk, metadata=metadata))
-
-    # Generate embeddings and create FAISS index
-    embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-    faiss_index = FAISS.from_documents(documents, embeddings)
-    faiss_index.save_local(faiss_index_path)
-    print(f"FAISS index saved to {faiss_index_path}")
-    return faiss_index
+    embedded = index_records("git_history", commits, faiss_index_path, rebuild=not append)
+    print(f"{'Added' if append else 'Indexed'} {embedded} commits in FAISS index {faiss_index_path}")
+    return embedded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index a knowledge source export into its FAISS index.")
+    parser.add_argument("source", choices=source_names())
+    parser.add_argument("json_file", help="export file in the source's format")
+    parser.add_argument("--index", default=None, help="FAISS index directory (default: the source's)")
+    parser.add_argument("--update", action="store_true", help="upsert into the existing index instead of rebuilding")
+    args = parser.parse_args(argv)
+    index_json_file(args.source, args.json_file, args.index, rebuild=not args.update)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
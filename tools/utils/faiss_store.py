@@ -0,0 +1,421 @@
+"""
+FAISS vector store maintained in place by stable document ids (ticket key, commit sha,
+file + symbol). Vectors live in an IndexIDMap2 under integer labels; replacing or
+deleting a document only unmaps its label, leaving a tombstone that searches skip.
+Once tombstones make up a large enough share of the index it is compacted, optionally
+in a background thread while new documents are being embedded.
+
+Documents are kept in a SQLite docstore (see tools.utils.sqlite_docstore) saved next to
+the index, so nothing is pickled. Saved stores can be opened read-only with open_store:
+vectors are memory-mapped and document rows are read only for the hits a search returns.
+Querying goes through tools.utils.retrieval, which searches small stores with NumPy instead.
+"""
+import os
+import threading
+import uuid
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+from tools.utils.ann_index import build_index, removes_in_place, search_parameters, strategy_of
+from tools.utils.numpy_store import NUMPY_SEARCH_MAX, remove_vectors, save_vectors
+from tools.utils.sqlite_docstore import SQLiteDocstore
+
+# Compact once this share of the stored vectors is tombstoned
+COMPACT_RATIO = float(os.getenv('FAISS_COMPACT_RATIO', '0.2'))
+
+
+def _id_mapped(index):
+    """Wrap a positional flat index (as written by FAISS.from_documents) so positions become labels."""
+    mapped = faiss.IndexIDMap2(faiss.IndexFlat(index.d, index.metric_type))
+    if index.ntotal:
+        mapped.add_with_ids(index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype=np.int64))
+    return mapped
+
+
+def _without(index, labels):
+    """index minus the vectors stored under labels; rebuilt when the index type cannot remove in place."""
+    dead = np.fromiter(labels, dtype=np.int64, count=len(labels))
+    if removes_in_place(index):
+        index.remove_ids(faiss.IDSelectorBatch(dead))
+        return index
+    # Graph and inverted-file indexes: re-add the live vectors to an empty copy (keeps the training)
+    stored = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(stored, dead)
+    inner = faiss.downcast_index(index.index)
+    vectors = inner.reconstruct_n(0, inner.ntotal)[keep]
+    fresh = faiss.clone_index(inner)
+    fresh.reset()
+    rebuilt = faiss.IndexIDMap2(fresh)
+    rebuilt.add_with_ids(vectors, stored[keep])
+    return rebuilt
+
+
+class IdMappedFAISS(FAISS):
+    """
+    LangChain FAISS store keyed by document id. index_to_docstore_id maps live labels to
+    document ids; labels still stored in the index but no longer mapped are tombstones.
+    Adding a document under an existing id replaces it, and unknown ids are ignored on delete.
+    Documents live in a SQLiteDocstore; metadata_columns names the metadata keys it keeps in
+    filterable columns when the store is created.
+    """
+
+    def __init__(self, *args, metadata_columns=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if not isinstance(self.index, faiss.IndexIDMap2):
+            self.index = _id_mapped(self.index)
+        if not isinstance(self.docstore, SQLiteDocstore):
+            # Stores loaded from a pickle or built by plain FAISS
+            docstore = SQLiteDocstore(columns=metadata_columns)
+            items = list(self.index_to_docstore_id.items())
+            docstore.add({doc_id: self.docstore.search(doc_id) for _, doc_id in items},
+                         labels=[label for label, _ in items])
+            self.docstore = docstore
+            self.index_to_docstore_id = docstore.label_map
+        self._lock = threading.RLock()
+        self._label_of = None
+        stored = faiss.vector_to_array(self.index.id_map)
+        live = getattr(self.index_to_docstore_id, 'labels', None)
+        if live is None:
+            live = np.fromiter(self.index_to_docstore_id, dtype=np.int64, count=len(self.index_to_docstore_id))
+        self.tombstones = set(np.setdiff1d(stored, live).tolist())
+        self._next_label = int(stored.max()) + 1 if len(stored) else 0
+        self._selector = None
+        self._compaction = None
+        self._added_while_compacting = None
+
+    @property
+    def _labels(self):
+        """doc id -> label, built on first write so read-only stores never materialize it."""
+        if self._label_of is None:
+            self._label_of = {doc_id: label for label, doc_id in self.index_to_docstore_id.items()}
+        return self._label_of
+
+    @classmethod
+    def empty(cls, embedding, index, metadata_columns=(), **kwargs):
+        docstore = SQLiteDocstore(columns=metadata_columns)
+        return cls(embedding, index, docstore, docstore.label_map, **kwargs)
+
+    @classmethod
+    def from_embeddings(cls, text_embeddings, embedding, metadatas=None, ids=None, strategy='flat', **kwargs):
+        """Build a store whose index type is given by strategy (see tools.utils.ann_index), trained on these vectors."""
+        text_embeddings = list(text_embeddings)
+        distance_strategy = kwargs.get('distance_strategy', DistanceStrategy.EUCLIDEAN_DISTANCE)
+        metric = faiss.METRIC_INNER_PRODUCT if distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT else faiss.METRIC_L2
+        index = build_index(np.array([vector for _, vector in text_embeddings], dtype=np.float32), strategy, metric)
+        store = cls.empty(embedding, index, **kwargs)
+        store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return cls.from_embeddings(zip(texts, embedding.embed_documents(texts)), embedding,
+                                   metadatas=metadatas, ids=ids, **kwargs)
+
+    @classmethod
+    async def afrom_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        vectors = await embedding.aembed_documents(texts)
+        return cls.from_embeddings(zip(texts, vectors), embedding, metadatas=metadatas, ids=ids, **kwargs)
+
+    # Updates
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(zip(texts, self._embed_documents(texts)), metadatas=metadatas, ids=ids)
+
+    async def aadd_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        vectors = await self._aembed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        """Insert or replace documents by id (a random id is generated where none is given)."""
+        pairs = list(text_embeddings)
+        if not pairs:
+            return []
+        texts = [text for text, _ in pairs]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        if len(ids) != len(texts):
+            raise ValueError("Number of ids does not match number of texts.")
+        if len(ids) != len(set(ids)):
+            raise ValueError("Duplicate ids found in the ids list.")
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [Document(id=id_, page_content=text, metadata=metadata)
+                     for id_, text, metadata in zip(ids, texts, metadatas)]
+        vectors = np.array([vector for _, vector in pairs], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vectors)
+        self._add(ids, documents, vectors)
+        return ids
+
+    def _add(self, ids, documents, vectors):
+        with self._lock:
+            self._tombstone(ids)
+            labels = np.arange(self._next_label, self._next_label + len(ids), dtype=np.int64)
+            self._next_label += len(ids)
+            self.index.add_with_ids(vectors, labels)
+            self.docstore.add(dict(zip(ids, documents)), labels=labels.tolist())
+            for label, id_ in zip(labels.tolist(), ids):
+                self._labels[id_] = label
+            if self._added_while_compacting is not None:
+                self._added_while_compacting.extend(labels.tolist())
+
+    def _tombstone(self, ids):
+        removed = [id_ for id_ in dict.fromkeys(ids) if id_ in self._labels]
+        if not removed:
+            return 0
+        for id_ in removed:
+            self.tombstones.add(self._labels.pop(id_))
+        self.docstore.delete(removed)
+        self._selector = None
+        return len(removed)
+
+    def delete(self, ids=None, **kwargs):
+        """Delete documents by id; their vectors stay tombstoned until the next compaction."""
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        with self._lock:
+            self._tombstone([str(id_) for id_ in ids])
+        return True
+
+    def merge_from(self, target):
+        """Copy the live documents of another store into this one (same ids replace existing documents)."""
+        if not isinstance(target, IdMappedFAISS):
+            target = IdMappedFAISS(target.embedding_function, target.index, target.docstore,
+                                   target.index_to_docstore_id)
+        with target._lock:
+            items = list(target.index_to_docstore_id.items())
+            if not items:
+                return
+            labels = np.array([label for label, _ in items], dtype=np.int64)
+            vectors = target.index.reconstruct_batch(labels)
+            ids = [id_ for _, id_ in items]
+            documents = [target.docstore.search(id_) for id_ in ids]
+        self._add(ids, documents, vectors)
+
+    # Search
+
+    def _search_params(self):
+        if not self.tombstones:
+            return None
+        if self._selector is None:
+            dead = np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones))
+            batch = faiss.IDSelectorBatch(dead)
+            self._selector = (faiss.IDSelectorNot(batch), batch)
+        return search_parameters(self.index, self._selector[0])
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, fetch_k=20, **kwargs):
+        """
+        A filter on metadata columns ({key: value or list of values}) selects the matching labels
+        before searching; any other filter is applied to the fetch_k nearest documents.
+        """
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+        allowed = self.docstore.labels_where(filter) if filter is not None else None
+        filter_func = self._create_filter_func(filter) if filter is not None and allowed is None else None
+        docs = []
+        with self._lock:
+            if allowed is None:
+                params = self._search_params()
+            elif len(allowed):
+                # Only live labels match, so tombstones are excluded as well
+                selector = faiss.IDSelectorBatch(allowed)
+                params = search_parameters(self.index, selector)
+            else:
+                return []
+            scores, labels = self.index.search(vector, k if filter_func is None else fetch_k, params=params)
+            found = self.docstore.by_labels(label for label in labels[0] if label != -1)
+            for score, label in zip(scores[0], labels[0]):
+                if label == -1:
+                    continue
+                doc = found.get(int(label))
+                if doc is None:
+                    raise ValueError(f"Could not find document for label {label}")
+                if filter_func is None or filter_func(doc.metadata):
+                    docs.append((doc, score))
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            larger_is_better = self.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+            docs = [(doc, score) for doc, score in docs
+                    if (score >= score_threshold if larger_is_better else score <= score_threshold)]
+        return docs[:k]
+
+    def max_marginal_relevance_search_with_score_by_vector(self, embedding, **kwargs):
+        # MMR reconstructs candidate vectors by label, so it needs an index without tombstones
+        self.compact()
+        return super().max_marginal_relevance_search_with_score_by_vector(embedding, **kwargs)
+
+    # Compaction
+
+    @property
+    def strategy(self):
+        return strategy_of(self.index)
+
+    def rebuild_index(self, strategy='auto'):
+        """
+        Re-create the index with another strategy from its own live vectors (nothing is re-embedded),
+        dropping tombstones on the way. Returns the strategy used.
+        """
+        self.wait_for_compaction()
+        with self._lock:
+            labels = np.array(list(self.index_to_docstore_id), dtype=np.int64)
+            if not len(labels):
+                return self.strategy
+            vectors = self.index.reconstruct_batch(labels)
+            index = build_index(vectors, strategy, self.index.metric_type)
+            index.add_with_ids(vectors, labels)
+            self.index = index
+            self.tombstones = set()
+            self._selector = None
+        print(f"Rebuilt FAISS index as {self.strategy} over {len(labels)} vectors")
+        return self.strategy
+
+    def tombstone_ratio(self):
+        total = self.index.ntotal
+        return len(self.tombstones) / total if total else 0.0
+
+    def compact(self):
+        """
+        Rebuild the index without its tombstoned vectors. The heavy work runs on a copy,
+        so searches and updates can continue meanwhile; documents added in the meantime are
+        carried over when the copy is swapped in. Returns the number of vectors dropped.
+        """
+        with self._lock:
+            dead = set(self.tombstones)
+            if not dead or self._added_while_compacting is not None:
+                return 0
+            snapshot = faiss.clone_index(self.index)
+            self._added_while_compacting = []
+        try:
+            compacted = _without(snapshot, dead)
+        except Exception:
+            with self._lock:
+                self._added_while_compacting = None
+            raise
+        with self._lock:
+            added = self._added_while_compacting
+            self._added_while_compacting = None
+            if added:
+                labels = np.array(added, dtype=np.int64)
+                compacted.add_with_ids(self.index.reconstruct_batch(labels), labels)
+            self.index = compacted
+            self.tombstones -= dead
+            self._selector = None
+        print(f"Compacted FAISS index: dropped {len(dead)} tombstoned vectors, {compacted.ntotal} remain")
+        return len(dead)
+
+    def maybe_compact(self, ratio=COMPACT_RATIO, background=False):
+        """Compact when at least ratio of the stored vectors are tombstones. Returns True if started."""
+        if not self.tombstones or self.tombstone_ratio() < ratio:
+            return False
+        if self._compaction is not None and self._compaction.is_alive():
+            return False
+        if not background:
+            self.compact()
+            return True
+        self._compaction = threading.Thread(target=self.compact, name='faiss-compaction', daemon=True)
+        self._compaction.start()
+        return True
+
+    def wait_for_compaction(self):
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    def save_local(self, folder_path, index_name="index"):
+        """
+        Save the index (index.faiss) and the docstore (index.db, which also records the index
+        strategy and metric). Stores small enough for exact NumPy search also get their vectors
+        as .npy files (see tools.utils.numpy_store). Every file is replaced atomically, so readers
+        that opened the previous version keep working.
+        """
+        self.wait_for_compaction()
+        os.makedirs(folder_path, exist_ok=True)
+        base = os.path.join(folder_path, index_name)
+        with self._lock:
+            faiss.write_index(self.index, base + '.faiss.tmp')
+            labels = self.docstore.labels()
+            if 0 < len(labels) <= NUMPY_SEARCH_MAX:
+                save_vectors(base, labels, self.index.reconstruct_batch(labels))
+            else:
+                remove_vectors(base)
+            if not self.docstore.read_only:
+                self.docstore.set_meta('strategy', self.strategy)
+                self.docstore.set_meta('metric', 'ip' if self.index.metric_type == faiss.METRIC_INNER_PRODUCT else 'l2')
+                self.docstore.set_meta('normalize_L2', '1' if self._normalize_L2 else '0')
+            self.docstore.save(base + '.db')
+            os.replace(base + '.faiss.tmp', base + '.faiss')
+        # A pickled docstore left from before the SQLite docstore is stale now
+        if os.path.exists(base + '.pkl'):
+            os.remove(base + '.pkl')
+
+
+def _mmap_flags(strategy):
+    # Inverted lists are memory-mapped by IO_FLAG_MMAP; flat, SQ and HNSW storage by IO_FLAG_MMAP_IFC
+    flag = faiss.IO_FLAG_MMAP if strategy.startswith('ivf') else faiss.IO_FLAG_MMAP_IFC
+    return flag | faiss.IO_FLAG_READ_ONLY
+
+
+def _saved_options(docstore):
+    """Distance strategy and normalization recorded by save_local."""
+    return {
+        'distance_strategy': (DistanceStrategy.MAX_INNER_PRODUCT if docstore.get_meta('metric') == 'ip'
+                              else DistanceStrategy.EUCLIDEAN_DISTANCE),
+        'normalize_L2': docstore.get_meta('normalize_L2') == '1'
+    }
+
+
+def _source_columns(faiss_index_path):
+    """Filter columns of the knowledge source whose index is at faiss_index_path (none for other paths)."""
+    from tools.utils.sources import get_source, index_path, source_names
+    for name in source_names():
+        if os.path.abspath(index_path(name)) == os.path.abspath(faiss_index_path):
+            return get_source(name).get('columns', ())
+    return ()
+
+
+def open_store(faiss_index_path, embeddings, index_name="index"):
+    """
+    Open a saved store read-only for querying: vectors are memory-mapped and document rows are
+    read on demand, so startup cost and RSS follow what searches touch rather than the corpus
+    size. A store saved with a pickled docstore is unpickled once and saved back with the
+    SQLite docstore, so later opens never unpickle it. Returns None if missing.
+    """
+    base = os.path.join(faiss_index_path, index_name)
+    if not os.path.exists(base + '.faiss'):
+        return None
+    if not os.path.exists(base + '.db'):
+        legacy = IdMappedFAISS.load_local(faiss_index_path, embeddings, index_name, allow_dangerous_deserialization=True,
+                                          metadata_columns=_source_columns(faiss_index_path))
+        try:
+            legacy.save_local(faiss_index_path, index_name)
+        except OSError as e:
+            print(f"Warning: could not convert {faiss_index_path} to the SQLite docstore ({e}); using it as loaded")
+            return legacy
+        print(f"Converted {faiss_index_path} from a pickled docstore to the SQLite docstore")
+    docstore = SQLiteDocstore(base + '.db', read_only=True)
+    index = faiss.read_index(base + '.faiss', _mmap_flags(docstore.get_meta('strategy') or 'flat'))
+    return IdMappedFAISS(embeddings, index, docstore, docstore.label_map, **_saved_options(docstore))
+
+
+def load_store(faiss_index_path, embeddings, metadata_columns=()):
+    """
+    Load the store at faiss_index_path for updating, or None if missing. Stores saved with a
+    pickled docstore (and positional indexes) are converted, with metadata_columns as filter
+    columns; they are saved without the pickle.
+    """
+    base = os.path.join(faiss_index_path, "index")
+    if not os.path.exists(base + ".faiss"):
+        return None
+    if not os.path.exists(base + ".db"):
+        return IdMappedFAISS.load_local(faiss_index_path, embeddings, allow_dangerous_deserialization=True,
+                                        metadata_columns=metadata_columns)
+    docstore = SQLiteDocstore(base + ".db")
+    return IdMappedFAISS(embeddings, faiss.read_index(base + ".faiss"), docstore, docstore.label_map,
+                         **_saved_options(docstore))
@@ -0,0 +1,233 @@
+"""
+Filtered file walker for the indexers.
+Honors .gitignore files and a configurable ignore list, skips binary files by
+sniffing their first bytes, enforces a maximum file size and reads large text
+files through mmap.
+"""
+import fnmatch
+import mmap
+import os
+import re
+
+DEFAULT_MAX_FILE_SIZE = int(os.getenv('INDEX_MAX_FILE_SIZE', str(1024 * 1024)))
+MMAP_THRESHOLD = 256 * 1024
+SNIFF_BYTES = 8192
+_TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+
+DEFAULT_IGNORE_DIRS = {
+    '.git', '.svn', '.hg', '__pycache__', 'node_modules', 'bower_components', 'vendor',
+    'dist', 'build', 'out', 'coverage', '.next', '.nuxt', '.venv', 'venv', '.tox',
+    '.mypy_cache', '.pytest_cache', '.idea', '.gradle', 'target'
+}
+DEFAULT_IGNORE_PATTERNS = [
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'Pipfile.lock',
+    'Cargo.lock', 'composer.lock', 'Gemfile.lock', '*.min.js', '*.min.css', '*.map',
+    '*.pyc', '*.so', '*.dll', '*.exe', '*.class', '*.jar', '*.zip', '*.tar', '*.gz',
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.ico', '*.pdf', '*.woff', '*.woff2', '*.ttf',
+    '*.faiss', '*.pkl', '*.db', '*.sqlite', '.env'
+]
+
+
+def _translate_gitignore(pattern):
+    """Translate one gitignore glob (already stripped of '!' and trailing '/') to a regex."""
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == n:
+            out.append('/.*')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                out.append(re.escape(pattern[i]))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end + 1
+        elif pattern[i] == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    prefix = '' if anchored else '(?:.*/)?'
+    return re.compile(prefix + ''.join(out) + '(?:/.*)?$')
+
+
+def parse_gitignore(lines, base=''):
+    """
+    Parse .gitignore lines into rules relative to base (a '/'-separated directory).
+
+    Returns:
+        list: (base, regex, negate, dir_only) tuples
+    """
+    rules = []
+    for raw in lines:
+        line = raw.rstrip('\n').rstrip('\r')
+        if not line or line.startswith('#'):
+            continue
+        if not line.endswith('\\ '):
+            line = line.rstrip()
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        elif line.startswith('\\!') or line.startswith('\\#'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        rules.append((base, _translate_gitignore(line), negate, dir_only))
+    return rules
+
+
+def is_ignored(rel_path, is_dir, rules):
+    """Apply gitignore rules (last match wins) to a '/'-separated path relative to the walk root."""
+    ignored = False
+    for base, regex, negate, dir_only in rules:
+        if base:
+            if not rel_path.startswith(base + '/'):
+                continue
+            candidate = rel_path[len(base) + 1:]
+        else:
+            candidate = rel_path
+        if dir_only and not is_dir:
+            continue
+        if regex.match(candidate):
+            ignored = not negate
+    return ignored
+
+
+def is_binary_data(data):
+    """Sniff raw bytes: NUL bytes or a high share of control characters mean binary."""
+    if not data:
+        return False
+    if b'\0' in data:
+        return True
+    control = len(data.translate(None, _TEXT_BYTES))
+    return control / len(data) > 0.3
+
+
+def is_binary_file(path):
+    with open(path, 'rb') as f:
+        return is_binary_data(f.read(SNIFF_BYTES))
+
+
+def matches_ignore_patterns(rel_path, patterns):
+    """True if the file name or relative path matches any configured ignore pattern."""
+    name = rel_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel_path, p) for p in patterns)
+
+
+def read_text_file(path, size=None):
+    """Read a UTF-8 text file, through mmap when it is large. Returns '' when it cannot be decoded."""
+    if size is None:
+        size = os.path.getsize(path)
+    try:
+        with open(path, 'rb') as f:
+            if size >= MMAP_THRESHOLD:
+                # Decoded straight from the mapped pages, without an intermediate bytes copy
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    return str(view, 'utf-8')
+            return f.read().decode('utf-8')
+    except (UnicodeDecodeError, ValueError, OSError):
+        return ''
+
+
+def walk_files(root, ignore_dirs=None, ignore_patterns=None, max_file_size=DEFAULT_MAX_FILE_SIZE,
+               use_gitignore=True, skip_binary=True, stats=None, extensions=None):
+    """
+    Walk root once and yield (path, rel_path, size) for every file worth indexing.
+
+    Args:
+        root (str): Directory to walk
+        ignore_dirs (set): Directory names never descended into (default: DEFAULT_IGNORE_DIRS)
+        ignore_patterns (list): fnmatch patterns for files to skip (default: DEFAULT_IGNORE_PATTERNS)
+        max_file_size (int): Files larger than this many bytes are skipped
+        use_gitignore (bool): Honor .gitignore files found in the tree
+        skip_binary (bool): Skip files whose first bytes look binary
+        stats (dict): Optional dict that receives counts of skipped files by reason
+        extensions (iterable): Only yield files with these extensions (e.g. {'.py'}); others are
+                               dropped before they are stat'ed or sniffed, and not counted
+    """
+    ignore_dirs = DEFAULT_IGNORE_DIRS if ignore_dirs is None else set(ignore_dirs)
+    ignore_patterns = DEFAULT_IGNORE_PATTERNS if ignore_patterns is None else list(ignore_patterns)
+    extensions = tuple(extensions) if extensions is not None else None
+    if stats is None:
+        stats = {}
+    for key in ('ignored', 'too_large', 'binary', 'files'):
+        stats.setdefault(key, 0)
+    root = os.path.abspath(root)
+    rules_by_dir = {root: []}
+    for current, dirs, files in os.walk(root):
+        rel_dir = os.path.relpath(current, root).replace(os.sep, '/')
+        rel_dir = '' if rel_dir == '.' else rel_dir
+        rules = rules_by_dir.pop(current, [])
+        if use_gitignore and '.gitignore' in files:
+            try:
+                with open(os.path.join(current, '.gitignore'), 'r', encoding='utf-8', errors='replace') as f:
+                    rules = rules + parse_gitignore(f, rel_dir)
+            except OSError:
+                pass
+
+        kept_dirs = []
+        for d in dirs:
+            rel = f"{rel_dir}/{d}" if rel_dir else d
+            if d in ignore_dirs or (rules and is_ignored(rel, True, rules)):
+                stats['ignored'] += 1
+                continue
+            kept_dirs.append(d)
+            rules_by_dir[os.path.join(current, d)] = rules
+        dirs[:] = kept_dirs
+
+        for name in files:
+            if extensions is not None and not name.endswith(extensions):
+                continue
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            path = os.path.join(current, name)
+            if matches_ignore_patterns(rel, ignore_patterns) or (rules and is_ignored(rel, False, rules)):
+                stats['ignored'] += 1
+                continue
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if max_file_size is not None and size > max_file_size:
+                stats['too_large'] += 1
+                continue
+            try:
+                if skip_binary and is_binary_file(path):
+                    stats['binary'] += 1
+                    continue
+            except OSError:
+                continue
+            stats['files'] += 1
+            yield path, rel, size
+
+
+def should_index_path(rel_path, size, ignore_dirs=None, ignore_patterns=None, max_file_size=DEFAULT_MAX_FILE_SIZE):
+    """Apply the ignore list and size limit to a path that is not walked on disk (e.g. a git tree entry)."""
+    ignore_dirs = DEFAULT_IGNORE_DIRS if ignore_dirs is None else set(ignore_dirs)
+    ignore_patterns = DEFAULT_IGNORE_PATTERNS if ignore_patterns is None else list(ignore_patterns)
+    if any(part in ignore_dirs for part in rel_path.split('/')[:-1]):
+        return False
+    if matches_ignore_patterns(rel_path, ignore_patterns):
+        return False
+    return max_file_size is None or size <= max_file_size
@@ -0,0 +1,290 @@
+"""
+Precomputed churn, ownership and co-change analytics over git history.
+Counts live in stdlib arrays indexed by interned file/author ids, and the sparse
+co-change matrix is a dict of packed (file, file) keys, so answering
+"how often did X change" or "who owns X" never touches the LLM or the raw history.
+The shas of the folded commits are saved as a sorted binary array of their own and
+only read when more commits are folded in.
+"""
+import bisect
+import json
+import os
+from array import array
+from datetime import datetime
+
+from tools.utils.clone_cache import repo_cache_key
+
+DEFAULT_ANALYTICS_DIR = os.path.join(os.path.dirname(__file__), '..', 'output', 'git_analytics')
+# Commits touching more files than this (mass renames, reformatting) are left out of co-change
+MAX_COCHANGE_FILES = 50
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+
+
+def _timestamp(value):
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class GitAnalytics:
+    def __init__(self):
+        self.paths = []                 # file id -> path
+        self.authors = []               # author id -> name
+        self._path_ids = {}
+        self._author_ids = {}
+        self.file_changes = array('I')
+        self.file_insertions = array('Q')
+        self.file_deletions = array('Q')
+        self.file_last_change = array('d')
+        self.author_commits = array('I')
+        self.file_authors = {}          # (file_id << 32 | author_id) -> commits
+        self.cochange = {}              # (file_id << 32 | other_id) -> commits, stored in both directions
+        self.commits = 0                # number of commits folded in
+        self._seen_commits = set()
+        self._commits_path = None       # saved shas, read on first use
+        self._sorted_keys = {}          # table name -> sorted keys, rebuilt lazily for row lookups
+
+    @property
+    def seen_commits(self):
+        """Shas of the commits folded in."""
+        if self._seen_commits is None:
+            self._seen_commits = _read_shas(self._commits_path)
+        return self._seen_commits
+
+    # Ingestion
+
+    def _file_id(self, path):
+        fid = self._path_ids.get(path)
+        if fid is None:
+            fid = self._path_ids[path] = len(self.paths)
+            self.paths.append(path)
+            self.file_changes.append(0)
+            self.file_insertions.append(0)
+            self.file_deletions.append(0)
+            self.file_last_change.append(0.0)
+        return fid
+
+    def _author_id(self, name):
+        aid = self._author_ids.get(name)
+        if aid is None:
+            aid = self._author_ids[name] = len(self.authors)
+            self.authors.append(name)
+            self.author_commits.append(0)
+        return aid
+
+    def update(self, commits):
+        """
+        Fold commits (fetch_remote_git_history format) into the tallies.
+        Commits already counted are skipped, so the same history can be fed repeatedly.
+
+        Returns:
+            int: Number of new commits added
+        """
+        added = 0
+        seen_commits = self.seen_commits
+        for commit in commits:
+            sha = commit['sha']
+            if sha in seen_commits:
+                continue
+            seen_commits.add(sha)
+            added += 1
+            aid = self._author_id(commit['author']['name'])
+            self.author_commits[aid] += 1
+            when = _timestamp(commit.get('committed_date') or commit.get('authored_date'))
+            files = commit.get('files') or [{'path': p} for p in commit.get('changed_files', [])]
+            fids = []
+            for f in files:
+                fid = self._file_id(f['path'])
+                fids.append(fid)
+                self.file_changes[fid] += 1
+                self.file_insertions[fid] += f.get('insertions') or 0
+                self.file_deletions[fid] += f.get('deletions') or 0
+                if when > self.file_last_change[fid]:
+                    self.file_last_change[fid] = when
+                key = fid << _SHIFT | aid
+                self.file_authors[key] = self.file_authors.get(key, 0) + 1
+            fids = sorted(set(fids))
+            if 1 < len(fids) <= MAX_COCHANGE_FILES:
+                for i, a in enumerate(fids):
+                    for b in fids[i + 1:]:
+                        for key in (a << _SHIFT | b, b << _SHIFT | a):
+                            self.cochange[key] = self.cochange.get(key, 0) + 1
+        if added:
+            self.commits += added
+            self._sorted_keys = {}
+        return added
+
+    # Queries
+
+    def resolve(self, file_path):
+        """File ids matching a path; a bare file name matches it in any directory."""
+        file_path = file_path.replace('\\', '/').strip('/')
+        if file_path in self._path_ids:
+            return [self._path_ids[file_path]]
+        suffix = '/' + file_path
+        return [fid for fid, path in enumerate(self.paths) if path.endswith(suffix)]
+
+    def _row(self, name, fid):
+        """(other_id, count) pairs for one row of a packed sparse table."""
+        table = getattr(self, name)
+        keys = self._sorted_keys.get(name)
+        if keys is None:
+            keys = self._sorted_keys[name] = array('Q', sorted(table))
+        lo = bisect.bisect_left(keys, fid << _SHIFT)
+        hi = bisect.bisect_left(keys, (fid + 1) << _SHIFT)
+        return [(keys[i] & _MASK, table[keys[i]]) for i in range(lo, hi)]
+
+    def file_stats(self, file_path, top=5):
+        """Change count, line churn, top authors and most frequently co-changed files."""
+        fids = self.resolve(file_path)
+        if not fids:
+            return None
+        authors = {}
+        partners = {}
+        for fid in fids:
+            for aid, count in self._row('file_authors', fid):
+                authors[aid] = authors.get(aid, 0) + count
+            for other, count in self._row('cochange', fid):
+                partners[other] = partners.get(other, 0) + count
+        last = max(self.file_last_change[fid] for fid in fids)
+        return {
+            'file': file_path,
+            'paths': [self.paths[fid] for fid in fids],
+            'changes': sum(self.file_changes[fid] for fid in fids),
+            'insertions': sum(self.file_insertions[fid] for fid in fids),
+            'deletions': sum(self.file_deletions[fid] for fid in fids),
+            'last_change': datetime.fromtimestamp(last).isoformat() if last else None,
+            'authors': [{'author': self.authors[aid], 'commits': count}
+                        for aid, count in sorted(authors.items(), key=lambda x: -x[1])[:top]],
+            'co_changed': [{'file': self.paths[other], 'commits': count}
+                           for other, count in sorted(partners.items(), key=lambda x: -x[1])[:top]]
+        }
+
+    def top_files(self, top=10):
+        order = sorted(range(len(self.paths)), key=lambda fid: -self.file_changes[fid])[:top]
+        return [{'file': self.paths[fid], 'changes': self.file_changes[fid],
+                 'insertions': self.file_insertions[fid], 'deletions': self.file_deletions[fid]}
+                for fid in order]
+
+    def top_authors(self, top=10):
+        order = sorted(range(len(self.authors)), key=lambda aid: -self.author_commits[aid])[:top]
+        return [{'author': self.authors[aid], 'commits': self.author_commits[aid]} for aid in order]
+
+    def summary(self, top=10):
+        return {
+            'commits': self.commits,
+            'files': len(self.paths),
+            'authors': len(self.authors),
+            'top_files': self.top_files(top),
+            'top_authors': self.top_authors(top)
+        }
+
+    # Persistence: a small JSON header plus raw array dumps
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        meta = {'paths': self.paths, 'authors': self.authors, 'commits': self.commits}
+        commits_path = os.path.join(directory, 'seen_commits.bin')
+        if self._seen_commits is not None or self._commits_path != commits_path:
+            _write_shas(commits_path, self.seen_commits)
+        sparse = {
+            'file_authors': self.file_authors,
+            'cochange': self.cochange
+        }
+        arrays = {
+            'file_changes': self.file_changes, 'file_insertions': self.file_insertions,
+            'file_deletions': self.file_deletions, 'file_last_change': self.file_last_change,
+            'author_commits': self.author_commits
+        }
+        for name, table in sparse.items():
+            keys = array('Q', sorted(table))
+            arrays[f'{name}_keys'] = keys
+            arrays[f'{name}_counts'] = array('I', (table[k] for k in keys))
+        for name, values in arrays.items():
+            tmp_path = os.path.join(directory, f'{name}.bin.tmp')
+            with open(tmp_path, 'wb') as f:
+                values.tofile(f)
+            os.replace(tmp_path, os.path.join(directory, f'{name}.bin'))
+        tmp_path = os.path.join(directory, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+    @classmethod
+    def load(cls, directory):
+        """Load saved analytics, or return an empty instance if none exist."""
+        analytics = cls()
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            return analytics
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        analytics.paths = meta['paths']
+        analytics.authors = meta['authors']
+        if 'seen_commits' in meta:
+            # Saved before the shas had a file of their own
+            analytics._seen_commits = set(meta['seen_commits'])
+            analytics.commits = len(meta['seen_commits'])
+        else:
+            analytics._seen_commits = None
+            analytics._commits_path = os.path.join(directory, 'seen_commits.bin')
+            analytics.commits = meta['commits']
+        analytics._path_ids = {p: i for i, p in enumerate(analytics.paths)}
+        analytics._author_ids = {a: i for i, a in enumerate(analytics.authors)}
+
+        def read(name, typecode):
+            values = array(typecode)
+            path = os.path.join(directory, f'{name}.bin')
+            with open(path, 'rb') as f:
+                values.frombytes(f.read())
+            return values
+
+        analytics.file_changes = read('file_changes', 'I')
+        analytics.file_insertions = read('file_insertions', 'Q')
+        analytics.file_deletions = read('file_deletions', 'Q')
+        analytics.file_last_change = read('file_last_change', 'd')
+        analytics.author_commits = read('author_commits', 'I')
+        for name in ('file_authors', 'cochange'):
+            keys = read(f'{name}_keys', 'Q')
+            setattr(analytics, name, dict(zip(keys, read(f'{name}_counts', 'I'))))
+        return analytics
+
+
+def _write_shas(path, shas):
+    """Save hex shas as one sorted array of fixed-width binary ids (20 bytes for SHA-1, 32 for SHA-256)."""
+    ids = sorted(bytes.fromhex(sha) for sha in shas)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(bytes([len(ids[0]) if ids else 20]))
+        for sha_id in ids:
+            f.write(sha_id)
+    os.replace(tmp_path, path)
+
+
+def _read_shas(path):
+    if path is None or not os.path.exists(path):
+        return set()
+    with open(path, 'rb') as f:
+        data = f.read()
+    width = data[0]
+    return {data[i:i + width].hex() for i in range(1, len(data), width)}
+
+
+def analytics_dir_for(repo_url, base_dir=None):
+    return os.path.join(base_dir or DEFAULT_ANALYTICS_DIR, repo_cache_key(repo_url))
+
+
+def latest_analytics_dir(base_dir=None):
+    """The most recently updated analytics directory, or None."""
+    base_dir = base_dir or DEFAULT_ANALYTICS_DIR
+    if not os.path.isdir(base_dir):
+        return None
+    candidates = [os.path.join(base_dir, name) for name in os.listdir(base_dir)]
+    candidates = [c for c in candidates if os.path.exists(os.path.join(c, 'meta.json'))]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: os.path.getmtime(os.path.join(c, 'meta.json')))
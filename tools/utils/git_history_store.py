@@ -0,0 +1,133 @@
+"""
+Persistent per-repository git history store used for incremental syncs.
+Each branch keeps an append-only JSONL file of extracted commits, and a small
+state file records the last synced sha per branch so the next sync only walks
+commits that are new since then.
+
+Every sync appends one segment of commits, newest first, after the older ones.
+The state records the byte range of each segment, so reading the segments back
+in reverse yields the whole history newest first. Once a branch has more than
+GIT_HISTORY_MAX_SEGMENTS segments, the file is rewritten newest first as one.
+"""
+import json
+import os
+from datetime import datetime
+
+from tools.utils.clone_cache import repo_cache_key
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(__file__), '..', 'output', 'git_history')
+MAX_SEGMENTS = int(os.getenv('GIT_HISTORY_MAX_SEGMENTS', '16'))
+COPY_CHUNK_BYTES = 1 << 20
+
+
+class GitHistoryStore:
+    def __init__(self, repo_url, base_dir=None):
+        self.repo_url = repo_url
+        self.directory = os.path.join(base_dir or DEFAULT_HISTORY_DIR, repo_cache_key(repo_url))
+        self.state_path = os.path.join(self.directory, 'state.json')
+        os.makedirs(self.directory, exist_ok=True)
+        self.state = {'repository': repo_url, 'branches': {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        self._segment_start = {}    # branch -> offset of the segment being appended
+
+    def history_path(self, branch):
+        return os.path.join(self.directory, branch.replace('/', '__') + '.jsonl')
+
+    def branches(self):
+        return list(self.state['branches'])
+
+    def branch_state(self, branch):
+        """{'last_sha', 'commits', 'updated', 'segments'} for a branch, or {} if it was never synced."""
+        return self.state['branches'].get(branch, {})
+
+    def _segments(self, branch):
+        """[start, end) byte ranges of the stored segments, oldest sync first."""
+        state = self.branch_state(branch)
+        if 'segments' in state:
+            return state['segments']
+        path = self.history_path(branch)
+        # Histories written before segments were recorded are one segment
+        return [[0, os.path.getsize(path)]] if state and os.path.exists(path) else []
+
+    def set_branch_state(self, branch, last_sha, commits):
+        """Record a finished sync, closing the segment appended since the previous one."""
+        segments = list(self._segments(branch))
+        start = self._segment_start.pop(branch, None)
+        if start is not None:
+            segments.append([start, os.path.getsize(self.history_path(branch))])
+        if len(segments) > MAX_SEGMENTS:
+            segments = self._compact(branch, segments)
+        self.state['branches'][branch] = {
+            'last_sha': last_sha,
+            'commits': commits,
+            'updated': datetime.now().isoformat(),
+            'segments': segments
+        }
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _compact(self, branch, segments):
+        """Rewrite the history of a branch newest first, as a single segment."""
+        path = self.history_path(branch)
+        tmp_path = path + '.tmp'
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            for start, end in reversed(segments):
+                src.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = src.read(min(COPY_CHUNK_BYTES, remaining))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+        os.replace(tmp_path, path)
+        return [[0, os.path.getsize(path)]]
+
+    def reset(self, branch):
+        """Drop the stored history of a branch (before a rebuild)."""
+        try:
+            os.remove(self.history_path(branch))
+        except FileNotFoundError:
+            pass
+        self.state['branches'].pop(branch, None)
+        self._segment_start.pop(branch, None)
+
+    def append(self, branch, commits):
+        """Append commits, newest first, to the segment of the current sync. Returns the number written."""
+        path = self.history_path(branch)
+        if branch not in self._segment_start:
+            segments = self._segments(branch)
+            end = segments[-1][1] if segments else 0
+            # Drop commits left behind by a sync that did not finish
+            with open(path, 'ab') as f:
+                f.truncate(end)
+            self._segment_start[branch] = end
+        count = 0
+        with open(path, 'a', encoding='utf-8') as f:
+            for commit in commits:
+                f.write(json.dumps(commit, ensure_ascii=False) + '\n')
+                count += 1
+        return count
+
+    def iter_commits(self, branch):
+        """Stream the stored commits of a branch, newest first."""
+        path = self.history_path(branch)
+        if not os.path.exists(path):
+            return
+        segments = list(self._segments(branch))
+        if branch in self._segment_start:
+            # Segment of a sync still in progress
+            segments.append([self._segment_start[branch], os.path.getsize(path)])
+        with open(path, 'rb') as f:
+            for start, end in reversed(segments):
+                f.seek(start)
+                while f.tell() < end:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        yield json.loads(line)
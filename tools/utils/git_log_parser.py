@@ -0,0 +1,161 @@
+"""
+Streaming parser for `git log --raw --numstat -z`.
+One git subprocess produces the whole history with per-file change type and
+line counts; commits are parsed and yielded one at a time, so memory stays
+bounded by the largest single commit rather than the length of the history.
+"""
+import subprocess
+import sys
+import time
+
+_RECORD = b'\x1e'
+# sha, parents, author name, author email, author date, committer date, message
+_FORMAT = '%x1e%H%x00%P%x00%an%x00%ae%x00%aI%x00%cI%x00%B%x00'
+_HEADER_FIELDS = 7
+CHUNK_SIZE = 1 << 16
+
+
+def git_log_command(ref='HEAD', max_commits=None, exclude=None):
+    """Build the git log command line; exclude is a sha whose history is left out (ref ^exclude)."""
+    args = ["git", "log", f"--format={_FORMAT}", "--raw", "--numstat", "-z", "-M", "--no-abbrev",
+            "--no-color", "--diff-merges=first-parent"]
+    if max_commits:
+        args.append(f"--max-count={int(max_commits)}")
+    args.append(ref)
+    if exclude:
+        args.append(f"^{exclude}")
+    args.append("--")
+    return args
+
+
+def _decode(data):
+    return data.decode('utf-8', 'replace')
+
+
+def _count(value):
+    return None if value == b'-' else int(value)
+
+
+def parse_commit_record(record):
+    """Parse one \\x1e-delimited record into a commit dict in fetch_remote_git_history format."""
+    tokens = record.split(b'\0')
+    sha, parents, name, email, authored, committed, message = (_decode(t) for t in tokens[:_HEADER_FIELDS])
+    files = {}
+    order = []
+    i, n = _HEADER_FIELDS, len(tokens)
+    while i < n:
+        token = tokens[i].lstrip(b'\n')
+        i += 1
+        if not token:
+            continue
+        if token.startswith(b':'):
+            # :old_mode new_mode old_sha new_sha STATUS, then one path (two for renames/copies)
+            status = _decode(token.rsplit(b' ', 1)[-1])
+            if status[0] in 'RC':
+                old_path, path = _decode(tokens[i]), _decode(tokens[i + 1])
+                i += 2
+            else:
+                old_path, path = None, _decode(tokens[i])
+                i += 1
+            if path not in files:
+                order.append(path)
+                files[path] = {'path': path, 'insertions': None, 'deletions': None}
+            files[path]['change_type'] = status[0]
+            if old_path is not None:
+                files[path]['old_path'] = old_path
+        else:
+            # insertions<TAB>deletions<TAB>path; an empty path means old and new paths follow
+            insertions, deletions, path = token.split(b'\t', 2)
+            if not path:
+                path = tokens[i + 1]
+                i += 2
+            path = _decode(path)
+            entry = files.get(path)
+            if entry is None:
+                order.append(path)
+                entry = files[path] = {'path': path, 'change_type': 'M'}
+            entry['insertions'] = _count(insertions)
+            entry['deletions'] = _count(deletions)
+    file_list = [files[p] for p in order]
+    return {
+        "sha": sha,
+        "short_sha": sha[:7],
+        "parents": parents.split(),
+        "message": message.strip(),
+        "author": {"name": name, "email": email},
+        "authored_date": authored,
+        "committed_date": committed,
+        "changed_files": order,
+        "files": file_list
+    }
+
+
+def iter_git_log(repo_path, ref='HEAD', max_commits=None, exclude=None):
+    """
+    Yield commits newest first from a single streaming git log process.
+
+    Args:
+        repo_path (str): Path to the repository
+        ref (str): Branch, tag or sha to walk from (default: HEAD)
+        max_commits (int): Stop after this many commits (default: all)
+        exclude (str): Leave out this commit and its ancestors (for incremental syncs)
+    """
+    proc = subprocess.Popen(git_log_command(ref, max_commits, exclude), cwd=repo_path,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    buffer = b''
+    try:
+        while True:
+            chunk = proc.stdout.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer += chunk
+            records = buffer.split(_RECORD)
+            buffer = records.pop()
+            for record in records:
+                if record.strip(b'\0\n'):
+                    yield parse_commit_record(record)
+        if buffer.strip(b'\0\n'):
+            yield parse_commit_record(buffer)
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, proc.args, stderr=_decode(stderr))
+
+
+def _gitpython_history(repo_path, max_commits):
+    """The previous extraction: one GitPython tree diff per commit."""
+    import git
+    repo = git.Repo(repo_path)
+    history = []
+    for commit in repo.iter_commits(max_count=max_commits):
+        changed_files = []
+        if commit.parents:
+            changed_files = [item.a_path or item.b_path for item in commit.parents[0].diff(commit)]
+        history.append({"sha": commit.hexsha, "changed_files": changed_files})
+    return history
+
+
+def benchmark(repo_path, max_commits=1000):
+    """Time the streaming parser against per-commit GitPython diffs on the same repository."""
+    results = {}
+    for label, func in (('git_log_stream', lambda: list(iter_git_log(repo_path, max_commits=max_commits))),
+                        ('gitpython_diff', lambda: _gitpython_history(repo_path, max_commits))):
+        start = time.perf_counter()
+        commits = func()
+        seconds = time.perf_counter() - start
+        results[label] = {'commits': len(commits), 'seconds': seconds,
+                          'commits_per_s': len(commits) / seconds if seconds else float('inf')}
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python -m tools.utils.git_log_parser <repo-path> [max-commits]
+    if len(sys.argv) < 2:
+        print("Usage: python -m tools.utils.git_log_parser <repo-path> [max-commits]")
+        sys.exit(1)
+    stats = benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+    for label, result in stats.items():
+        print(f"{label:15s} {result['commits']} commits  {result['seconds']:.3f}s  {result['commits_per_s']:.0f} commits/s")
@@ -0,0 +1,90 @@
+"""
+Read repository contents directly from git objects, without a working-tree checkout.
+Trees are listed with `git ls-tree` and blobs are streamed through one persistent
+`git cat-file --batch` process.
+"""
+import subprocess
+
+
+class GitObjectReader:
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.stdout.close()
+            self._proc.wait()
+            self._proc = None
+
+    def resolve(self, ref):
+        """Resolve a ref (branch, tag, sha) to a commit sha."""
+        return subprocess.run(
+            ["git", "rev-parse", "--verify", f"{ref}^{{commit}}"],
+            cwd=self.repo_path, check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    def list_tree(self, ref):
+        """
+        List every blob reachable from the tree at ref.
+
+        Returns:
+            list: (path, blob_sha, size) tuples
+        """
+        output = subprocess.run(
+            ["git", "ls-tree", "-r", "-l", "-z", ref],
+            cwd=self.repo_path, check=True, capture_output=True
+        ).stdout
+        entries = []
+        for record in output.split(b'\0'):
+            if not record:
+                continue
+            info, path = record.split(b'\t', 1)
+            mode, obj_type, sha, size = info.split()
+            # Skip submodules (commit) and symlinks (mode 120000)
+            if obj_type != b'blob' or mode == b'120000':
+                continue
+            entries.append((path.decode('utf-8', 'surrogateescape'), sha.decode('ascii'), int(size)))
+        return entries
+
+    def read_blob(self, sha):
+        """Read one object's raw content through the persistent cat-file process."""
+        if self._proc is None:
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", "--batch"], cwd=self.repo_path,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+        self._proc.stdin.write(sha.encode('ascii') + b'\n')
+        self._proc.stdin.flush()
+        header = self._proc.stdout.readline().split()
+        if len(header) != 3:
+            raise KeyError(f"Object {sha} not found in {self.repo_path}")
+        size = int(header[2])
+        data = self._proc.stdout.read(size)
+        self._proc.stdout.read(1)  # trailing newline
+        return data
+
+    def iter_blobs(self, ref, known_shas=None, include=None):
+        """
+        Stream (path, blob_sha, content) for the tree at ref.
+
+        Args:
+            ref (str): Branch, tag or commit to read
+            known_shas (dict): path -> blob sha from a previous run; unchanged blobs yield content None
+            include (callable): include(path, size) -> bool; blobs it rejects are not read or yielded
+        """
+        known_shas = known_shas or {}
+        for path, sha, size in self.list_tree(ref):
+            if include is not None and not include(path, size):
+                continue
+            if known_shas.get(path) == sha:
+                yield path, sha, None
+            else:
+                yield path, sha, self.read_blob(sha)
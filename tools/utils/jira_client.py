@@ -0,0 +1,168 @@
+"""
+JIRA search client with a pooled keep-alive session.
+The first page tells how many issues match; as soon as that is parsed, the
+remaining pages are requested concurrently with bounded parallelism, retried
+with jittered backoff on 429/5xx, and yielded one issue at a time in page order.
+Only the configured fields are requested, and responses are parsed
+incrementally with ijson when it is installed.
+"""
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_WORKERS = 8
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Fields stored in the ticket store (see DevelopmentContextManager.upsert_jira_tickets)
+DEFAULT_FIELDS = os.getenv(
+    "JIRA_FIELDS",
+    "summary,description,status,assignee,created,updated,resolutiondate,issuetype,priority,labels"
+)
+
+
+def create_session(auth, pool_size=DEFAULT_MAX_WORKERS):
+    """requests.Session whose connection pool can keep one connection per worker alive."""
+    session = requests.Session()
+    session.auth = auth
+    session.headers.update({"Content-Type": "application/json", "Accept": "application/json"})
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_with_retry(session, url, params, max_retries=5, backoff=0.5, max_backoff=30.0, timeout=60, stream=False):
+    """
+    GET url, retrying throttled (429), server-error (5xx) and connection failures.
+    Waits honor Retry-After when the server sends it, otherwise use full-jitter exponential backoff.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.get(url, params=params, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise Exception(f"Failed to fetch JIRA tickets: {e}")
+            retry_after = None
+        else:
+            if response.status_code == 200:
+                return response
+            body = response.text
+            response.close()
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                raise Exception(f"Failed to fetch JIRA tickets: {response.status_code} - {body}")
+            retry_after = response.headers.get("Retry-After")
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+        time.sleep(min(delay, max_backoff))
+
+
+def iter_page(response, meta):
+    """
+    Yield the issues of one search response as they are parsed.
+    startAt, maxResults and total are stored in meta (complete once the generator is exhausted).
+    """
+    try:
+        if not IJSON_AVAILABLE:
+            data = json.loads(response.content)
+            meta.update({k: data[k] for k in ("startAt", "maxResults", "total") if k in data})
+            yield from data.get("issues", [])
+            return
+        response.raw.decode_content = True
+        events = ijson.parse(response.raw)
+        for prefix, event, value in events:
+            if prefix in ("startAt", "maxResults", "total") and event == "number":
+                meta[prefix] = int(value)
+            elif prefix == "issues.item" and event == "start_map":
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+                for _, item_event, item_value in events:
+                    builder.event(item_event, item_value)
+                    if item_event in ("start_map", "start_array"):
+                        depth += 1
+                    elif item_event in ("end_map", "end_array"):
+                        depth -= 1
+                        if depth == 0:
+                            break
+                yield builder.value
+    finally:
+        response.close()
+
+
+def iter_issues(jira_api_url, auth, query, fields=DEFAULT_FIELDS, expand=None, page_size=DEFAULT_PAGE_SIZE,
+                max_workers=DEFAULT_MAX_WORKERS, session=None):
+    """
+    Yield every issue matching a JQL query, in the order JIRA returns them.
+
+    Args:
+        jira_api_url (str): Search endpoint, e.g. https://x.atlassian.net/rest/api/latest/search
+        auth (tuple): (user, token)
+        query (str): JQL
+        fields (str): Comma-separated fields to return (default: DEFAULT_FIELDS, env JIRA_FIELDS)
+        expand (str): Optional comma-separated expansions, e.g. 'changelog'
+        page_size (int): Requested maxResults per page (the server may cap it lower)
+        max_workers (int): Maximum pages requested concurrently; at most this many pages are buffered
+        session (requests.Session): Session to reuse (default: a new pooled session)
+    """
+    own_session = session is None
+    if own_session:
+        session = create_session(auth, max_workers)
+    try:
+        params = {"jql": query, "fields": fields, "startAt": 0, "maxResults": page_size}
+        if expand:
+            params["expand"] = expand
+        meta = {}
+
+        def fetch_page(start_at, step):
+            page_params = dict(params, startAt=start_at, maxResults=step)
+            return list(iter_page(get_with_retry(session, jira_api_url, page_params, stream=True), {}))
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            # A sliding window of in-flight pages, consumed in submission order
+            pending = deque()
+            offsets = None
+
+            def start_window(first_count):
+                # The server's maxResults is authoritative: it caps oversized page requests
+                step = meta.get("maxResults") or first_count or page_size
+                window = iter((start_at, step) for start_at in
+                              range(meta.get("startAt", 0) + step, meta.get("total", first_count), step))
+                for page in window:
+                    pending.append(executor.submit(fetch_page, *page))
+                    if len(pending) >= max_workers:
+                        break
+                return window
+
+            # Page 1 is buffered, and the window starts as soon as its total and maxResults are parsed
+            first_page = []
+            for issue in iter_page(get_with_retry(session, jira_api_url, params, stream=True), meta):
+                if offsets is None and "total" in meta and "maxResults" in meta:
+                    offsets = start_window(len(first_page))
+                first_page.append(issue)
+            if offsets is None:
+                offsets = start_window(len(first_page))
+            yield from first_page
+            while pending:
+                page = pending.popleft().result()
+                next_page = next(offsets, None)
+                if next_page is not None:
+                    pending.append(executor.submit(fetch_page, *next_page))
+                yield from page
+    finally:
+        if own_session:
+            session.close()
+
@@ -0,0 +1,267 @@
+"""
+Exact NumPy search for small stores.
+For stores of up to NUMPY_SEARCH_MAX_VECTORS vectors, save_local also writes the vectors as
+a label-ordered .npy matrix. Such a store is opened without FAISS or LangChain's vector
+stores: queries are scored against every row with one matrix multiply per batch of queries,
+the top k are picked with argpartition, and metadata filters become boolean row masks
+applied before the top-k selection. Documents come straight from the store's SQLite file.
+
+    NUMPY_SEARCH_MAX_VECTORS   largest store searched with NumPy (default: 20000; 0 disables)
+
+Usage: python -m tools.utils.numpy_store [--sizes 1000,5000,20000] [--dim D] [--queries Q] [--k K]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from tools.utils.sqlite_docstore import SQLiteDocstore
+
+NUMPY_SEARCH_MAX = int(os.getenv('NUMPY_SEARCH_MAX_VECTORS', '20000'))
+# Queries scored per matrix multiply
+QUERY_BATCH = 256
+# Same strings as LangChain's DistanceStrategy, so results merge with FAISS stores
+EUCLIDEAN_DISTANCE = 'EUCLIDEAN_DISTANCE'
+MAX_INNER_PRODUCT = 'MAX_INNER_PRODUCT'
+
+
+def save_vectors(base, labels, vectors):
+    """Write vectors (rows ordered like labels) and their labels next to the index at base, atomically."""
+    arrays = (('.vector_labels.npy', np.asarray(labels, dtype=np.int64)),
+              ('.vectors.npy', np.ascontiguousarray(vectors, dtype=np.float32)))
+    for suffix, array in arrays:
+        with open(base + suffix + '.tmp', 'wb') as f:
+            np.save(f, array)
+    for suffix, _ in arrays:
+        os.replace(base + suffix + '.tmp', base + suffix)
+
+
+def remove_vectors(base):
+    for suffix in ('.vector_labels.npy', '.vectors.npy'):
+        if os.path.exists(base + suffix):
+            os.remove(base + suffix)
+
+
+def _matches(metadata, filter):
+    if callable(filter):
+        return filter(metadata)
+    for key, value in filter.items():
+        if isinstance(value, (list, tuple, set)):
+            if metadata.get(key) not in value:
+                return False
+        elif metadata.get(key) != value:
+            return False
+    return True
+
+
+class NumpyStore:
+    """
+    Read-only exact search over a saved store's vectors (see save_vectors), with the same search
+    methods the retriever uses on IdMappedFAISS. Scores are squared L2 distances (lower is
+    better) or inner products (higher is better), as FAISS flat indexes report them.
+    """
+
+    def __init__(self, embeddings, vectors, labels, docstore, metric='l2', normalize_L2=False):
+        self.embeddings = embeddings
+        self.vectors = vectors
+        self.labels = labels
+        self.docstore = docstore
+        self.distance_strategy = MAX_INNER_PRODUCT if metric == 'ip' else EUCLIDEAN_DISTANCE
+        self.normalize_L2 = normalize_L2
+        self._norms = None if metric == 'ip' else np.einsum('ij,ij->i', vectors, vectors)
+        self._metadata = None
+
+    @classmethod
+    def open(cls, faiss_index_path, embeddings, index_name='index', max_vectors=None):
+        """The store at faiss_index_path, or None when it has no saved vectors or more than max_vectors."""
+        base = os.path.join(faiss_index_path, index_name)
+        max_vectors = NUMPY_SEARCH_MAX if max_vectors is None else max_vectors
+        paths = [base + suffix for suffix in ('.vectors.npy', '.vector_labels.npy', '.db')]
+        if not max_vectors or not all(os.path.exists(path) for path in paths):
+            return None
+        vectors = np.load(paths[0], mmap_mode='r')
+        labels = np.load(paths[1])
+        if len(vectors) > max_vectors or len(vectors) != len(labels):
+            return None
+        docstore = SQLiteDocstore(paths[2], read_only=True)
+        # A plain ndarray over the mapped file: still paged in lazily, without np.memmap's per-operation overhead
+        return cls(embeddings, vectors.view(np.ndarray), labels, docstore, docstore.get_meta('metric') or 'l2',
+                   docstore.get_meta('normalize_L2') == '1')
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def columns(self):
+        return self.docstore.columns
+
+    # Filters
+
+    def mask(self, filter):
+        """Boolean mask of the rows whose metadata matches filter ({key: value or list of values}, or a callable)."""
+        labels = self.docstore.labels_where(filter)
+        if labels is not None:
+            return np.isin(self.labels, labels)
+        if self._metadata is None:
+            docs = self.docstore.by_labels(self.labels.tolist())
+            self._metadata = [docs[label].metadata if label in docs else None for label in self.labels.tolist()]
+        return np.array([metadata is not None and _matches(metadata, filter) for metadata in self._metadata],
+                        dtype=bool)
+
+    # Search
+
+    def search_vectors(self, queries, k=4, mask=None):
+        """
+        Exact top-k rows for each query (m x d). Returns (scores, labels), both m x k, best first;
+        rows past the number of candidates hold label -1.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.normalize_L2:
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        larger_is_better = self.distance_strategy == MAX_INNER_PRODUCT
+        candidates = len(self.labels) if mask is None else int(mask.sum())
+        top = min(k, candidates)
+        scores = np.full((len(queries), k), -np.inf if larger_is_better else np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        if top == 0:
+            return scores, labels
+        for start in range(0, len(queries), QUERY_BATCH):
+            batch = queries[start:start + QUERY_BATCH]
+            products = batch @ self.vectors.T
+            if larger_is_better:
+                # argpartition picks the smallest, so rank by negated products
+                ranked = -products
+            else:
+                ranked = self._norms[None, :] - 2 * products + np.einsum('ij,ij->i', batch, batch)[:, None]
+                np.maximum(ranked, 0, out=ranked)
+            if mask is not None:
+                ranked[:, ~mask] = np.inf
+            if top < ranked.shape[1]:
+                rows = np.argpartition(ranked, top - 1, axis=1)[:, :top]
+            else:
+                rows = np.broadcast_to(np.arange(ranked.shape[1]), (len(batch), ranked.shape[1]))
+            queries_index = np.arange(len(batch))[:, None]
+            best = ranked[queries_index, rows]
+            order = np.argsort(best, axis=1, kind='stable')
+            rows = rows[queries_index, order]
+            best = best[queries_index, order]
+            scores[start:start + len(batch), :top] = -best if larger_is_better else best
+            labels[start:start + len(batch), :top] = self.labels[rows]
+        return scores, labels
+
+    def documents(self, labels):
+        """{label: Document} for the given labels."""
+        return self.docstore.by_labels(labels)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        mask = self.mask(filter) if filter is not None else None
+        scores, labels = self.search_vectors([embedding], k, mask)
+        found = self.documents(label for label in labels[0] if label != -1)
+        docs = [(found[int(label)], float(score)) for score, label in zip(scores[0], labels[0])
+                if int(label) in found]
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            larger_is_better = self.distance_strategy == MAX_INNER_PRODUCT
+            docs = [(doc, score) for doc, score in docs
+                    if (score >= score_threshold if larger_is_better else score <= score_threshold)]
+        return docs
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+
+# Benchmark
+
+def _bench_store(vectors, groups):
+    """Directory holding a saved store of one short document per vector, with a filterable group."""
+    import tempfile
+    from langchain_core.documents import Document
+    directory = tempfile.mkdtemp()
+    docstore = SQLiteDocstore(columns=['group'])
+    labels = np.arange(len(vectors), dtype=np.int64)
+    docstore.add({str(i): Document(page_content=f'document {i}', metadata={'group': group})
+                  for i, group in enumerate(groups)}, labels=labels.tolist())
+    docstore.save(os.path.join(directory, 'index.db'))
+    save_vectors(os.path.join(directory, 'index'), labels, vectors)
+    return directory
+
+
+def benchmark(sizes=(1000, 5000, 20000), dim=384, queries=500, k=10):
+    """
+    Compare exact NumPy search with a FAISS flat index on synthetic clustered vectors: time to
+    open a saved store, single-query and batched QPS, filtered-search QPS and agreement of the
+    top-k labels (recall@k against FAISS flat, 1.0 up to float rounding among ties).
+    """
+    import faiss
+    from tools.utils.ann_index import synthetic_corpus
+    results = []
+    for n in sizes:
+        base, query = synthetic_corpus(n, dim, queries)
+        groups = [f'g{i % 10}' for i in range(n)]
+        directory = _bench_store(base, groups)
+        flat = faiss.IndexFlatL2(dim)
+        flat.add(base)
+        faiss_path = os.path.join(directory, 'index.faiss')
+        faiss.write_index(flat, faiss_path)
+
+        start = time.perf_counter()
+        store = NumpyStore.open(directory, None, max_vectors=n)
+        numpy_open = time.perf_counter() - start
+        start = time.perf_counter()
+        flat = faiss.read_index(faiss_path)
+        faiss_open = time.perf_counter() - start
+
+        def qps(search, batched):
+            start = time.perf_counter()
+            if batched:
+                search(query)
+            else:
+                for q in query:
+                    search(q[None, :])
+            return len(query) / (time.perf_counter() - start)
+
+        numpy_labels = store.search_vectors(query, k)[1]
+        faiss_labels = flat.search(query, k)[1]
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(numpy_labels, faiss_labels)])
+        mask = store.mask({'group': 'g3'})
+        allowed = faiss.IDSelectorBatch(np.flatnonzero(mask).astype(np.int64))
+        params = faiss.SearchParameters(sel=allowed)
+        results.append({
+            'n': n,
+            'recall_vs_faiss': float(recall),
+            'numpy_open_ms': numpy_open * 1000,
+            'faiss_open_ms': faiss_open * 1000,
+            'numpy_qps': qps(lambda q: store.search_vectors(q, k), False),
+            'faiss_qps': qps(lambda q: flat.search(q, k), False),
+            'numpy_batch_qps': qps(lambda q: store.search_vectors(q, k), True),
+            'faiss_batch_qps': qps(lambda q: flat.search(q, k), True),
+            'numpy_filtered_qps': qps(lambda q: store.search_vectors(q, k, mask), True),
+            'faiss_filtered_qps': qps(lambda q: flat.search(q, k, params=params), True)
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark exact NumPy search against FAISS flat.")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="comma-separated store sizes")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args(argv)
+    results = benchmark([int(n) for n in args.sizes.split(',')], args.dim, args.queries, args.k)
+    print(f"{'n':>7s} {'recall':>7s} {'open ms np/faiss':>17s} {'qps np/faiss':>15s} "
+          f"{'batch qps np/faiss':>19s} {'filtered np/faiss':>18s}")
+    for r in results:
+        print(f"{r['n']:7d} {r['recall_vs_faiss']:7.3f} {r['numpy_open_ms']:8.1f}/{r['faiss_open_ms']:<8.1f} "
+              f"{r['numpy_qps']:7.0f}/{r['faiss_qps']:<7.0f} {r['numpy_batch_qps']:9.0f}/{r['faiss_batch_qps']:<9.0f} "
+              f"{r['numpy_filtered_qps']:8.0f}/{r['faiss_filtered_qps']:<8.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Retrieval over the saved knowledge-source stores, as used by bot.py.
+Each store is opened with the cheapest backend that searches it well: stores small enough
+for exact NumPy search (see tools.utils.numpy_store) are searched without loading FAISS,
+larger ones through the memory-mapped FAISS store.
+"""
+import threading
+from typing import Any, Dict, List
+
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from tools.utils.numpy_store import MAX_INNER_PRODUCT, NumpyStore
+
+
+def open_search_store(faiss_index_path, embeddings):
+    """A read-only store for querying the index at faiss_index_path, or None if there is none."""
+    store = NumpyStore.open(faiss_index_path, embeddings)
+    if store is not None:
+        return store
+    from tools.utils.faiss_store import open_store
+    return open_store(faiss_index_path, embeddings)
+
+
+class MultiStoreRetriever(BaseRetriever):
+    """
+    Retriever over several stores built with the same embeddings. Stores are opened with
+    open_search_store on first use, the query is embedded once, and hits are merged by distance.
+    search_kwargs (e.g. a metadata filter) are passed to every store's search.
+    """
+    store_paths: List[str]
+    embeddings: Any
+    k: int = 4
+    search_kwargs: Dict[str, Any] = {}
+    _stores: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def stores(self):
+        with self._lock:
+            if self._stores is None:
+                self._stores = []
+                for path in self.store_paths:
+                    store = open_search_store(path, self.embeddings)
+                    if store is None:
+                        print(f"No FAISS index at {path}; skipping it")
+                    else:
+                        self._stores.append(store)
+            return self._stores
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        stores = self.stores()
+        if not stores:
+            return []
+        vector = self.embeddings.embed_query(query)
+        hits = []
+        for store in stores:
+            larger_is_better = store.distance_strategy == MAX_INNER_PRODUCT
+            for doc, score in store.similarity_search_with_score_by_vector(vector, k=self.k, **self.search_kwargs):
+                hits.append((-score if larger_is_better else score, doc))
+        hits.sort(key=lambda hit: hit[0])
+        return [doc for _, doc in hits[:self.k]]
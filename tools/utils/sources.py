@@ -0,0 +1,235 @@
+"""
+Knowledge sources indexed into the FAISS stores.
+A source spec declares where the records sit in an export file and how one record becomes
+a document: its stable id, its text and its metadata. Specs are plain dicts, so a new source
+(a Confluence export, PR reviews) can be added in a JSON file instead of code:
+
+    KNOWLEDGE_SOURCES_FILE   JSON file of {name: spec} merged into the built-in sources
+                             (default: tools/knowledge_sources.json when it exists)
+
+Spec keys:
+    records         ijson prefix of the record array in the export, e.g. "tickets.item", or "item"
+                    for a top-level list
+    id              template of the document id, e.g. "{sha}"
+    number_repeats  give repeated ids a #n suffix instead of replacing the earlier record
+    text            template of the document text, or a list of sections {"label", "field",
+                    "format", "join"} rendered as "label: value" lines, skipping empty fields
+    fields          derived fields available to templates, {name: callable(record)} (code only)
+    metadata        {key: field path}, e.g. {"author": "author.name"}; empty values are left out
+    columns         metadata keys kept in filterable docstore columns
+    index           directory of the source's FAISS index under tools/output
+
+Templates use str.format fields ("{author[name]}"); missing fields render empty.
+"""
+import json
+import os
+import string
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+# Load environment variables from .env file
+load_dotenv()
+
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output')
+SOURCES_FILE = os.getenv('KNOWLEDGE_SOURCES_FILE',
+                         os.path.join(os.path.dirname(__file__), '..', 'knowledge_sources.json'))
+
+
+def git_changed_files(commit):
+    """Changed files of a commit with their line counts, when the history has them."""
+    if commit.get('files'):
+        return ', '.join(
+            f"{f['path']} (+{f['insertions']}/-{f['deletions']})" if f.get('insertions') is not None else f['path']
+            for f in commit['files']
+        )
+    return ', '.join(commit.get('changed_files', []))
+
+
+SOURCES = {
+    'jira': {
+        'records': 'tickets.item',
+        'id': '{id}',
+        'text': 'ID: {id}\nSummary: {summary}\nDescription: {description}',
+        'metadata': {'id': 'id'},
+        'columns': [],
+        'index': 'jira_tickets_stories_faiss_index'
+    },
+    'codebase': {
+        'records': 'item',
+        'id': '{file}::{type}:{name}',
+        'number_repeats': True,
+        'text': [
+            {'label': 'File', 'field': 'file'},
+            {'label': 'Name', 'field': 'name'},
+            {'label': 'Type', 'field': 'type'},
+            {'label': 'Lines', 'field': 'start_line', 'format': '{start_line}-{end_line}'},
+            {'label': 'Doc', 'field': 'doc'},
+            {'label': 'Exports', 'field': 'exports', 'join': ', '},
+            {'label': 'Comments', 'field': 'comments', 'join': '\n'},
+            {'label': 'Content', 'field': 'content'}
+        ],
+        # doc, exports and comments are already in the text
+        'metadata': {key: key for key in ('file', 'type', 'name', 'symbol', 'start_line', 'end_line', 'line')},
+        'columns': ['file', 'type', 'name'],
+        'index': 'codebase_faiss_index'
+    },
+    'git_history': {
+        'records': 'commits.item',
+        'id': '{sha}',
+        'text': ('SHA: {sha}\nMessage: {message}\nAuthor: {author[name]} <{author[email]}>\n'
+                 'Authored: {authored_date}\nCommitted: {committed_date}\nChanged Files: {changed_files}'),
+        'fields': {'changed_files': git_changed_files},
+        'metadata': {'sha': 'sha', 'short_sha': 'short_sha', 'author': 'author.name',
+                     'authored_date': 'authored_date', 'committed_date': 'committed_date'},
+        'columns': ['author'],
+        'index': 'git_history_faiss_index'
+    }
+}
+_loaded_file = False
+
+
+def register_source(name, spec):
+    """Add or replace a source spec."""
+    for key in ('records', 'id', 'text'):
+        if key not in spec:
+            raise ValueError(f"Source spec '{name}' has no '{key}'")
+    SOURCES[name] = spec
+
+
+def load_sources(path):
+    """Register the specs of a JSON file ({name: spec})."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for name, spec in json.load(f).items():
+            register_source(name, spec)
+
+
+def _load_sources_file():
+    global _loaded_file
+    if not _loaded_file:
+        _loaded_file = True
+        if os.path.exists(SOURCES_FILE):
+            load_sources(SOURCES_FILE)
+
+
+def get_source(name):
+    _load_sources_file()
+    if name not in SOURCES:
+        raise ValueError(f"Unknown knowledge source '{name}' (available: {', '.join(sorted(SOURCES))})")
+    return SOURCES[name]
+
+
+def source_names():
+    _load_sources_file()
+    return list(SOURCES)
+
+
+def index_path(name):
+    """Directory of a source's FAISS index."""
+    return os.path.join(OUTPUT_DIR, get_source(name).get('index', f'{name}_faiss_index'))
+
+
+class _Formatter(string.Formatter):
+    def get_value(self, key, args, kwargs):
+        return kwargs.get(key, '')
+
+
+_formatter = _Formatter()
+
+
+def _render(template, record, spec):
+    fields = {name: derive(record) for name, derive in spec.get('fields', {}).items() if '{' + name in template}
+    return _formatter.vformat(template, (), {**record, **fields} if fields else record)
+
+
+def _field(record, path):
+    value = record
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _text(spec, record):
+    text = spec['text']
+    if isinstance(text, str):
+        return _render(text, record, spec)
+    chunk = ''
+    for section in text:
+        value = _field(record, section['field'])
+        if value is None or value == '' or value == [] or value == {}:
+            continue
+        if 'format' in section:
+            value = _render(section['format'], record, spec)
+        elif isinstance(value, list):
+            value = section.get('join', ', ').join(str(item) for item in value)
+        chunk += f"{section['label']}: {value}\n"
+    return chunk
+
+
+def _id_function(spec):
+    """record -> document id for one pass over a source's records."""
+    seen = {}
+
+    def record_id(record):
+        doc_id = _render(spec['id'], record, spec)
+        if spec.get('number_repeats'):
+            count = seen.get(doc_id, 0) + 1
+            seen[doc_id] = count
+            if count > 1:
+                doc_id = f"{doc_id}#{count}"
+        return doc_id
+    return record_id
+
+
+def iter_ids(source, records):
+    """Document ids of records, in order."""
+    record_id = _id_function(get_source(source))
+    for record in records:
+        yield record_id(record)
+
+
+def iter_documents(source, records):
+    """Yield (id, Document) for each record with text, streaming over records."""
+    spec = get_source(source)
+    record_id = _id_function(spec)
+    for record in records:
+        doc_id = record_id(record)
+        text = _text(spec, record)
+        if not text:
+            continue
+        metadata = {}
+        for key, path in spec.get('metadata', {}).items():
+            value = _field(record, path)
+            if value is not None:
+                metadata[key] = value
+        yield doc_id, Document(id=doc_id, page_content=text, metadata=metadata)
+
+
+def codebase_entry_ids(entries):
+    """
+    Stable document ids (file::type:name) for codebase entries, in order. Repeats within a
+    file (several chunks of one symbol, overloaded names) get a #n suffix.
+    """
+    return list(iter_ids('codebase', entries))
+
+
+def iter_records(source, json_file_path):
+    """
+    Yield the records of an export file one at a time. The file is parsed incrementally with
+    ijson when it is installed, otherwise loaded whole.
+    """
+    prefix = get_source(source)['records']
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+    with open(json_file_path, 'rb') as f:
+        if ijson is not None:
+            yield from ijson.items(f, prefix, use_float=True)
+            return
+        data = json.load(f)
+    for part in prefix.split('.')[:-1]:
+        data = data.get(part, []) if isinstance(data, dict) else []
+    yield from data
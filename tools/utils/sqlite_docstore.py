@@ -0,0 +1,223 @@
+"""
+SQLite document store for the FAISS vector stores, replacing LangChain's pickled docstore.
+Each document is one row keyed by its id and its FAISS label, holding the text and the
+metadata as JSON. Chosen metadata keys are also stored in indexed columns, so a search
+can be restricted to matching labels before the vector search runs.
+
+A writable store works on a private scratch copy of the database and publishes it with
+save(), which replaces the target file atomically. Published files are never modified in
+place, so readers open them immutable and only read the rows their searches return.
+"""
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import weakref
+from collections.abc import Mapping
+from urllib.parse import quote
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+_COLUMN_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _remove_scratch(conn, path):
+    conn.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _column_value(value):
+    """Value stored in a metadata column: scalars as they are, anything else as JSON."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value, sort_keys=True)
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Documents by id and by FAISS label in SQLite.
+    Args:
+        path (str): Published database to open (default: a new, empty store).
+        columns (iterable): Metadata keys to keep in filterable columns (new stores only;
+            an existing database keeps the columns it was created with).
+        read_only (bool): Open path in place, immutable, instead of working on a copy.
+    """
+
+    def __init__(self, path=None, columns=(), read_only=False):
+        self._lock = threading.RLock()
+        self.read_only = read_only
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?immutable=1", uri=True,
+                                         check_same_thread=False)
+        else:
+            fd, scratch = tempfile.mkstemp(prefix='docstore-', suffix='.db')
+            os.close(fd)
+            self._conn = sqlite3.connect(scratch, check_same_thread=False)
+            weakref.finalize(self, _remove_scratch, self._conn, scratch)
+            # The scratch copy is only published by save(), so it needs no journal
+            self._conn.execute("PRAGMA journal_mode=OFF")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            if path is not None:
+                source = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+                source.backup(self._conn)
+                source.close()
+            self._create_tables(columns)
+        self.columns = json.loads(self._meta('columns') or '[]')
+        self.label_map = LabelMap(self)
+
+    def _create_tables(self, columns):
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                label INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        if self._meta('columns') is None:
+            columns = list(dict.fromkeys(columns))
+            for column in columns:
+                if not _COLUMN_RE.match(column):
+                    raise ValueError(f"Invalid metadata column name '{column}'")
+                self._conn.execute(f'ALTER TABLE documents ADD COLUMN "m_{column}"')
+                self._conn.execute(f'CREATE INDEX "documents_{column}" ON documents ("m_{column}")')
+            self.set_meta('columns', json.dumps(columns))
+        self._conn.commit()
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_meta(self, key):
+        with self._lock:
+            return self._meta(key)
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _document(self, row):
+        doc_id, content, metadata = row
+        return Document(id=doc_id, page_content=content, metadata=json.loads(metadata))
+
+    # Docstore interface
+
+    def search(self, search):
+        with self._lock:
+            row = self._conn.execute("SELECT id, content, metadata FROM documents WHERE id = ?",
+                                     (search,)).fetchone()
+        return self._document(row) if row else f"ID {search} not found."
+
+    def add(self, texts, labels=None):
+        """Insert or replace documents ({id: Document}) under their FAISS labels."""
+        if self.read_only:
+            raise ValueError("Cannot add documents to a read-only docstore")
+        if labels is None:
+            raise ValueError("SQLiteDocstore needs the FAISS label of every document")
+        placeholders = ', '.join('?' * (4 + len(self.columns)))
+        names = ''.join(f', "m_{column}"' for column in self.columns)
+        rows = []
+        for label, (doc_id, doc) in zip(labels, texts.items()):
+            rows.append([int(label), doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False)]
+                        + [_column_value(doc.metadata.get(column)) for column in self.columns])
+        with self._lock:
+            # REPLACE also drops rows holding the same id under an older label
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO documents (label, id, content, metadata{names}) VALUES ({placeholders})", rows
+            )
+
+    def delete(self, ids):
+        if self.read_only:
+            raise ValueError("Cannot delete documents from a read-only docstore")
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE id IN (SELECT value FROM json_each(?))",
+                               (json.dumps(list(ids)),))
+
+    # Lookups by label
+
+    def by_labels(self, labels):
+        """{label: Document} for the given labels; unknown labels are left out."""
+        labels = [int(label) for label in labels]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT label, id, content, metadata FROM documents WHERE label IN (SELECT value FROM json_each(?))",
+                (json.dumps(labels),)
+            ).fetchall()
+        return {row[0]: self._document(row[1:]) for row in rows}
+
+    def labels_where(self, filter):
+        """
+        Labels of the documents matching a metadata filter ({key: value or list of values}),
+        or None when the filter uses keys that have no column.
+        """
+        if not isinstance(filter, dict) or not filter or not set(filter) <= set(self.columns):
+            return None
+        clauses, params = [], []
+        for key, value in filter.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f'"m_{key}" IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps([_column_value(v) for v in values]))
+        with self._lock:
+            rows = self._conn.execute(f"SELECT label FROM documents WHERE {' AND '.join(clauses)}", params).fetchall()
+        return np.array([label for (label,) in rows], dtype=np.int64)
+
+    def labels(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT label FROM documents ORDER BY label").fetchall()
+        return np.array([label for (label,) in rows], dtype=np.int64)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def save(self, path):
+        """Publish the store to path, replacing it atomically."""
+        tmp_path = path + '.tmp'
+        with self._lock:
+            if not self.read_only:
+                self._conn.commit()
+            target = sqlite3.connect(tmp_path)
+            try:
+                self._conn.backup(target)
+            finally:
+                target.close()
+        os.replace(tmp_path, path)
+
+
+class LabelMap(Mapping):
+    """Read-only FAISS label -> document id view of a SQLiteDocstore (the store's index_to_docstore_id)."""
+
+    def __init__(self, docstore):
+        self.docstore = docstore
+
+    @property
+    def labels(self):
+        return self.docstore.labels()
+
+    def __getitem__(self, label):
+        with self.docstore._lock:
+            row = self.docstore._conn.execute("SELECT id FROM documents WHERE label = ?", (int(label),)).fetchone()
+        if row is None:
+            raise KeyError(label)
+        return row[0]
+
+    def __iter__(self):
+        return iter(self.labels.tolist())
+
+    def __len__(self):
+        return len(self.docstore)
+
+    def items(self):
+        with self.docstore._lock:
+            return self.docstore._conn.execute("SELECT label, id FROM documents ORDER BY label").fetchall()